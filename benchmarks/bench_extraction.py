@@ -0,0 +1,104 @@
+# Benchmark der Dokumentextraktion: Seiten/s und maximale Event-Loop-Blockade,
+# Inline-Parsing (früheres Verhalten) gegen den Prozesspool aus extraction.py.
+# Aufruf aus dem Repo-Verzeichnis: python -m benchmarks.bench_extraction
+import argparse
+import asyncio
+import io
+import time
+
+import extraction
+
+LOREM = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor "
+         "incididunt ut labore et dolore magna aliqua. ")
+
+# Testkorpus erzeugen: PDFs mit reportlab, DOCX mit python-docx, TXT
+def make_pdf(pages: int) -> bytes:
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+    for page in range(pages):
+        y = 750
+        for line in range(45):
+            c.drawString(50, y, f"Seite {page + 1}, Zeile {line + 1}: {LOREM[:80]}")
+            y -= 15
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+def make_docx(paragraphs: int) -> bytes:
+    import docx
+    document = docx.Document()
+    for i in range(paragraphs):
+        document.add_paragraph(f"Absatz {i + 1}: {LOREM * 3}")
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+def corpus(pdf_pages: list) -> list:
+    items = [(f"pdf-{pages}", "pdf", make_pdf(pages), pages) for pages in pdf_pages]
+    items.append(("docx-2000", "docx", make_docx(2000), 1))
+    items.append(("txt-5mb", "txt", (LOREM * 40000).encode("utf-8"), 1))
+    return items
+
+# Früheres Verhalten: synchron im Event Loop mit quadratischem "+="
+def extract_inline(data: bytes, ext: str) -> str:
+    text = ""
+    if ext == "pdf":
+        import PyPDF2
+        for page in PyPDF2.PdfReader(io.BytesIO(data)).pages:
+            text += page.extract_text() + "\n"
+    elif ext == "docx":
+        import docx
+        for para in docx.Document(io.BytesIO(data)).paragraphs:
+            text += para.text + "\n"
+    else:
+        text = data.decode("utf-8")
+    return text
+
+async def measure(work) -> tuple:
+    max_stall = 0.0
+    running = True
+
+    async def monitor():
+        nonlocal max_stall
+        interval = 0.005
+        while running:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            max_stall = max(max_stall, time.perf_counter() - start - interval)
+
+    monitor_task = asyncio.create_task(monitor())
+    await asyncio.sleep(0.02)
+    start = time.perf_counter()
+    await work()
+    elapsed = time.perf_counter() - start
+    running = False
+    await monitor_task
+    return elapsed, max_stall
+
+async def run(items: list):
+    # Pool vorwärmen, damit der Prozessstart nicht mitgemessen wird
+    await extraction.extract_text(b"warmup", "txt")
+    print(f"{'Datei':<12} {'Modus':<8} {'Seiten/s':>10} {'Dauer s':>9} {'max. Blockade ms':>17}")
+    for name, ext, data, pages in items:
+        async def inline():
+            extract_inline(data, ext)
+
+        async def pooled():
+            await extraction.extract_text(data, ext)
+
+        for mode, work in (("inline", inline), ("pool", pooled)):
+            elapsed, stall = await measure(work)
+            print(f"{name:<12} {mode:<8} {pages / elapsed:>10.1f} {elapsed:>9.2f} {stall * 1000:>17.1f}")
+    await extraction.shutdown_pool()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf-pages", default="10,100,300")
+    args = parser.parse_args()
+    items = corpus([int(x) for x in args.pdf_pages.split(",")])
+    asyncio.run(run(items))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# Lastbenchmark für den gemeinsamen Async-OpenAI-Client gegen einen lokalen Stub-Server.
+# Aufruf aus dem Repo-Verzeichnis: python -m benchmarks.bench_openai
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.stub_openai import StubOpenAIServer
+
+async def run_level(concurrency: int, requests: int) -> float:
+    import openai_client
+    openai_client.ENDPOINT_LIMITS["chat"] = concurrency
+    openai_client._semaphores.clear()
+    await openai_client.close_client()
+
+    async def one():
+        async with openai_client.limit("chat") as timeout:
+            await openai_client.get_client().chat.completions.create(
+                model="gpt-4o",
+                messages=[{"role": "user", "content": "Hallo"}],
+                max_tokens=10,
+                timeout=timeout,
+            )
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    await openai_client.close_client()
+    return requests / elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--levels", default="1,8,32,128")
+    args = parser.parse_args()
+
+    server = StubOpenAIServer(latency=args.latency).start()
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    import openai_client
+    openai_client.OPENAI_BASE_URL = server.base_url
+    openai_client.OPENAI_API_KEY = "stub"
+    try:
+        print(f"{'Parallelität':>12} {'Anfragen/s':>12}")
+        for level in [int(x) for x in args.levels.split(",")]:
+            throughput = asyncio.run(run_level(level, args.requests))
+            print(f"{level:>12} {throughput:>12.1f}")
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# Vergleicht ausgehende Nachrichten ohne Drosselung (Aufrufer wiederholt nach RetryAfter)
+# mit dem OutboundLimiter gegen einen lokalen Bot-API-Stub mit simuliertem Flood-Limit.
+# Aufruf aus dem Repo-Verzeichnis: python -m benchmarks.bench_outbound
+import argparse
+import asyncio
+import time
+
+from telegram.error import RetryAfter
+from telegram.ext import Application
+
+from benchmarks.fake_telegram import FakeTelegramServer
+from outbound import OUTBOUND_POOL_SIZE, OutboundLimiter
+
+TOKEN = "123456:BENCHMARK"
+
+def build_application(fake: FakeTelegramServer, limiter) -> Application:
+    builder = Application.builder().token(TOKEN).base_url(fake.base_url).connection_pool_size(OUTBOUND_POOL_SIZE)
+    if limiter is not None:
+        builder = builder.rate_limiter(limiter)
+    return builder.build()
+
+async def send_with_retry(bot, chat_id, text, stats):
+    while True:
+        try:
+            await bot.send_message(chat_id=chat_id, text=text)
+            return
+        except RetryAfter as e:
+            stats["retries"] += 1
+            await asyncio.sleep(e.retry_after)
+
+async def run_sends(fake: FakeTelegramServer, limiter, messages: int, chats: int) -> dict:
+    application = build_application(fake, limiter)
+    await application.initialize()
+    stats = {"retries": 0}
+    fake.calls.clear()
+    fake.throttled = 0
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        send_with_retry(application.bot, 1000 + i % chats, f"Nachricht {i}", stats) for i in range(messages)
+    ))
+    elapsed = time.perf_counter() - start
+    await application.shutdown()
+    return {"seconds": elapsed, "api_calls": sum(fake.calls.values()) - fake.calls.get("getMe", 0),
+            "http_429": fake.throttled, "caller_retries": stats["retries"]}
+
+# Viele gleichzeitige Fortschritts-Edits derselben Nachricht (wie ProgressMessage beim Zusammenfassen)
+async def run_edits(fake: FakeTelegramServer, limiter, edits: int) -> dict:
+    application = build_application(fake, limiter)
+    await application.initialize()
+    fake.calls.clear()
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        application.bot.edit_message_text(f"Fortschritt {i}/{edits}", chat_id=1000, message_id=1)
+        for i in range(edits)
+    ), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    await application.shutdown()
+    return {"seconds": elapsed, "api_calls": fake.calls.get("editMessageText", 0)}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--edits", type=int, default=40)
+    parser.add_argument("--server-limit", type=int, default=30, help="simuliertes Limit (Aufrufe pro Sekunde)")
+    args = parser.parse_args()
+
+    fake = FakeTelegramServer(latency=0.02, max_per_second=args.server_limit).start()
+    try:
+        sends = {
+            "ohne Limiter": asyncio.run(run_sends(fake, None, args.messages, args.chats)),
+            "OutboundLimiter": asyncio.run(run_sends(fake, OutboundLimiter(), args.messages, args.chats)),
+        }
+        edits = asyncio.run(run_edits(fake, OutboundLimiter(), args.edits))
+    finally:
+        fake.stop()
+
+    print(f"{args.messages} Nachrichten an {args.chats} Chats, Server-Limit {args.server_limit}/s")
+    print(f"{'Variante':<16} {'Sekunden':>9} {'API-Aufrufe':>12} {'HTTP 429':>9} {'Wiederholungen':>15}")
+    for name, result in sends.items():
+        print(f"{name:<16} {result['seconds']:>9.1f} {result['api_calls']:>12} {result['http_429']:>9} "
+              f"{result['caller_retries']:>15}")
+    print(f"{args.edits} gleichzeitige Edits einer Nachricht: {edits['api_calls']} API-Aufrufe "
+          f"in {edits['seconds']:.1f}s")
+
+if __name__ == "__main__":
+    main()
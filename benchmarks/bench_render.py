@@ -0,0 +1,116 @@
+# Benchmark der /create-Renderer: Renderzeit, Dateigröße und Spitzenspeicher je Format,
+# früheres Verhalten (eine PDF-Seite, Temp-Dateien, openpyxl im Normalmodus) gegen render.py.
+# Die neuen Renderer werden wie beim Streaming in kleinen Stücken gefüttert.
+# Aufruf aus dem Repo-Verzeichnis: python -m benchmarks.bench_render
+import argparse
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+
+import render
+
+LOREM = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor "
+         "incididunt ut labore et dolore magna aliqua <b>&</b>. ")
+
+def make_text(lines: int) -> str:
+    return "\n".join(f"Zeile {i + 1}: {LOREM * (1 + i % 3)}" for i in range(lines))
+
+# Früheres Verhalten aus handle_create (ohne Telegram-Versand)
+def legacy_pdf(text: str) -> bytes:
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+    y = 750
+    for line in text.split("\n"):
+        c.drawString(100, y, line)
+        y -= 15
+    c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+def _via_temp_file(suffix: str, write) -> bytes:
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    try:
+        write(path)
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+def legacy_docx(text: str) -> bytes:
+    import docx
+
+    def write(path):
+        document = docx.Document()
+        document.add_paragraph(text)
+        document.save(path)
+    return _via_temp_file(".docx", write)
+
+def legacy_xlsx(text: str) -> bytes:
+    # Früher pandas.DataFrame.to_excel, das openpyxl im Normalmodus verwendet
+    import openpyxl
+
+    def write(path):
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(["Text"])
+        for line in text.split("\n"):
+            sheet.append([line])
+        workbook.save(path)
+    return _via_temp_file(".xlsx", write)
+
+def legacy_html(text: str) -> bytes:
+    def write(path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"<!DOCTYPE html>\n<html><head><meta charset=\"UTF-8\"></head><body><pre>{text}</pre></body></html>")
+    return _via_temp_file(".html", write)
+
+LEGACY = {"pdf": legacy_pdf, "docx": legacy_docx, "xlsx": legacy_xlsx, "html": legacy_html}
+
+def streamed(format_type: str, text: str, chunk: int) -> bytes:
+    renderer = render.create_renderer(format_type)
+    for start in range(0, len(text), chunk):
+        renderer.feed(text[start:start + chunk])
+    return renderer.finish()
+
+# Zeit ohne tracemalloc messen (bremst stark), Spitzenspeicher in einem zweiten Lauf
+def measure(function, *args) -> tuple:
+    start = time.perf_counter()
+    output = function(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, output, peak
+
+def pdf_pages(data: bytes) -> int:
+    try:
+        import PyPDF2
+    except ImportError:
+        return 0
+    return len(PyPDF2.PdfReader(io.BytesIO(data)).pages)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--formats", nargs="+", default=list(render.RENDER_FORMATS))
+    parser.add_argument("--chunk", type=int, default=16, help="Zeichen pro gestreamtem Stück")
+    args = parser.parse_args()
+
+    print(f"{'Format':<6} {'Zeilen':>7} {'Variante':<9} {'ms':>9} {'KB':>9} {'Spitze MB':>10}  Hinweis")
+    for lines in args.lines:
+        text = make_text(lines)
+        for format_type in args.formats:
+            for name, function in (("alt", LEGACY[format_type]), ("neu", lambda t, f=format_type: streamed(f, t, args.chunk))):
+                elapsed, output, peak = measure(function, text)
+                note = f"{pdf_pages(output)} Seite(n)" if format_type == "pdf" else ""
+                print(f"{format_type:<6} {lines:>7} {name:<9} {elapsed * 1000:>9.1f} {len(output) / 1024:>9.1f} "
+                      f"{peak / 1024 / 1024:>10.1f}  {note}")
+
+if __name__ == "__main__":
+    main()
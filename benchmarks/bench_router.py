@@ -0,0 +1,94 @@
+# Benchmark des Modell-Routers gegen den lokalen OpenAI-Stub mit einem gestörten Modell
+# (Latenz mit langem Ausläufer und 503-Antworten): früher fest gpt-4o, jetzt model_router mit
+# Latenzbudget und Fallback, optional zusätzlich Hedging nach dem p95.
+# Gemessen: Latenzquantile, Fehler und Anteil der Modelle an den Antworten. Alle Varianten nutzen
+# den Client aus openai_client (mit OPENAI_MAX_RETRIES wie im Betrieb).
+# Aufruf aus dem Repo-Verzeichnis: python -m benchmarks.bench_router
+import argparse
+import asyncio
+import logging
+import time
+from collections import Counter
+
+import openai
+
+import openai_client
+from benchmarks.stub_openai import StubOpenAIServer
+from model_router import ModelRouter
+
+def quantile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def run_variant(router, args) -> tuple:
+    latencies, errors, used = [], 0, Counter()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def request(model, client):
+        response = await client.chat.completions.create(model=model, messages=[{"role": "user", "content": "Hallo"}])
+        used[model] += 1
+        return response
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                if router is None:
+                    await request(args.model, openai_client.get_client())
+                else:
+                    await router.call("chat", request)
+            except openai.OpenAIError:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(args.requests)))
+    return latencies, errors, used
+
+async def run(args):
+    routes = {"chat": [args.model, args.fallback]}
+    budgets = {"chat": args.budget}
+    variants = (
+        ("fest", None),
+        ("Fallback", ModelRouter(routes, budgets, hedge_tasks=set())),
+        ("Fallback+Hedging", ModelRouter(routes, budgets, hedge_tasks={"chat"})),
+    )
+    print(f"{'Variante':<18} {'p50':>7} {'p95':>7} {'p99':>7} {'max':>7} {'Fehler':>7}  Antworten")
+    try:
+        for name, router in variants:
+            latencies, errors, used = await run_variant(router, args)
+            shares = ", ".join(f"{model} {count}" for model, count in used.most_common())
+            line = " ".join(f"{quantile(latencies, q) * 1000:>5.0f}ms" for q in (0.5, 0.95, 0.99))
+            print(f"{name:<18} {line} {max(latencies) * 1000:>5.0f}ms {errors:>7}  {shares}")
+            if router is not None:
+                print(f"{'':<18} {router.stats}")
+    finally:
+        await openai_client.close_client()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--fallback", default="gpt-4o-mini")
+    parser.add_argument("--latency", default="uniform:0.15:0.05", help="Latenz des Fallback-Modells")
+    parser.add_argument("--degraded-latency", default="lognormal:0.2:0.9", help="Latenz des gestörten Modells")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="Anteil 503 beim gestörten Modell")
+    parser.add_argument("--budget", type=float, default=1.0, help="Latenzbudget vor dem Fallback (s)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    logging.getLogger("model_router").setLevel(logging.ERROR)  # Fallback-Warnungen nicht einzeln ausgeben
+
+    stub = StubOpenAIServer(latency=args.latency, seed=args.seed,
+                            model_latency={args.model: args.degraded_latency},
+                            model_errors={args.model: args.error_rate}).start()
+    openai_client.OPENAI_BASE_URL = stub.base_url
+    openai_client.OPENAI_API_KEY = "stub"
+    try:
+        asyncio.run(run(args))
+    finally:
+        stub.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# Benchmark des Kaltstarts: Importzeit von bot.py (python -X importtime, Median über mehrere
+# Läufe), die teuersten direkten Importe, welche schweren Bibliotheken schon beim Import geladen
+# werden, und die Zeit vom Prozessstart bis /ready gegen den lokalen Fake-Bot-API-Server.
+# Aufruf aus dem Repo-Verzeichnis: python -m benchmarks.bench_startup [--workers 2]
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.fake_telegram import FakeTelegramServer
+
+HEAVY_MODULES = ("openai", "reportlab", "openpyxl", "docx", "PyPDF2", "pandas", "tiktoken", "flask")
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def bot_environment(fake: FakeTelegramServer = None, workdir: str = None) -> dict:
+    workdir = workdir or tempfile.mkdtemp(prefix="bench-startup-")
+    env = dict(os.environ, TELEGRAM_BOT_TOKEN="123456:STARTUP", OPENAI_API_KEY="stub", CACHE_DIR="",
+               STATE_BACKEND_URL="memory://", JOBS_DB_PATH=os.path.join(workdir, "jobs.db"))
+    env.pop("WEBHOOK_URL", None)
+    if fake is not None:
+        env.update(TELEGRAM_BASE_URL=fake.base_url, TELEGRAM_BASE_FILE_URL=fake.base_file_url)
+    return env
+
+# Zeilen "import time: self [us] | cumulative | imported package" -> (Tiefe, Modul, self, kumuliert)
+def parse_importtime(stderr: str) -> list:
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        entries.append((depth, name.strip(), int(own) / 1000, int(cumulative) / 1000))
+    return entries
+
+def measure_import(env: dict, runs: int):
+    totals, entries, loaded = [], None, []
+    check = f"import sys, bot; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", check], env=env, cwd=REPO,
+                                capture_output=True, text=True, check=True)
+        entries = parse_importtime(result.stderr)
+        totals.append(next(cumulative for _, name, _, cumulative in entries if name == "bot"))
+        loaded = [name for name in result.stdout.strip().split(",") if name]
+    return statistics.median(totals), entries, loaded
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+# Zeit vom Prozessstart bis /ready mit 200 antwortet
+def measure_ready(env: dict, workers: int, timeout: float = 60) -> float:
+    port = free_port()
+    env = dict(env, WORKERS=str(workers), PORT=str(port))
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "runtime.py", "--mode", "webhook"], env=env, cwd=REPO,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        with httpx.Client(timeout=1) as client:
+            while time.perf_counter() - start < timeout:
+                try:
+                    if client.get(f"http://127.0.0.1:{port}/ready").status_code == 200:
+                        return time.perf_counter() - start
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.01)
+        raise RuntimeError("Bot wurde nicht rechtzeitig bereit")
+    finally:
+        process.terminate()
+        process.wait(30)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--telegram-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    fake = FakeTelegramServer(latency=args.telegram_latency).start()
+    try:
+        env = bot_environment(fake)
+        total, entries, loaded = measure_import(env, args.runs)
+        print(f"Import von bot.py: {total:.0f} ms (Median aus {args.runs} Läufen)")
+        direct = sorted((e for e in entries if e[0] == 1), key=lambda e: e[3], reverse=True)
+        for _, name, _, cumulative in direct[:args.top]:
+            print(f"  {name:<28} {cumulative:>8.1f} ms")
+        print(f"Schwere Bibliotheken beim Import geladen: {', '.join(loaded) or 'keine'}")
+
+        ready = [measure_ready(env, args.workers) for _ in range(max(1, args.runs // 2))]
+        print(f"Start bis /ready ({args.workers} Worker): {statistics.median(ready) * 1000:.0f} ms "
+              f"(Median aus {len(ready)} Läufen)")
+    finally:
+        fake.stop()
+
+if __name__ == "__main__":
+    main()
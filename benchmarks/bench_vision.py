@@ -0,0 +1,70 @@
+# Benchmark der Bildvorverarbeitung für die Vision-API: früher größte PhotoSize unverändert
+# als data:image/jpeg hochgeladen, jetzt kleinste ausreichende PhotoSize, ggf. verkleinert und
+# neu kodiert (images.py). Gemessen: Upload-Bytes (Base64), Vorverarbeitungszeit, geschätzte Bild-Tokens.
+# Aufruf aus dem Repo-Verzeichnis: python -m benchmarks.bench_vision
+import argparse
+import io
+import math
+import time
+from types import SimpleNamespace
+
+from PIL import Image, ImageDraw
+
+import images
+
+# Telegram erzeugt Vorschaustufen mit diesen Kantenlängen (längste Seite)
+TELEGRAM_SIDES = (90, 320, 800, 1280, 2560)
+
+def make_photo_sizes(width: int, height: int) -> list:
+    image = Image.new("RGB", (width, height), (30, 60, 120))
+    draw = ImageDraw.Draw(image)
+    for i in range(0, width, 37):
+        draw.ellipse((i, i % height, i + 120, i % height + 80), outline=(250, 220, 30), width=4)
+    sizes = []
+    for side in TELEGRAM_SIDES:
+        scale = min(1.0, side / max(width, height))
+        resized = image.resize((round(width * scale), round(height * scale)))
+        buffer = io.BytesIO()
+        resized.save(buffer, format="JPEG", quality=87)
+        sizes.append(SimpleNamespace(width=resized.width, height=resized.height, data=buffer.getvalue()))
+        if scale == 1.0:
+            break
+    return sizes
+
+# Bild-Tokens laut OpenAI: low pauschal 85, sonst 85 + 170 je 512er-Kachel nach der Skalierung
+def estimate_tokens(width: int, height: int, detail: str) -> int:
+    if detail == "low":
+        return 85
+    width, height = images.target_size(width, height, "high")
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+def base64_size(data: bytes) -> int:
+    return 4 * math.ceil(len(data) / 3)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    sizes = make_photo_sizes(args.width, args.height)
+    largest = sizes[-1]
+    print(f"PhotoSizes: {', '.join(f'{s.width}x{s.height} ({len(s.data) // 1024} KB)' for s in sizes)}")
+    print(f"{'Variante':<14} {'Auswahl':>10} {'Upload':>10} {'Zeit':>9} {'Tokens':>7}")
+    legacy_tokens = estimate_tokens(largest.width, largest.height, "auto")
+    print(f"{'alt':<14} {f'{largest.width}x{largest.height}':>10} {base64_size(largest.data) // 1024:>7} KB "
+          f"{0:>6.1f} ms {legacy_tokens:>7}")
+    for detail in ("auto", "low"):
+        chosen = images.choose_photo_size(sizes, detail)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            data, mime = images.prepare_image(chosen.data, detail)
+        elapsed = (time.perf_counter() - start) / args.repeat * 1000
+        with Image.open(io.BytesIO(data)) as prepared:
+            tokens = estimate_tokens(prepared.width, prepared.height, detail)
+        print(f"{'neu ' + detail:<14} {f'{chosen.width}x{chosen.height}':>10} {base64_size(data) // 1024:>7} KB "
+              f"{elapsed:>6.1f} ms {tokens:>7}")
+
+if __name__ == "__main__":
+    main()
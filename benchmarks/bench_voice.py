@@ -0,0 +1,79 @@
+# Benchmark der Sprachantwort (Text -> Sprache) gegen den lokalen OpenAI-Stub:
+# früher komplette Antwort abwarten und in einem TTS-Aufruf vertonen, jetzt Antwort streamen
+# und fertige Sätze parallel als Opus synthetisieren (voice.VoiceReply).
+# Gemessen: Zeit bis zum ersten Text und bis die Sprachdatei versandbereit ist.
+# Aufruf aus dem Repo-Verzeichnis: python -m benchmarks.bench_voice
+import argparse
+import asyncio
+import statistics
+import time
+
+import openai
+
+from benchmarks.stub_openai import StubOpenAIServer
+from voice import VOICE_TTS_FORMAT, VoiceReply
+
+REPLY = ("Das ist eine ziemlich ausführliche Antwort auf deine Sprachnachricht. "
+         "Sie besteht aus mehreren Sätzen, damit sich die Aufteilung lohnt. "
+         "Jeder Satz wird vertont, sobald das Modell ihn fertig geschrieben hat. "
+         "Währenddessen schreibt das Modell bereits weiter am nächsten Gedanken. "
+         "Am Ende werden die einzelnen Opus-Abschnitte zu einer Sprachnachricht verbunden. "
+         "So hört man die Antwort deutlich früher als bisher.")
+
+async def legacy(client) -> tuple:
+    start = time.perf_counter()
+    response = await client.chat.completions.create(model="gpt-4o", messages=[{"role": "user", "content": "Hallo"}])
+    reply = response.choices[0].message.content
+    text_ready = time.perf_counter() - start
+    audio = await client.audio.speech.create(model="tts-1", voice="alloy", input=reply)
+    return text_ready, time.perf_counter() - start, len(audio.content)
+
+async def pipelined(client) -> tuple:
+    async def synthesize(text: str) -> bytes:
+        response = await client.audio.speech.create(model="tts-1", voice="alloy", input=text,
+                                                    response_format=VOICE_TTS_FORMAT)
+        return response.content
+
+    start = time.perf_counter()
+    text_ready = None
+    reply = VoiceReply(synthesize)
+    stream = await client.chat.completions.create(model="gpt-4o", messages=[{"role": "user", "content": "Hallo"}],
+                                                  stream=True)
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            if text_ready is None:
+                text_ready = time.perf_counter() - start
+            reply.feed(delta)
+    files = await reply.finish()
+    return text_ready, time.perf_counter() - start, sum(len(f) for f in files)
+
+async def run(args, stub):
+    client = openai.AsyncOpenAI(api_key="stub", base_url=stub.base_url, max_retries=0)
+    try:
+        for name, flow in (("alt", legacy), ("neu", pipelined)):
+            results = [await flow(client) for _ in range(args.runs)]
+            text_ready = statistics.median(r[0] for r in results) * 1000
+            voice_ready = statistics.median(r[1] for r in results) * 1000
+            print(f"{name:<4} Text nach {text_ready:>7.0f} ms   Sprache nach {voice_ready:>7.0f} ms   "
+                  f"{results[-1][2]:>8} Bytes")
+    finally:
+        await client.close()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.3, help="Grundlatenz pro API-Aufruf (s)")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Sekunden pro gestreamtem Wort")
+    parser.add_argument("--tts-rate", type=float, default=150, help="vertonte Zeichen pro Sekunde")
+    args = parser.parse_args()
+
+    stub = StubOpenAIServer(latency=args.latency, reply_text=REPLY, token_delay=args.token_delay,
+                            tts_chars_per_second=args.tts_rate).start()
+    try:
+        asyncio.run(run(args, stub))
+    finally:
+        stub.stop()
+
+if __name__ == "__main__":
+    main()
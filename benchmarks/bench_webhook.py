@@ -0,0 +1,196 @@
+# Vergleicht den ASGI-Webhook (webhook_server.py) mit dem früheren Flask-Pfad
+# (Flask-Route + Loop-Thread + run_coroutine_threadsafe + INFO-Logging des Payloads).
+# Server und Fake-Bot-API laufen in einem eigenen Prozess, damit der Lastgenerator nicht
+# um denselben GIL konkurriert; beide Pfade werden abwechselnd mehrfach gemessen.
+# Aufruf aus dem Repo-Verzeichnis: python -m benchmarks.bench_webhook [--runs 3]
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+
+import httpx
+import telegram
+from telegram.ext import Application, MessageHandler, filters
+
+from benchmarks.fake_telegram import FakeTelegramServer
+from scheduler import UpdateScheduler
+from webhook_server import WebhookServer
+
+TOKEN = "123456:BENCHMARK"
+SECRET = "bench-secret"
+
+async def _noop(update, context):
+    await asyncio.sleep(0.01)
+
+def build_application(fake: FakeTelegramServer) -> Application:
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        .base_url(fake.base_url)
+        .concurrent_updates(True)
+        .build()
+    )
+    application.add_handler(MessageHandler(filters.TEXT, _noop))
+    return application
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_asgi(application, port: int):
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(
+        # Ohne Obergrenze der Warteschlange wie der alte Pfad, damit beide jedes Update annehmen (kein 429)
+        WebhookServer(application, UpdateScheduler(application.process_update, user_rate=0, max_queued=10 ** 9),
+                      secret_token=SECRET),
+        host="127.0.0.1", port=port, log_level="error", access_log=False,
+    ))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+
+def start_flask_legacy(application, port: int):
+    from flask import Flask, request
+    from werkzeug.serving import make_server
+
+    # Payload- und Zugriffslogs werden wie früher formatiert, aber verworfen
+    devnull = logging.StreamHandler(open(os.devnull, "w"))
+    payload_logger = logging.getLogger("legacy_webhook")
+    for logger in (payload_logger, logging.getLogger("werkzeug")):
+        logger.setLevel(logging.INFO)
+        logger.addHandler(devnull)
+        logger.propagate = False
+
+    global_loop = asyncio.new_event_loop()
+    threading.Thread(target=global_loop.run_forever, daemon=True).start()
+    asyncio.run_coroutine_threadsafe(application.initialize(), global_loop).result()
+
+    app = Flask(__name__)
+
+    @app.route("/webhook", methods=["POST"])
+    def webhook():
+        update_json = request.get_json(force=True)
+        payload_logger.info(f"Webhook erhalten: {update_json}")
+        update = telegram.Update.de_json(update_json, application.bot)
+        asyncio.run_coroutine_threadsafe(application.process_update(update), global_loop)
+        return "OK", 200
+
+    server = make_server("127.0.0.1", port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, {}
+
+STARTERS = {"flask (alt)": start_flask_legacy, "asgi": start_asgi}
+
+# Läuft im Server-Prozess: Fake-Bot-API und Webhook-Server starten, bis zum Beenden warten
+def serve(name: str, port: int, ready, headers):
+    fake = FakeTelegramServer(latency=0).start()
+    _, server_headers = STARTERS[name](build_application(fake), port)
+    headers.update(server_headers)
+    ready.set()
+    threading.Event().wait()
+
+def make_update(update_id: int, chats: int) -> dict:
+    chat_id = 1000 + update_id % chats
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Bench"},
+            "text": f"Nachricht {update_id}",
+        },
+    }
+
+# Schlanker HTTP/1.1-Client (Keep-Alive-Verbindung pro Worker, neu aufgebaut, wenn der Server sie
+# schließt, wie beim Flask-Entwicklungsserver mit HTTP/1.0): httpx braucht pro Anfrage mehr CPU
+# als der Server und bestimmte sonst selbst die gemessene Latenz. Liefert (Status, Keep-Alive).
+async def _post(reader, writer, host: str, path: str, headers: dict, body: bytes) -> tuple:
+    head = "".join(f"{key}: {value}\r\n" for key, value in headers.items())
+    writer.write(f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n{head}\r\n".encode("latin-1") + body)
+    await writer.drain()
+    status_line, *lines = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+    length, keep_alive = 0, status_line.startswith("HTTP/1.1")
+    for line in lines:
+        key, _, value = line.partition(":")
+        if key.lower() == "content-length":
+            length = int(value)
+        elif key.lower() == "connection" and value.strip().lower() == "close":
+            keep_alive = False
+    await reader.readexactly(length)
+    return int(status_line.split()[1]), keep_alive
+
+async def load(url: str, headers: dict, total: int, concurrency: int, chats: int):
+    latencies, statuses = [], {}
+    counter = iter(range(total))
+    parsed = httpx.URL(url)
+    host = f"{parsed.host}:{parsed.port}"
+
+    async def worker():
+        connection = None
+        try:
+            for update_id in counter:
+                body = json.dumps(make_update(update_id, chats)).encode()
+                start = time.perf_counter()
+                if connection is None:
+                    connection = await asyncio.open_connection(parsed.host, parsed.port)
+                status, keep_alive = await _post(*connection, host, parsed.path, headers, body)
+                latencies.append(time.perf_counter() - start)
+                statuses[status] = statuses.get(status, 0) + 1
+                if not keep_alive:
+                    connection[1].close()
+                    connection = None
+        finally:
+            if connection is not None:
+                connection[1].close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "updates_per_s": total / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "statuses": statuses,
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    print(f"{'Pfad':<12} {'Lauf':>4} {'Updates/s':>10} {'p50 ms':>8} {'p99 ms':>8}  Status")
+    for run in range(1, args.runs + 1):
+        for name in STARTERS:
+            port = free_port()
+            with context.Manager() as manager:
+                ready, headers = manager.Event(), manager.dict()
+                process = context.Process(target=serve, args=(name, port, ready, headers), daemon=True)
+                process.start()
+                try:
+                    if not ready.wait(60):
+                        raise RuntimeError(f"{name}: Server nicht gestartet")
+                    url = f"http://127.0.0.1:{port}/webhook"
+                    result = asyncio.run(load(url, dict(headers), args.updates, args.concurrency, args.chats))
+                finally:
+                    process.terminate()
+                    process.join()
+            print(f"{name:<12} {run:>4} {result['updates_per_s']:>10.0f} {result['p50_ms']:>8.1f} "
+                  f"{result['p99_ms']:>8.1f}  {result['statuses']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# Prüfung des Ogg-Opus-Muxers (voice.ogg_page, voice.concat_ogg_opus) gegen einen unabhängigen
+# Parser: mutagen liest die Seiten und berechnet die CRC mit eigener Implementierung neu.
+# Die Eingaben werden ebenfalls mit mutagen erzeugt (nicht mit voice.ogg_page), inkl. Paketen,
+# die über Seitengrenzen laufen (Granule -1, Continued-Flag). Geprüft: CRC und Aufbau jeder
+# Seite, einheitliche Seriennummer, fortlaufende Seitennummern, BOS/EOS, Kopfpakete nur einmal,
+# monotone Granules, End-Granule = Summe der Abschnitte, Dauer laut mutagen.oggopus.
+# Aufruf aus dem Repo-Verzeichnis: python -m benchmarks.check_ogg  (benötigt: pip install mutagen)
+import io
+import random
+import struct
+
+from mutagen.ogg import OggPage
+from mutagen.oggopus import OggOpus
+
+from voice import _ogg_crc, concat_ogg_opus, ogg_page
+
+SAMPLES_PER_PACKET = 960  # 20 ms bei 48 kHz
+
+def opus_head(pre_skip: int) -> bytes:
+    return b"OpusHead" + struct.pack("<BBHIhB", 1, 1, pre_skip, 48000, 0, 0)
+
+def opus_tags() -> bytes:
+    return b"OpusTags" + struct.pack("<I", 6) + b"mutagn" + struct.pack("<I", 0)
+
+# Ogg-Opus-Datei aus Kopf-, Kommentar- und Audiopaketen, komplett über mutagen geschrieben;
+# liefert (Bytes, End-Granule)
+def mutagen_opus(serial: int, packets: list, pre_skip: int = 312, page_size: int = 400) -> tuple:
+    head, tags = OggPage(), OggPage()
+    head.packets, tags.packets = [opus_head(pre_skip)], [opus_tags()]
+    for sequence, page in enumerate((head, tags)):
+        page.serial, page.sequence, page.position = serial, sequence, 0
+    head.first = True
+    audio = OggPage.from_packets(packets, sequence=2, default_size=page_size, wiggle_room=0)
+    finished = 0
+    for page in audio:
+        page.serial = serial
+        finished += len(page.packets) - (0 if page.complete else 1)
+        ends_packet = len(page.packets) > 1 or page.complete
+        page.position = pre_skip + finished * SAMPLES_PER_PACKET if ends_packet else -1
+    audio[-1].last = True
+    pages = [head, tags] + audio
+    return b"".join(page.write() for page in pages), pre_skip + len(packets) * SAMPLES_PER_PACKET
+
+def read_pages(data: bytes) -> list:
+    fileobj = io.BytesIO(data)
+    pages = []
+    while fileobj.tell() < len(data):
+        start = fileobj.tell()
+        page = OggPage(fileobj)
+        pages.append((page, data[start:fileobj.tell()]))
+    return pages
+
+def check_stream(data: bytes, expected_granule: int, expected_pre_skip: int):
+    pages = read_pages(data)
+    serials = {page.serial for page, _ in pages}
+    assert len(serials) == 1, f"mehrere Seriennummern: {serials}"
+    for index, (page, raw) in enumerate(pages):
+        rewritten = page.write()
+        assert rewritten[22:26] == raw[22:26], f"CRC von Seite {index} weicht ab"
+        assert rewritten == raw, f"Seite {index} anders aufgebaut als von mutagen erwartet"
+        assert page.sequence == index, f"Seitennummer {page.sequence} statt {index}"
+        assert page.first == (index == 0), f"BOS-Flag auf Seite {index}"
+        assert page.last == (index == len(pages) - 1), f"EOS-Flag auf Seite {index}"
+    packets = [packet for page, _ in pages for packet in page.packets]
+    for magic in (b"OpusHead", b"OpusTags"):
+        assert sum(packet.startswith(magic) for packet in packets) == 1, f"{magic.decode()} nicht genau einmal"
+    granules = [page.position for page, _ in pages if page.position != -1]
+    assert granules == sorted(granules), "Granule-Positionen nicht monoton"
+    assert granules[-1] == expected_granule, f"End-Granule {granules[-1]} statt {expected_granule}"
+    info = OggOpus(io.BytesIO(data)).info
+    expected_length = (expected_granule - expected_pre_skip) / 48000
+    assert abs(info.length - expected_length) < 1e-6, f"Dauer {info.length} statt {expected_length}"
+    return len(pages), info.length
+
+def main():
+    rng = random.Random(7)
+    # Prüfwert der Ogg-CRC (CRC-32/MPEG-2 ohne Init/Xorout, "123456789" -> 0x89A1897F)
+    assert _ogg_crc(b"123456789") == 0x89A1897F, "CRC-Prüfwert falsch"
+    # Einzelne Seite aus voice.ogg_page muss von mutagen unverändert reproduziert werden
+    single = ogg_page(0x02, 0, 99, 0, bytes([19]), opus_head(312))
+    check_pages = read_pages(single)
+    assert check_pages[0][0].write() == single, "voice.ogg_page erzeugt abweichende Seite"
+    print("voice.ogg_page: CRC und Aufbau stimmen mit mutagen überein")
+
+    for count in (1, 2, 5):
+        streams, granules = [], []
+        for serial in range(count):
+            packets = [bytes(rng.randrange(256) for _ in range(rng.randint(20, 700)))
+                       for _ in range(rng.randint(3, 40))]
+            data, granule = mutagen_opus(1000 + serial, packets, pre_skip=312 + serial)
+            check_stream(data, granule, 312 + serial)  # Eingabe selbst plausibel
+            streams.append(data)
+            granules.append(granule)
+        joined = concat_ogg_opus(streams)
+        pages, length = check_stream(joined, sum(granules), 312)
+        continued = sum(1 for page, _ in read_pages(joined) if page.continued)
+        print(f"{count} Abschnitt(e): {pages} Seiten ({continued} mit Fortsetzung), {length:.2f} s - ok")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import io
+import json
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import parse_qsl, urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.latency import as_latency
+
+# Minimaler lokaler Bot-API-Stub für Benchmarks (keine echten Telegram-Aufrufe)
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+def _message(chat_id, text=None):
+    message = {
+        "message_id": random.randint(1, 2**31),
+        "date": int(time.time()),
+        "chat": {"id": int(chat_id or 1), "type": "private"},
+        "from": BOT_USER,
+    }
+    if text is not None:
+        message["text"] = text
+    return message
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _params(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("application/json") and body:
+            return json.loads(body)
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            return dict(parse_qsl(body.decode()))
+        return {}
+
+    def _send_bytes(self, status: int, data: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        if path.startswith("/file/"):
+            # Datei-Download (getFile liefert file_path = "files/<file_id>")
+            self.server.record("download")
+            self.server.sleep()
+            self._send_bytes(200, self.server.file_content(path.rsplit("/", 1)[-1]), "application/octet-stream")
+            return
+        params = self._params()
+        method = path.rsplit("/", 1)[-1]
+        self.server.record(method)
+        if method == "getUpdates":
+            body = {"ok": True, "result": self.server.poll_updates(params)}
+            self._send_bytes(200, json.dumps(body).encode(), "application/json")
+            return
+        self.server.sleep()
+        retry_after = self.server.should_throttle()
+        if retry_after:
+            body = {"ok": False, "error_code": 429, "description": "Too Many Requests",
+                    "parameters": {"retry_after": retry_after}}
+        elif method == "getMe":
+            body = {"ok": True, "result": BOT_USER}
+        elif method in ("sendMessage", "editMessageText", "sendPhoto", "sendVoice", "sendDocument"):
+            body = {"ok": True, "result": _message(params.get("chat_id"), params.get("text"))}
+        elif method == "getFile":
+            file_id = params.get("file_id", "x")
+            body = {"ok": True, "result": {"file_id": file_id, "file_unique_id": file_id,
+                                           "file_size": len(self.server.file_content(file_id)),
+                                           "file_path": f"files/{file_id}"}}
+        else:
+            body = {"ok": True, "result": True}
+        self._send_bytes(429 if retry_after else 200, json.dumps(body).encode(), "application/json")
+
+    do_GET = do_POST
+
+# Foto in der Größe der größten PhotoSize aus benchmarks/updates.py; ohne Pillow nur die JPEG-Signatur
+def _sample_jpeg(width: int = 1280, height: int = 960) -> bytes:
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        return b"\xff\xd8\xff\xe0" + b"\0" * 8192
+    image = Image.new("RGB", (width, height), (40, 90, 160))
+    draw = ImageDraw.Draw(image)
+    for x in range(0, width, 64):
+        draw.line((x, 0, width - x, height), fill=(240, 200, 40), width=3)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+class FakeTelegramServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, latency=0.02, jitter: float = 0.0, max_per_second: int = 0, seed: int = None):
+        super().__init__(("127.0.0.1", 0), FakeTelegramHandler)
+        self.latency = as_latency(latency, jitter, seed)  # Zahl, Spezifikation oder LatencyModel
+        self.max_per_second = max_per_second  # 0 = kein simuliertes Flood-Limit
+        self.calls = {}
+        self.throttled = 0
+        self.files = {}  # file_id -> Bytes; unbekannte IDs liefern file_content()
+        self._photo = None
+        self._window = (0, 0)
+        self._lock = threading.Lock()
+        self._updates = deque()
+        self._updates_ready = threading.Condition(self._lock)
+        self._thread = None
+
+    def record(self, method):
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+    def sleep(self):
+        time.sleep(self.latency.sample())
+
+    # Dateiinhalte nach Präfix der file_id: "doc…" Text, "voice…" Ogg-Header, sonst JPEG-Header
+    def file_content(self, file_id: str) -> bytes:
+        content = self.files.get(file_id)
+        if content is not None:
+            return content
+        if file_id.startswith("doc"):
+            return ("Lorem ipsum dolor sit amet. " * 400 + "\n").encode() * 5
+        if file_id.startswith("voice"):
+            return b"OggS" + b"\0" * 4096
+        if self._photo is None:
+            self._photo = _sample_jpeg()
+        return self._photo
+
+    # Updates für getUpdates (Polling) bereitstellen
+    def push_updates(self, updates: list):
+        with self._updates_ready:
+            self._updates.extend(updates)
+            self._updates_ready.notify_all()
+
+    def poll_updates(self, params: dict) -> list:
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = min(float(params.get("timeout") or 0), 1.0)
+        with self._updates_ready:
+            while self._updates and self._updates[0]["update_id"] < offset:
+                self._updates.popleft()
+            if not self._updates and timeout:
+                self._updates_ready.wait(timeout)
+            return [update for _, update in zip(range(limit), self._updates)]
+
+    # Simuliert Telegrams Flood-Control (HTTP 429 mit retry_after)
+    def should_throttle(self) -> int:
+        if not self.max_per_second:
+            return 0
+        with self._lock:
+            second = int(time.time())
+            start, count = self._window
+            if start != second:
+                start, count = second, 0
+            count += 1
+            self._window = (start, count)
+            if count > self.max_per_second:
+                self.throttled += 1
+                return 1
+        return 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/bot"
+
+    @property
+    def base_file_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/file/bot"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
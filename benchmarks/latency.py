@@ -0,0 +1,51 @@
+import math
+import random
+
+# Latenzverteilungen für die Stub-Server, reproduzierbar über einen Seed.
+# Schreibweise auf der Kommandozeile: "0.2", "uniform:0.2:0.05", "exp:0.2", "lognormal:0.2:0.5"
+class LatencyModel:
+    KINDS = ("constant", "uniform", "exp", "lognormal")
+
+    def __init__(self, kind: str = "constant", mean: float = 0.0, spread: float = 0.0, seed: int = None):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unbekannte Verteilung: {kind}")
+        self.kind = kind
+        self.mean = mean  # bei lognormal der Median
+        self.spread = spread  # uniform: ± Sekunden, lognormal: Sigma
+        self._random = random.Random(seed)
+
+    def sample(self) -> float:
+        if self.mean <= 0:
+            return 0.0
+        if self.kind == "uniform":
+            value = self.mean + self._random.uniform(-self.spread, self.spread)
+        elif self.kind == "exp":
+            value = self._random.expovariate(1 / self.mean)
+        elif self.kind == "lognormal":
+            value = self.mean * math.exp(self._random.gauss(0, self.spread))
+        else:
+            value = self.mean
+        return max(0.0, value)
+
+    def __str__(self) -> str:
+        if self.kind == "constant":
+            return f"{self.mean}"
+        if self.kind == "exp":
+            return f"exp:{self.mean}"
+        return f"{self.kind}:{self.mean}:{self.spread}"
+
+def parse_latency(spec: str, seed: int = None) -> LatencyModel:
+    parts = spec.split(":")
+    if len(parts) == 1:
+        return LatencyModel("constant", float(parts[0]), seed=seed)
+    return LatencyModel(parts[0], float(parts[1]), float(parts[2]) if len(parts) > 2 else 0.0, seed=seed)
+
+# Zahl (mit optionalem Jitter) oder fertiges Modell
+def as_latency(value, jitter: float = 0.0, seed: int = None) -> LatencyModel:
+    if isinstance(value, LatencyModel):
+        return value
+    if isinstance(value, str):
+        return parse_latency(value, seed)
+    if jitter:
+        return LatencyModel("uniform", value, jitter, seed)
+    return LatencyModel("constant", value, seed=seed)
@@ -0,0 +1,306 @@
+# Lasttest des kompletten Bots (bot.py) gegen lokale Bot-API- und OpenAI-Stubs.
+# Spielt einen synthetischen oder aufgezeichneten Update-Stream über den Webhook oder
+# per Polling ein und misst Durchsatz, Latenz (Eingang bis Ende der Handler) je Update-Art,
+# Speicherwachstum und Blockaden des Event Loops.
+# Aufruf aus dem Repo-Verzeichnis: python -m benchmarks.loadtest [--mode polling] [--replay updates.jsonl]
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.fake_telegram import FakeTelegramServer
+from benchmarks.latency import parse_latency
+from benchmarks.stub_openai import StubOpenAIServer
+from benchmarks.updates import DEFAULT_MIX, generate_updates, load_updates, parse_mix, save_updates, update_kind
+
+TOKEN = "123456:LOADTEST"
+SECRET = "loadtest-secret"
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+# Misst im Event Loop des Bots, wie stark sich kurze Timer verspäten
+class StallMonitor:
+    def __init__(self, interval: float = 0.005, threshold: float = 0.1):
+        self.interval = interval
+        self.threshold = threshold
+        self.max_stall = 0.0
+        self.stalls = 0
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            stall = loop.time() - start - self.interval
+            self.max_stall = max(self.max_stall, stall)
+            if stall > self.threshold:
+                self.stalls += 1
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+# Umgebung vor dem Import von bot.py setzen (Token, Stub-URLs, flüchtiger Zustand)
+def configure_environment(fake: FakeTelegramServer, stub: StubOpenAIServer, workdir: str):
+    os.environ.update({
+        "TELEGRAM_BOT_TOKEN": TOKEN,
+        "TELEGRAM_BASE_URL": fake.base_url,
+        "TELEGRAM_BASE_FILE_URL": fake.base_file_url,
+        "WEBHOOK_SECRET_TOKEN": SECRET,
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": stub.base_url,
+        "STATE_BACKEND_URL": "memory://",
+        "CACHE_DIR": "",
+        "JOBS_DB_PATH": os.path.join(workdir, "jobs.db"),
+    })
+    os.environ.pop("WEBHOOK_URL", None)
+
+class LoadTest:
+    def __init__(self, bot, updates: list, rate: float):
+        self.bot = bot
+        self.updates = updates
+        self.rate = rate
+        self.kinds = {update["update_id"]: update_kind(update) for update in updates}
+        self.submitted = {}
+        self.latencies = {}
+        self.finished = threading.Event()
+        self.monitor = StallMonitor()
+        self.rejected = {}
+
+    # Läuft nach allen anderen Handlern eines Updates (höchste Gruppe)
+    async def on_done(self, update, context):
+        submitted = self.submitted.get(update.update_id)
+        if submitted is not None and update.update_id not in self.latencies:
+            self.latencies[update.update_id] = time.perf_counter() - submitted
+            if len(self.latencies) + sum(self.rejected.values()) >= len(self.updates):
+                self.finished.set()
+
+    async def _paced(self, submit):
+        start = time.perf_counter()
+        for index, update in enumerate(self.updates):
+            if self.rate:
+                delay = start + index / self.rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            self.submitted[update["update_id"]] = time.perf_counter()
+            await submit(update)
+
+    async def feed_webhook(self, url: str, concurrency: int = 64):
+        import httpx
+        semaphore = asyncio.Semaphore(concurrency)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+            pending = []
+
+            async def post(update):
+                async with semaphore:
+                    response = await client.post(url, json=update, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})
+                if response.status_code != 200:
+                    self.rejected[response.status_code] = self.rejected.get(response.status_code, 0) + 1
+
+            async def submit(update):
+                await semaphore.acquire()
+                semaphore.release()
+                pending.append(asyncio.create_task(post(update)))
+
+            await self._paced(submit)
+            await asyncio.gather(*pending)
+
+    async def feed_polling(self, fake: FakeTelegramServer):
+        async def submit(update):
+            fake.push_updates([update])
+        await self._paced(submit)
+
+    def report(self, elapsed: float, rss_before: float, rss_after: float) -> dict:
+        from metrics import HANDLER_ERRORS
+        by_kind = {}
+        for update_id, latency in self.latencies.items():
+            by_kind.setdefault(self.kinds[update_id], []).append(latency)
+        all_latencies = list(self.latencies.values())
+        return {
+            "updates": len(self.updates),
+            "completed": len(self.latencies),
+            "rejected": self.rejected,
+            "seconds": elapsed,
+            "throughput": len(self.latencies) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(all_latencies, 0.5) * 1000,
+            "p99_ms": percentile(all_latencies, 0.99) * 1000,
+            "by_kind": {kind: {"count": len(values), "p50_ms": percentile(values, 0.5) * 1000,
+                               "p99_ms": percentile(values, 0.99) * 1000}
+                        for kind, values in sorted(by_kind.items())},
+            "rss_before_mb": rss_before,
+            "rss_after_mb": rss_after,
+            "rss_peak_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "max_stall_ms": self.monitor.max_stall * 1000,
+            "stalls_over_100ms": self.monitor.stalls,
+            "handler_errors": sum(HANDLER_ERRORS._values.values()),
+        }
+
+def run_webhook(bot, test: LoadTest, timeout: float):
+    import uvicorn
+    port = free_port()
+    bot.app.on_startup.append(test.monitor.start)
+    bot.app.on_stop.append(test.monitor.stop)
+    server = uvicorn.Server(uvicorn.Config(bot.app, host="127.0.0.1", port=port, log_level="error",
+                                           access_log=False, lifespan="on"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    start = time.perf_counter()
+    asyncio.run(test.feed_webhook(f"http://127.0.0.1:{port}{bot.app.path}"))
+    test.finished.wait(timeout)
+    elapsed = time.perf_counter() - start
+    server.should_exit = True
+    thread.join(30)
+    return elapsed
+
+def run_polling(bot, test: LoadTest, fake: FakeTelegramServer, timeout: float):
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    from runtime import PollingIngress
+    ingress = PollingIngress(bot.application.bot, bot.scheduler, timeout=1)
+
+    async def startup():
+        await bot.app.startup()
+        await test.monitor.start()
+        await ingress.start()
+
+    async def shutdown():
+        await ingress.stop()
+        await test.monitor.stop()
+        await bot.app.shutdown()
+
+    asyncio.run_coroutine_threadsafe(startup(), loop).result()
+    start = time.perf_counter()
+    asyncio.run(test.feed_polling(fake))
+    test.finished.wait(timeout)
+    elapsed = time.perf_counter() - start
+    asyncio.run_coroutine_threadsafe(shutdown(), loop).result(60)
+    loop.call_soon_threadsafe(loop.stop)
+    return elapsed
+
+def print_report(result: dict, fake: FakeTelegramServer):
+    print(f"Updates: {result['completed']}/{result['updates']} verarbeitet in {result['seconds']:.1f}s "
+          f"({result['throughput']:.1f}/s), abgelehnt: {result['rejected'] or 0}")
+    print(f"Latenz gesamt: p50 {result['p50_ms']:.0f} ms, p99 {result['p99_ms']:.0f} ms")
+    for kind, stats in result["by_kind"].items():
+        print(f"  {kind:<9} {stats['count']:>6}  p50 {stats['p50_ms']:>8.0f} ms  p99 {stats['p99_ms']:>8.0f} ms")
+    print(f"Speicher (RSS): {result['rss_before_mb']:.0f} -> {result['rss_after_mb']:.0f} MB "
+          f"(Spitze {result['rss_peak_mb']:.0f} MB)")
+    print(f"Event Loop: max. Blockade {result['max_stall_ms']:.0f} ms, {result['stalls_over_100ms']} x über 100 ms")
+    print(f"Handler-Fehler: {result['handler_errors']}")
+    print(f"Bot-API-Aufrufe: {dict(sorted(fake.calls.items()))}, HTTP 429: {fake.throttled}")
+
+# Vergleich mit einem gespeicherten Ergebnis; Rückgabe: Liste der Verschlechterungen
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    if result["throughput"] < baseline["throughput"] * (1 - tolerance):
+        regressions.append(f"Durchsatz {result['throughput']:.1f}/s < {baseline['throughput']:.1f}/s")
+    for key in ("p50_ms", "p99_ms", "max_stall_ms"):
+        if result[key] > baseline[key] * (1 + tolerance) and result[key] - baseline[key] > 5:
+            regressions.append(f"{key} {result[key]:.0f} > {baseline[key]:.0f}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=("webhook", "polling"), default="webhook")
+    parser.add_argument("--updates", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=0, help="Updates pro Sekunde, 0 = so schnell wie möglich")
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--mix", default=",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()))
+    parser.add_argument("--repeat-media", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--replay", help="aufgezeichnete Updates (JSON Lines) statt synthetischer")
+    parser.add_argument("--save-updates", help="erzeugten Update-Stream speichern")
+    parser.add_argument("--openai-latency", default="lognormal:0.3:0.4")
+    parser.add_argument("--telegram-latency", default="uniform:0.03:0.01")
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--json", help="Ergebnis als JSON speichern")
+    parser.add_argument("--baseline", help="früheres --json-Ergebnis; bei Verschlechterung Exit-Code 1")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.replay:
+        updates = load_updates(args.replay)
+    else:
+        updates = generate_updates(args.updates, args.chats, parse_mix(args.mix), args.seed,
+                                   repeat_media=args.repeat_media)
+    if args.save_updates:
+        save_updates(args.save_updates, updates)
+
+    fake = FakeTelegramServer(latency=parse_latency(args.telegram_latency, args.seed)).start()
+    stub = StubOpenAIServer(latency=parse_latency(args.openai_latency, args.seed),
+                            reply_text="Das ist eine Stub-Antwort mit ein paar Wörtern mehr.",
+                            token_delay=args.token_delay).start()
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    configure_environment(fake, stub, workdir)
+
+    rss_before = rss_mb()
+    import bot
+    from telegram import Update
+    from telegram.ext import TypeHandler
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    test = LoadTest(bot, updates, args.rate)
+    bot.application.add_handler(TypeHandler(Update, test.on_done), group=99)
+    try:
+        if args.mode == "webhook":
+            elapsed = run_webhook(bot, test, args.timeout)
+        else:
+            elapsed = run_polling(bot, test, fake, args.timeout)
+        result = test.report(elapsed, rss_before, rss_mb())
+        result.update({"mode": args.mode, "openai_latency": args.openai_latency,
+                       "telegram_latency": args.telegram_latency})
+    finally:
+        fake.stop()
+        stub.stop()
+
+    print_report(result, fake)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Verschlechterung: {regression}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
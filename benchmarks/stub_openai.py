@@ -0,0 +1,164 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.latency import as_latency
+from voice import ogg_page
+
+# Minimaler lokaler OpenAI-Stub für Benchmarks (keine echten API-Aufrufe)
+
+def _chat_completion(content: str) -> dict:
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "stub",
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+    }
+
+# Gültiges Ogg/Opus (Kopfseiten + Audioseiten), Länge grob proportional zum Text (ca. 60 ms pro Zeichen)
+def _ogg_opus(text: str, serial: int = 1) -> bytes:
+    head = b"OpusHead" + bytes([1, 1]) + (312).to_bytes(2, "little") + (48000).to_bytes(4, "little") + bytes(3)
+    tags = b"OpusTags" + (4).to_bytes(4, "little") + b"stub" + bytes(4)
+    pages = [ogg_page(0x02, 0, serial, 0, bytes([len(head)]), head),
+             ogg_page(0, 0, serial, 1, bytes([len(tags)]), tags)]
+    frames = max(1, len(text) * 3)  # 20-ms-Frames
+    granule = 312
+    for sequence, start in enumerate(range(0, frames, 50), start=2):
+        count = min(50, frames - start)
+        granule += count * 960
+        flags = 0x04 if start + count >= frames else 0
+        pages.append(ogg_page(flags, granule, serial, sequence, bytes([80] * count), bytes(80 * count)))
+    return b"".join(pages)
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    # Abgebrochene Anfragen (Timeout, Hedging) schließen die Verbindung vor der Antwort
+    def handle_one_request(self):
+        try:
+            super().handle_one_request()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _send(self, body: bytes, content_type: str = "application/json"):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Server-Sent Events wie bei stream=True, ein Wort pro Chunk
+    def _stream(self, content: str):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for word in content.split(" "):
+            chunk = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": "stub",
+                "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(self.server.token_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        try:
+            params = json.loads(body) if body else {}
+        except ValueError:
+            params = {}  # z.B. multipart bei Transkriptionen
+        model = params.get("model")
+        self.server.sleep(model)
+        if self.server.fails(model):
+            body = json.dumps({"error": {"message": "Stub: Modell gestört", "type": "server_error"}}).encode()
+            self.send_response(503)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.path.endswith("/chat/completions") and params.get("stream"):
+            self._stream(self.server.reply_text)
+        elif self.path.endswith("/chat/completions"):
+            time.sleep(self.server.token_delay * len(self.server.reply_text.split(" ")))  # wie beim Streamen generiert
+            self._send(json.dumps(_chat_completion(self.server.reply_text)).encode())
+        elif self.path.endswith("/audio/speech"):
+            text = params.get("input") or ""
+            if self.server.tts_chars_per_second:
+                time.sleep(len(text) / self.server.tts_chars_per_second)
+            if params.get("response_format") == "opus":
+                self._send(_ogg_opus(text), "audio/ogg")
+            else:
+                self._send(b"ID3" + b"\0" * 1024, "audio/mpeg")
+        elif self.path.endswith("/embeddings"):
+            data = [{"object": "embedding", "index": i, "embedding": [0.1] * 8}
+                    for i, _ in enumerate(params.get("input") or [""])]
+            self._send(json.dumps({"object": "list", "data": data, "model": "stub",
+                                   "usage": {"prompt_tokens": 1, "total_tokens": 1}}).encode())
+        elif self.path.endswith("/audio/transcriptions"):
+            self._send(self.server.reply_text.encode(), "text/plain")
+        elif self.path.endswith("/images/generations"):
+            body = {"created": int(time.time()), "data": [{"url": "https://example.invalid/image.png"}]}
+            self._send(json.dumps(body).encode())
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+class StubOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, latency=0.2, jitter: float = 0.0, reply_text: str = "Stub-Antwort",
+                 token_delay: float = 0.0, seed: int = None, tts_chars_per_second: float = 0.0,
+                 model_latency: dict = None, model_errors: dict = None):
+        super().__init__(("127.0.0.1", 0), StubOpenAIHandler)
+        self.latency = as_latency(latency, jitter, seed)  # Zahl, Spezifikation oder LatencyModel
+        # Abweichende Latenz bzw. Anteil von 503-Antworten pro Modell (z.B. ein gestörtes Modell)
+        self.model_latency = {model: as_latency(value, seed=seed) for model, value in (model_latency or {}).items()}
+        self.model_errors = model_errors or {}
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self.reply_text = reply_text
+        self.token_delay = token_delay
+        self.tts_chars_per_second = tts_chars_per_second  # zusätzliche TTS-Dauer je nach Textlänge
+        self._thread = None
+
+    def sleep(self, model: str = None):
+        time.sleep(self.model_latency.get(model, self.latency).sample())
+
+    def fails(self, model: str = None) -> bool:
+        rate = self.model_errors.get(model, 0.0)
+        with self._random_lock:
+            return rate > 0 and self._random.random() < rate
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,76 @@
+import json
+import random
+import time
+
+# Synthetische Update-Streams (Text, Foto, Sprache, Dokument) sowie Laden/Speichern
+# aufgezeichneter Streams als JSON Lines (siehe UPDATE_RECORD_PATH in webhook_server.py)
+
+DEFAULT_MIX = {"text": 70, "photo": 15, "voice": 10, "document": 5}
+KINDS = ("text", "photo", "voice", "document")
+
+QUESTIONS = ("Wie wird das Wetter morgen?", "Erkläre mir Quantencomputer in zwei Sätzen.",
+             "Was ist der Sinn des Lebens?", "Schreib mir ein kurzes Gedicht über Kaffee.",
+             "Welche Hauptstadt hat Australien?")
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in KINDS:
+            raise ValueError(f"Unbekannte Update-Art: {kind}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+def update_kind(update: dict) -> str:
+    message = update.get("message") or {}
+    for kind in ("photo", "voice", "document"):
+        if kind in message:
+            return kind
+    return "text"
+
+# repeat_media: Anteil der Medien, die eine bereits gesendete Datei erneut verwenden (Cache-Treffer)
+def generate_updates(count: int, chats: int = 100, mix: dict = None, seed: int = 1, start_id: int = 1,
+                     repeat_media: float = 0.0) -> list:
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    kinds, weights = zip(*mix.items())
+    seen = {kind: [] for kind in KINDS}
+    updates = []
+    for offset in range(count):
+        update_id = start_id + offset
+        chat_id = 1000 + rng.randrange(chats)
+        kind = rng.choices(kinds, weights)[0]
+        message = {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"Last{chat_id}"},
+        }
+        file_id = f"{'doc' if kind == 'document' else kind}{update_id}"
+        if kind != "text" and seen[kind] and rng.random() < repeat_media:
+            file_id = rng.choice(seen[kind])
+        seen[kind].append(file_id)
+        if kind == "text":
+            message["text"] = rng.choice(QUESTIONS)
+        elif kind == "photo":
+            message["photo"] = [
+                {"file_id": f"{file_id}s", "file_unique_id": f"{file_id}s", "width": 90, "height": 90, "file_size": 1024},
+                {"file_id": file_id, "file_unique_id": file_id, "width": 1280, "height": 960, "file_size": 8196},
+            ]
+        elif kind == "voice":
+            message["voice"] = {"file_id": file_id, "file_unique_id": file_id, "duration": 3,
+                                "mime_type": "audio/ogg", "file_size": 4100}
+        else:
+            message["document"] = {"file_id": file_id, "file_unique_id": file_id, "file_name": f"{file_id}.txt",
+                                   "mime_type": "text/plain", "file_size": 56005}
+        updates.append({"update_id": update_id, "message": message})
+    return updates
+
+def load_updates(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def save_updates(path: str, updates: list):
+    with open(path, "w", encoding="utf-8") as f:
+        for update in updates:
+            f.write(json.dumps(update, ensure_ascii=False) + "\n")
@@ -1,35 +1,31 @@
 import os
-import logging
 import asyncio
-import threading
-import openai
-import telegram
-import base64
-from flask import Flask, request
+import logging
 from telegram.ext import Application, CommandHandler, MessageHandler, filters
-from telegram.request import HTTPXRequest
 from io import BytesIO
-
-# Zusätzliche Bibliotheken für Dateiverarbeitung und -erstellung
-try:
-    import PyPDF2
-    from reportlab.lib.pagesizes import letter
-    from reportlab.pdfgen import canvas
-except ImportError:
-    PyPDF2 = None
-try:
-    import docx
-except ImportError:
-    docx = None
-try:
-    import pandas as pd
-    import openpyxl
-except ImportError:
-    pd = None
+from openai_client import get_client, limit, close_client, record_usage, warm_up_client
+from conversation import ConversationStore
+from model_router import ModelRouter, estimate_tokens
+from storage import create_backend
+from webhook_server import WebhookServer
+from scheduler import UpdateScheduler
+from streaming import STREAM_REPLIES, ProgressMessage, StreamingReply, stream_reply
+from summarize import Summarizer
+from cache import ResponseCache, cache_key
+from media import download_media
+from images import VISION_DETAIL, AlbumCollector, choose_photo_size, image_part, prepare_image_async
+from retrieval import DocumentStore
+from extraction import EXTRACT_MAX_BYTES, ExtractionError, extract_text, shutdown_pool
+from outbound import COALESCE, OUTBOUND_POOL_SIZE, LazyRequest, OutboundLimiter
+from metrics import instrumented, register_stats, start_loop_monitor, stop_loop_monitor
+from jobs import BackgroundJobs
+from render import RENDER_FORMATS, RENDER_STREAMING, create_renderer, render_document
+from voice import VOICE_TEXT_FIRST, VOICE_TTS_FORMAT, VOICE_TTS_MODEL, VOICE_TTS_VOICE, VoiceReply
 
 # Umgebungsvariablen
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+TELEGRAM_BASE_URL = os.getenv("TELEGRAM_BASE_URL", "https://api.telegram.org/bot")  # z.B. Fake-Server für Lasttests
+TELEGRAM_BASE_FILE_URL = os.getenv("TELEGRAM_BASE_FILE_URL", "https://api.telegram.org/file/bot")
 WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # z.B. "https://deinedomain.de/webhook"
 
 # Logging konfigurieren
@@ -38,255 +34,440 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Flask-App initialisieren
-app = Flask(__name__)
-openai.api_key = OPENAI_API_KEY
-
-# Telegram Bot und Application initialisieren
-request_instance = HTTPXRequest(pool_timeout=20)
-bot = telegram.Bot(token=TELEGRAM_BOT_TOKEN, request=request_instance)
-application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
-
-# Globale Speicher
-chat_histories = {}
-doc_texts = {}
-
-def get_chat_history(chat_id: str):
-    if chat_id not in chat_histories:
-        chat_histories[chat_id] = [{
-            "role": "system",
-            "content": ( "Fast immer bist du sehr stark ironisch und sarkastisch. Ab und zu bis du sehr frech dass es fast nicht mehr auszuhalten ist. Manchmal haben deine antworten keinen bezug zur frage, statt dessen philosophierst du von der Liebe.You are an AI assistant for a Telegram bot. Answer concisely and helpfully. "
-                       )
-        }]
-    return chat_histories[chat_id]
-
-# OpenAI-Funktion: Generierung von Textantworten (GPT-4)
-def generate_response(chat_id: str, message: str) -> str:
-    history = get_chat_history(chat_id)
-    history.append({"role": "user", "content": message})
-    client = openai.OpenAI(api_key=OPENAI_API_KEY)
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=history,
-        max_tokens=1500,
-    )
-    reply = response.choices[0].message.content.strip()
-    history.append({"role": "assistant", "content": reply})
+# Telegram Application initialisieren; Updates (Webhook oder Polling) verteilt der Scheduler (pro Chat geordnet, Chats parallel),
+# ausgehende Aufrufe drosselt der OutboundLimiter (Flood-Limits, RetryAfter); die HTTP-Clients
+# entstehen erst beim Start (LazyRequest), der Import von bot.py baut keine Verbindungen auf
+outbound = OutboundLimiter()
+application = (
+    Application.builder()
+    .token(TELEGRAM_BOT_TOKEN)
+    .base_url(TELEGRAM_BASE_URL)
+    .base_file_url(TELEGRAM_BASE_FILE_URL)
+    .concurrent_updates(True)
+    .request(LazyRequest(connection_pool_size=OUTBOUND_POOL_SIZE, pool_timeout=20))
+    .get_updates_request(LazyRequest())
+    .rate_limiter(outbound)
+    .updater(None)  # Long Polling übernimmt runtime.PollingIngress
+    .build()
+)
+
+# Hinweis, wenn ein Nutzer über SCHEDULER_USER_RATE hinaus sendet und Updates verworfen werden
+async def notify_rate_limited(update):
+    if update.effective_chat is not None:
+        await application.bot.send_message(chat_id=update.effective_chat.id,
+                                           text="Zu viele Nachrichten auf einmal – bitte etwas langsamer, einige wurden übersprungen.")
+
+scheduler = UpdateScheduler(application.process_update, on_rate_limited=notify_rate_limited)
+# Modellwahl pro Aufgabe (Routen, Fallback, Hedging über MODEL_*-Umgebungsvariablen)
+models = ModelRouter()
+
+# Systemprompt für alle Chats
+SYSTEM_PROMPT = ( "Fast immer bist du sehr stark ironisch und sarkastisch. Ab und zu bis du sehr frech dass es fast nicht mehr auszuhalten ist. Manchmal haben deine antworten keinen bezug zur frage, statt dessen philosophierst du von der Liebe.You are an AI assistant for a Telegram bot. Answer concisely and helpfully. "
+                )
+
+VISION_PROMPT = "Was ist auf diesem Bild zu sehen?"
+VISION_ALBUM_PROMPT = "Was ist auf diesen Bildern zu sehen?"
+
+# Rollierende Zusammenfassung älterer Turns (aktivierbar über CHAT_HISTORY_SUMMARIZE=1)
+async def summarize_history(previous_summary: str, messages: list) -> str:
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    prompt = [
+        {"role": "system", "content": "Fasse den Gesprächsverlauf knapp zusammen. Behalte Fakten, Namen und offene Fragen."},
+        {"role": "user", "content": f"Bisherige Zusammenfassung:\n{previous_summary}\n\nNeue Nachrichten:\n{transcript}"},
+    ]
+    async with limit("chat") as timeout:
+        response = await models.call("summary", lambda model, client: client.chat.completions.create(
+            model=model,
+            messages=prompt,
+            max_tokens=300,
+            timeout=timeout,
+        ), prompt_tokens=estimate_tokens(prompt), max_tokens=300)
+    record_usage("chat", response)
+    return response.choices[0].message.content.strip()
+
+# OpenAI-Funktion: Embeddings für die Dokumentsuche (aktivierbar über RETRIEVAL_EMBEDDINGS=1)
+async def embed_texts(texts: list) -> list:
+    vectors = []
+    for start in range(0, len(texts), 100):
+        async with limit("embeddings") as timeout:
+            response = await get_client().embeddings.create(
+                model="text-embedding-3-small",
+                input=texts[start:start + 100],
+                timeout=timeout,
+            )
+        record_usage("embeddings", response)
+        vectors.extend(item.embedding for item in response.data)
+    return vectors
+
+# Globale Speicher (Backend über STATE_BACKEND_URL wählbar)
+state = create_backend()
+conversations = ConversationStore(
+    SYSTEM_PROMPT,
+    summarizer=summarize_history if os.getenv("CHAT_HISTORY_SUMMARIZE") == "1" else None,
+    backend=state,
+)
+# OpenAI-Funktion: Zusammenfassung eines Dokumentabschnitts (Map) bzw. der Teilzusammenfassungen (Reduce)
+async def complete_summary(text: str, final: bool) -> str:
+    instruction = ("Fasse den folgenden Text zusammen:" if final else
+                   "Fasse diesen Abschnitt eines längeren Dokuments stichpunktartig zusammen. Behalte Fakten, Zahlen und Namen:")
+    prompt = [
+        {"role": "system", "content": SYSTEM_PROMPT if final else "Du fasst Dokumente sachlich zusammen."},
+        {"role": "user", "content": f"{instruction}\n\n{text}"},
+    ]
+    task = "summary_final" if final else "summary"
+    async with limit("chat") as timeout:
+        response = await models.call(task, lambda model, client: client.chat.completions.create(
+            model=model,
+            messages=prompt,
+            max_tokens=1000 if final else 500,
+            timeout=timeout,
+        ), prompt_tokens=estimate_tokens(prompt), max_tokens=1000 if final else 500)
+    record_usage("chat", response)
+    return response.choices[0].message.content.strip()
+
+response_cache = ResponseCache()
+album_photos = AlbumCollector()
+summarizer = Summarizer(complete_summary, response_cache)
+documents = DocumentStore(
+    state,
+    embedder=embed_texts if os.getenv("RETRIEVAL_EMBEDDINGS") == "1" else None,
+)
+
+# OpenAI-Funktion: Textantwort auf eine fertige Nachrichtenliste (ändert keinen Verlauf)
+async def complete_chat(messages: list) -> str:
+    async with limit("chat") as timeout:
+        response = await models.call("chat", lambda model, client: client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=1500,
+            timeout=timeout,
+        ), prompt_tokens=estimate_tokens(messages), max_tokens=1500)
+    record_usage("chat", response)
+    return response.choices[0].message.content.strip()
+
+# OpenAI-Funktion: Textantwort als Stream (liefert die Tokens, sobald sie eintreffen)
+async def stream_chat(messages: list):
+    # Fallback/Hedging nur bis zum Beginn der Antwort; ein begonnener Stream wird nicht gewechselt
+    async with limit("chat") as timeout:
+        stream = await models.call("chat", lambda model, client: client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=1500,
+            stream=True,
+            timeout=timeout,
+        ), prompt_tokens=estimate_tokens(messages))
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+
+# Generierung von Textantworten im Chatverlauf (GPT-4)
+async def generate_response(chat_id: str, message: str) -> str:
+    await conversations.append(chat_id, "user", message)
+    reply = await complete_chat(await conversations.prompt(chat_id))
+    await conversations.append(chat_id, "assistant", reply)
     return reply
 
-# OpenAI-Funktion: Sprachgenerierung (Text-zu-Speech)
-def generate_audio_response(text: str) -> bytes:
-    client = openai.OpenAI(api_key=OPENAI_API_KEY)
-    response = client.audio.speech.create(
-        model="tts-1",
-        voice="sage",
-        input=text
-    )
-    return response.content
+async def generate_response_stream(chat_id: str, message: str):
+    await conversations.append(chat_id, "user", message)
+    parts = []
+    async for delta in stream_chat(await conversations.prompt(chat_id)):
+        parts.append(delta)
+        yield delta
+    await conversations.append(chat_id, "assistant", "".join(parts).strip())
+
+# OpenAI-Funktion: Sprachgenerierung (Text-zu-Speech) als Ogg/Opus, identische Texte kommen aus dem Cache
+async def generate_audio_response(text: str) -> bytes:
+    async def synthesize():
+        async with limit("tts") as timeout:
+            response = await get_client().audio.speech.create(
+                model=VOICE_TTS_MODEL,
+                voice=VOICE_TTS_VOICE,
+                input=text,
+                response_format=VOICE_TTS_FORMAT,
+                timeout=timeout,
+            )
+        return response.content
+    key = cache_key("tts", VOICE_TTS_MODEL, VOICE_TTS_VOICE, VOICE_TTS_FORMAT, text)
+    return await response_cache.get_or_compute(key, synthesize)
+
+# Cache-Schlüssel für Telegram-Dateien: file_unique_id ist für weitergeleitete Dateien identisch
+def transcription_cache_key(file_unique_id: str) -> str:
+    return cache_key("transcription", "whisper-1", "text", file_unique_id)
+
+def vision_cache_key(file_unique_ids: list) -> str:
+    return cache_key("vision", models.primary("vision"), VISION_PROMPT, 300, VISION_DETAIL, file_unique_ids)
 
 # OpenAI-Funktion: Sprachanalyse (Transkription via Whisper)
-def transcribe_audio(audio_path: str) -> str:
-    client = openai.OpenAI(api_key=OPENAI_API_KEY)
-    with open(audio_path, "rb") as audio_file:
-        transcription = client.audio.transcriptions.create(
+async def transcribe_audio(audio, filename: str = "voice.ogg") -> str:
+    async with limit("transcription") as timeout:
+        transcription = await get_client().audio.transcriptions.create(
             model="whisper-1",
-            file=audio_file,
-            response_format="text"
+            file=(filename, audio),
+            response_format="text",
+            timeout=timeout,
         )
     return transcription
 
-# OpenAI-Funktion: Bildanalyse via Vision API
-def analyze_image(image_path: str) -> str:
-    client = openai.OpenAI(api_key=OPENAI_API_KEY)
-    with open(image_path, "rb") as image_file:
-        base64_image = base64.b64encode(image_file.read()).decode("utf-8")
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "user", "content": [
-                {"type": "text", "text": "Was ist auf diesem Bild zu sehen?"},
-                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}},
-            ]},
-        ],
-        max_tokens=300,
-    )
+# OpenAI-Funktion: Bildanalyse via Vision API; mehrere Bilder (Album) in einer Anfrage
+async def analyze_images(images: list) -> str:
+    prompt = VISION_PROMPT if len(images) == 1 else VISION_ALBUM_PROMPT
+    content = [{"type": "text", "text": prompt}] + [image_part(data, mime) for data, mime in images]
+    max_tokens = 300 * min(len(images), 3)
+    async with limit("vision") as timeout:
+        response = await models.call("vision", lambda model, client: client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": content}],
+            max_tokens=max_tokens,
+            timeout=timeout,
+        ), max_tokens=max_tokens)
+    record_usage("vision", response)
     return response.choices[0].message.content
 
-# OpenAI-Funktion: Bilderstellung (DALL·E‑3)
-def generate_image(prompt: str) -> str:
-    client = openai.OpenAI(api_key=OPENAI_API_KEY)
-    response = client.images.generate(
-        model="dall-e-3",
-        prompt=prompt,
-        size="1024x1024",
-        quality="standard",
-        n=1,
-    )
+# OpenAI-Funktion: Bilderstellung (DALL·E‑3, Fallback DALL·E‑2 ohne quality-Parameter)
+async def generate_image(prompt: str) -> str:
+    def request(model, client):
+        options = {"quality": "standard"} if model == "dall-e-3" else {}
+        return client.images.generate(
+            model=model,
+            prompt=prompt,
+            size="1024x1024",
+            n=1,
+            timeout=timeout,
+            **options,
+        )
+    async with limit("images") as timeout:
+        response = await models.call("images", request)
     return response.data[0].url
 
+# Hintergrundaufträge: Bildgenerierung und Dateierstellung blockieren keine Handler,
+# das Ergebnis wird nach Fertigstellung an alle wartenden Chats gesendet
+# Quittungen und Fehlermeldungen sind kurze Statustexte und dürfen zusammengefasst werden
+background_jobs = BackgroundJobs(
+    notify=lambda chat_id, text: application.bot.send_message(chat_id=chat_id, text=text, rate_limit_args=COALESCE)
+)
+
+async def run_image_job(payload, jobs):
+    return await generate_image(payload["prompt"])
+
+async def deliver_image(chat_id, payload, image_url):
+    if payload.get("history"):
+        await conversations.append(chat_id, "assistant", f"[Bild] {image_url}")
+    await application.bot.send_photo(chat_id=chat_id, photo=image_url)
+
+# Inhalt über die OpenAI API erzeugen; mit RENDER_STREAMING wird Zeile für Zeile gerendert,
+# während die Antwort noch gestreamt wird, sonst der komplette Text in einem Worker-Prozess.
+# Der Auftrag läuft außerhalb des Schedulers und arbeitet daher auf einer Kopie des Verlaufs;
+# Auftrag und Antwort werden erst bei der Auslieferung eingetragen (auch nach einem Neustart nur einmal).
+async def run_create_job(payload, jobs):
+    messages = await conversations.snapshot(payload["chat_id"], payload["prompt"])
+    if not RENDER_STREAMING:
+        text = await complete_chat(messages)
+        return {"text": text, "data": await jobs.run_in_process(render_document, payload["format"], text)}
+    renderer = create_renderer(payload["format"])
+    parts = []
+    async for delta in stream_chat(messages):
+        parts.append(delta)
+        renderer.feed(delta)
+    return {"text": "".join(parts).strip(), "data": await asyncio.to_thread(renderer.finish)}
+
+async def deliver_create(chat_id, payload, result):
+    await conversations.append_many(chat_id, [
+        {"role": "user", "content": payload["prompt"]},
+        {"role": "assistant", "content": result["text"]},
+    ])
+    await application.bot.send_document(
+        chat_id=chat_id, document=BytesIO(result["data"]), filename=f"output_{chat_id}.{payload['format']}"
+    )
+
+background_jobs.register("image", run_image_job, deliver_image)
+background_jobs.register("create", run_create_job, deliver_create)
+
+async def acknowledge_job(bot, chat_id, job_id, created):
+    if created:
+        text = f"Auftrag {job_id} angenommen, ich melde mich, sobald er fertig ist. (/jobs, /cancel {job_id})"
+    else:
+        text = f"Ein gleicher Auftrag läuft bereits ({job_id}), du bekommst das Ergebnis ebenfalls."
+    await bot.send_message(chat_id=chat_id, text=text, rate_limit_args=COALESCE)
+
+async def submit_image_job(bot, chat_id, prompt, history=False):
+    job_id, created = await background_jobs.submit(
+        "image", chat_id, {"prompt": prompt, "history": history}, dedup_key=cache_key("image", prompt, history))
+    await acknowledge_job(bot, chat_id, job_id, created)
+
 # Handler für den /start-Befehl
+@instrumented
 async def start(update, context):
     await update.message.reply_text(
         "Hallo! Ich bin dein AI-gestützter Telegram-Bot.\n"
         "Du kannst mir Nachrichten, Bilder, Sprachnachrichten oder Dokumente (PDF, DOCX, XLS/XLSX, TXT) senden.\n"
         "Mit /create <format> <Text-Befehl> kannst du Dateien (pdf, docx, xlsx, html) erstellen.\n"
         "Bei /create wird der Text-Befehl über die OpenAI API verarbeitet, um z.B. alle Monate zeilenweise auszugeben.\n"
-        "Anschließend wird die Datei erstellt und an dich gesendet."
+        "Anschließend wird die Datei im Hintergrund erstellt und an dich gesendet.\n"
+        "/jobs zeigt deine offenen Aufträge, /cancel <ID> bricht einen ab."
     )
 
+# Fehler aus Handlern mit Traceback protokollieren
+async def error_handler(update, context):
+    logger.error(f"Fehler bei Update {getattr(update, 'update_id', None)}", exc_info=context.error)
+
 # Handler für Textnachrichten
+@instrumented
 async def handle_message(update, context):
     chat_id = str(update.effective_chat.id)
     message = update.message.text
     if message.lower().startswith("erstelle ein bild von") or message.lower().startswith("generate an image of"):
         prompt = message.lower().replace("erstelle ein bild von", "").replace("generate an image of", "").strip()
-        image_url = generate_image(prompt)
-        get_chat_history(chat_id).append({"role": "user", "content": f"[Bildgenerierung] {prompt}"})
-        get_chat_history(chat_id).append({"role": "assistant", "content": f"[Bild] {image_url}"})
-        await context.bot.send_photo(chat_id=chat_id, photo=image_url)
+        await conversations.append(chat_id, "user", f"[Bildgenerierung] {prompt}")
+        await submit_image_job(context.bot, chat_id, prompt, history=True)
+    elif STREAM_REPLIES:
+        await stream_reply(context.bot, chat_id, generate_response_stream(chat_id, message))
     else:
-        reply = generate_response(chat_id, message)
+        reply = await generate_response(chat_id, message)
         await context.bot.send_message(chat_id=chat_id, text=reply)
 
 # Handler für empfangene Fotos (Bildanalyse)
+@instrumented
 async def handle_photo(update, context):
     chat_id = str(update.effective_chat.id)
-    photo = update.message.photo[-1]
-    file = await bot.get_file(photo.file_id)
-    image_path = f"temp_{photo.file_id}.jpg"
-    await file.download_to_drive(image_path)
-    
-    description = analyze_image(image_path)
-    os.remove(image_path)
-    
-    await context.bot.send_message(chat_id=chat_id, text=f"Bildanalyse: {description}")
+    photo = choose_photo_size(update.message.photo)
+    if update.message.media_group_id:
+        # Fotos eines Albums kommen als einzelne Updates und werden gemeinsam beschrieben
+        album_photos.add((chat_id, update.message.media_group_id), photo,
+                         lambda photos: describe_photos(context.bot, chat_id, photos))
+        return
+    await describe_photos(context.bot, chat_id, [photo])
+
+# Foto laden und für die Vision-API verkleinern/neu kodieren; liefert (Bytes, MIME-Typ)
+async def load_image(bot, photo) -> tuple:
+    with await download_media(bot, photo.file_id, photo.file_size) as buffer:
+        data = buffer.read()
+    return await prepare_image_async(data)
+
+async def describe_photos(bot, chat_id: str, photos: list):
+    async def describe():
+        images = await asyncio.gather(*(load_image(bot, photo) for photo in photos))
+        return await analyze_images(list(images))
+
+    key = vision_cache_key([photo.file_unique_id for photo in photos])
+    description = await response_cache.get_or_compute_text(key, describe)
+    await bot.send_message(chat_id=chat_id, text=f"Bildanalyse: {description}")
 
 # Handler für Sprachnachrichten (Voice-Input)
+@instrumented
 async def handle_voice(update, context):
     chat_id = str(update.effective_chat.id)
     voice = update.message.voice
-    file = await bot.get_file(voice.file_id)
-    audio_path = f"temp_{voice.file_id}.ogg"
-    await file.download_to_drive(audio_path)
-    
-    text = transcribe_audio(audio_path)
-    os.remove(audio_path)
+
+    async def transcribe():
+        with await download_media(context.bot, voice.file_id, voice.file_size) as audio:
+            return await transcribe_audio(audio)
+
+    text = await response_cache.get_or_compute_text(transcription_cache_key(voice.file_unique_id), transcribe)
     
     if "text" in text.lower():
-        reply = generate_response(chat_id, text)
+        reply = await generate_response(chat_id, text)
         await context.bot.send_message(chat_id=chat_id, text=reply)
-    else:
-        reply = generate_response(chat_id, text)
-        audio_response = generate_audio_response(reply)
-        with open("response.ogg", "wb") as audio_file:
-            audio_file.write(audio_response)
-        await context.bot.send_voice(chat_id=chat_id, voice=open("response.ogg", "rb"))
-        os.remove("response.ogg")
+        return
+
+    # Antwort streamen; fertige Sätze werden schon während der Generierung vertont
+    voice_reply = VoiceReply(generate_audio_response)
+    text_reply = StreamingReply(context.bot, chat_id) if VOICE_TEXT_FIRST else None
+    try:
+        async for delta in generate_response_stream(chat_id, text):
+            voice_reply.feed(delta)
+            if text_reply is not None:
+                await text_reply.feed(delta)
+        if text_reply is not None:
+            await text_reply.finish()
+        voice_files = await voice_reply.finish()
+    except BaseException:
+        voice_reply.cancel()
+        raise
+    for audio_response in voice_files:
+        await context.bot.send_voice(chat_id=chat_id, voice=BytesIO(audio_response), filename="response.ogg")
 
 # Handler für Dateiupload und -verarbeitung
+@instrumented
 async def handle_document(update, context):
     chat_id = str(update.effective_chat.id)
     document = update.message.document
     file_name = document.file_name
-    file = await bot.get_file(document.file_id)
-    local_path = f"temp_{document.file_id}_{file_name}"
-    await file.download_to_drive(local_path)
+    if document.file_size and document.file_size > EXTRACT_MAX_BYTES:
+        await context.bot.send_message(chat_id=chat_id, text=f"Dokument '{file_name}' ist zu groß zum Verarbeiten.")
+        return
+    buffer = await download_media(context.bot, document.file_id, document.file_size)
     
     ext = file_name.split('.')[-1].lower()
-    extracted_text = ""
-    
-    if ext == "pdf":
-        if PyPDF2 is None:
-            extracted_text = "PyPDF2 ist nicht installiert."
-        else:
-            try:
-                with open(local_path, "rb") as f:
-                    reader = PyPDF2.PdfReader(f)
-                    for page in reader.pages:
-                        extracted_text += page.extract_text() + "\n"
-            except Exception as e:
-                extracted_text = f"Fehler beim Lesen der PDF: {e}"
-    elif ext in ["doc", "docx"]:
-        if docx is None:
-            extracted_text = "python-docx ist nicht installiert."
-        else:
-            try:
-                doc = docx.Document(local_path)
-                for para in doc.paragraphs:
-                    extracted_text += para.text + "\n"
-            except Exception as e:
-                extracted_text = f"Fehler beim Lesen des Dokuments: {e}"
-    elif ext in ["xls", "xlsx"]:
-        if pd is None:
-            extracted_text = "pandas (und openpyxl) sind nicht installiert."
-        else:
-            try:
-                df = pd.read_excel(local_path)
-                extracted_text = df.to_csv(index=False)
-            except Exception as e:
-                extracted_text = f"Fehler beim Lesen der Excel-Datei: {e}"
-    elif ext == "txt":
-        try:
-            with open(local_path, "r", encoding="utf-8") as f:
-                extracted_text = f.read()
-        except Exception as e:
-            extracted_text = f"Fehler beim Lesen der Textdatei: {e}"
-    else:
-        extracted_text = "Dateiformat nicht unterstützt."
+    try:
+        extracted_text = await extract_text(buffer.read(), ext)
+    except ExtractionError as e:
+        await context.bot.send_message(chat_id=chat_id, text=f"Dokument '{file_name}' konnte nicht verarbeitet werden: {e}")
+        return
+    finally:
+        buffer.close()
     
-    doc_texts[chat_id] = extracted_text
+    await documents.add(chat_id, file_name, extracted_text)
     
-    if extracted_text and "nicht unterstützt" not in extracted_text and not extracted_text.startswith("Fehler"):
-        prompt = f"Fasse den folgenden Text zusammen:\n\n{extracted_text[:4000]}"
-        summary = generate_response(chat_id, prompt)
+    progress = ProgressMessage(context.bot, chat_id)
+    if extracted_text.strip():
+        await progress.update(f"Dokument '{file_name}' wird zusammengefasst …")
+
+        async def on_progress(done, total):
+            await progress.update(f"Dokument '{file_name}' wird zusammengefasst … ({done}/{total} Abschnitte)")
+
+        summary = await summarizer.summarize(extracted_text, on_progress=on_progress)
+        await conversations.append(chat_id, "user", f"[Dokument hochgeladen] {file_name}")
+        await conversations.append(chat_id, "assistant", f"Zusammenfassung von '{file_name}': {summary}")
     else:
-        summary = extracted_text
+        summary = "Im Dokument wurde kein Text gefunden."
 
     message = (f"Dokument '{file_name}' verarbeitet.\nZusammenfassung:\n{summary}\n\n"
                "Du kannst nun Fragen zum Dokument stellen mit /askdoc <deine Frage>.\n"
                "Falls du den vollständigen Text herunterladen möchtest, benutze /download_document.")
-    await context.bot.send_message(chat_id=chat_id, text=message)
-    
-    os.remove(local_path)
+    await progress.finish(message)
 
 # Handler für Fragen zum Dokument
+@instrumented
 async def handle_askdoc(update, context):
     chat_id = str(update.effective_chat.id)
-    if chat_id not in doc_texts or not doc_texts[chat_id]:
-        await context.bot.send_message(chat_id=chat_id, text="Es wurde noch kein Dokument verarbeitet.")
-        return
     question = update.message.text.replace("/askdoc", "").strip()
     if not question:
         await context.bot.send_message(chat_id=chat_id, text="Bitte stelle deine Frage nach dem Befehl.")
         return
-    prompt = (f"Beantworte folgende Frage basierend auf diesem Dokument:\n\n"
-              f"Dokument:\n{doc_texts[chat_id][:4000]}\n\nFrage: {question}")
-    answer = generate_response(chat_id, prompt)
+    chunks = await documents.search(chat_id, question)
+    if not chunks:
+        await context.bot.send_message(chat_id=chat_id, text="Es wurde noch kein Dokument verarbeitet.")
+        return
+    excerpts = "\n\n".join(f"[{name}]\n{chunk}" for name, chunk in chunks)
+    prompt = (f"Beantworte folgende Frage basierend auf diesen Auszügen aus den hochgeladenen Dokumenten:\n\n"
+              f"Auszüge:\n{excerpts}\n\nFrage: {question}")
+    answer = await generate_response(chat_id, prompt)
     await context.bot.send_message(chat_id=chat_id, text=answer)
 
 # Handler für Herunterladen des Dokuments
+@instrumented
 async def handle_download_document(update, context):
     chat_id = str(update.effective_chat.id)
-    if chat_id not in doc_texts or not doc_texts[chat_id]:
+    doc_text = await documents.latest_text(chat_id)
+    if not doc_text:
         await context.bot.send_message(chat_id=chat_id, text="Es wurde noch kein Dokument verarbeitet.")
         return
     output_filename = f"processed_document_{chat_id}.txt"
-    with open(output_filename, "w", encoding="utf-8") as out_file:
-        out_file.write(doc_texts[chat_id])
-    await context.bot.send_document(chat_id=chat_id, document=open(output_filename, "rb"), filename=output_filename)
-    os.remove(output_filename)
+    await context.bot.send_document(chat_id=chat_id, document=BytesIO(doc_text.encode("utf-8")), filename=output_filename)
 
 # Handler für Bildgenerierung
+@instrumented
 async def handle_generate_image(update, context):
     chat_id = str(update.effective_chat.id)
     prompt = update.message.text.replace("/generate", "").strip()
     if not prompt:
         await context.bot.send_message(chat_id=chat_id, text="Bitte gib eine Bildbeschreibung an!")
         return
-    image_url = generate_image(prompt)
-    await context.bot.send_photo(chat_id=chat_id, photo=image_url)
+    await submit_image_job(context.bot, chat_id, prompt)
 
 # Neuer Handler: Dateierstellung basierend auf Texteingabe und OpenAI API
+@instrumented
 async def handle_create(update, context):
     chat_id = str(update.effective_chat.id)
     command_text = update.message.text.replace("/create", "").strip()
@@ -307,108 +488,45 @@ async def handle_create(update, context):
         return
     
     format_type, prompt = parts[0].lower(), parts[1]
-    
-    # Verarbeite den Textbefehl über die OpenAI API, um den Inhalt zu generieren
-    file_content = generate_response(chat_id, prompt)
-    
-    temp_filename = f"output_{chat_id}.{format_type}"
-    
-    try:
-        if format_type == "pdf":
-            if not PyPDF2 or not hasattr(canvas, 'Canvas'):
-                await context.bot.send_message(
-                    chat_id=chat_id,
-                    text="PDF-Erstellung nicht verfügbar (reportlab fehlt)."
-                )
-                return
-            buffer = BytesIO()
-            c = canvas.Canvas(buffer, pagesize=letter)
-            # Schreibe den generierten Inhalt zeilenweise
-            lines = file_content.split("\n")
-            y = 750  # Start-Y-Position
-            for line in lines:
-                c.drawString(100, y, line)
-                y -= 15  # Zeilenabstand
-            c.showPage()
-            c.save()
-            buffer.seek(0)
-            await context.bot.send_document(
-                chat_id=chat_id,
-                document=buffer,
-                filename=temp_filename
-            )
-            buffer.close()
-        elif format_type == "docx":
-            if not docx:
-                await context.bot.send_message(
-                    chat_id=chat_id,
-                    text="DOCX-Erstellung nicht verfügbar (python-docx fehlt)."
-                )
-                return
-            document = docx.Document()
-            document.add_paragraph(file_content)
-            document.save(temp_filename)
-            await context.bot.send_document(
-                chat_id=chat_id,
-                document=open(temp_filename, "rb"),
-                filename=temp_filename
-            )
-            os.remove(temp_filename)
-        elif format_type == "xlsx":
-            if not pd or not openpyxl:
-                await context.bot.send_message(
-                    chat_id=chat_id,
-                    text="XLSX-Erstellung nicht verfügbar (pandas/openpyxl fehlt)."
-                )
-                return
-            df = pd.DataFrame({"Text": file_content.split("\n")})
-            df.to_excel(temp_filename, index=False)
-            await context.bot.send_document(
-                chat_id=chat_id,
-                document=open(temp_filename, "rb"),
-                filename=temp_filename
-            )
-            os.remove(temp_filename)
-        elif format_type == "html":
-            html_content = f"""<!DOCTYPE html>
-<html>
-  <head>
-    <meta charset="UTF-8">
-    <title>Generated Document</title>
-  </head>
-  <body>
-    <pre>{file_content}</pre>
-  </body>
-</html>"""
-            with open(temp_filename, "w", encoding="utf-8") as f:
-                f.write(html_content)
-            await context.bot.send_document(
-                chat_id=chat_id,
-                document=open(temp_filename, "rb"),
-                filename=temp_filename
-            )
-            os.remove(temp_filename)
-        else:
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text="Ungültiges Format. Nutze: pdf, docx, xlsx, html"
-            )
-    except Exception as e:
+    if format_type not in RENDER_FORMATS:
         await context.bot.send_message(
             chat_id=chat_id,
-            text=f"Fehler beim Erstellen der Datei: {str(e)}"
+            text="Ungültiges Format. Nutze: pdf, docx, xlsx, html"
         )
+        return
+
+    payload = {"chat_id": chat_id, "format": format_type, "prompt": prompt}
+    job_id, created = await background_jobs.submit(
+        "create", chat_id, payload, dedup_key=cache_key("create", chat_id, format_type, prompt))
+    await acknowledge_job(context.bot, chat_id, job_id, created)
 
-# Globaler Event Loop
-global_loop = asyncio.new_event_loop()
-def start_loop(loop: asyncio.AbstractEventLoop):
-    asyncio.set_event_loop(loop)
-    loop.run_forever()
-loop_thread = threading.Thread(target=start_loop, args=(global_loop,), daemon=True)
-loop_thread.start()
+# Handler für /jobs: offene Hintergrundaufträge des Chats anzeigen
+@instrumented
+async def handle_jobs(update, context):
+    chat_id = str(update.effective_chat.id)
+    active = await background_jobs.active(chat_id)
+    if not active:
+        await context.bot.send_message(chat_id=chat_id, text="Keine offenen Aufträge.")
+        return
+    labels = {"queued": "wartet", "running": "läuft"}
+    lines = [f"{job['id']}: {job['kind']} ({labels.get(job['status'], job['status'])})" for job in active]
+    await context.bot.send_message(chat_id=chat_id, text="Offene Aufträge:\n" + "\n".join(lines))
+
+# Handler für /cancel <Auftrag>
+@instrumented
+async def handle_cancel(update, context):
+    chat_id = str(update.effective_chat.id)
+    job_id = update.message.text.replace("/cancel", "").strip()
+    if not job_id:
+        await context.bot.send_message(chat_id=chat_id, text="Nutze: /cancel <Auftrags-ID> (siehe /jobs)")
+        return
+    if await background_jobs.cancel(chat_id, job_id):
+        await context.bot.send_message(chat_id=chat_id, text=f"Auftrag {job_id} abgebrochen.")
+    else:
+        await context.bot.send_message(chat_id=chat_id, text=f"Kein offener Auftrag {job_id} gefunden.")
 
 # Handler registrieren
-application.add_handler(CommandHandler("start", start))
+application.add_handler(CommandHandler(["start", "help"], start))
 application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
 application.add_handler(MessageHandler(filters.PHOTO, handle_photo))
 application.add_handler(MessageHandler(filters.VOICE, handle_voice))
@@ -417,33 +535,36 @@ application.add_handler(CommandHandler("generate", handle_generate_image))
 application.add_handler(CommandHandler("askdoc", handle_askdoc))
 application.add_handler(CommandHandler("download_document", handle_download_document))
 application.add_handler(CommandHandler("create", handle_create))
+application.add_handler(CommandHandler("jobs", handle_jobs))
+application.add_handler(CommandHandler("cancel", handle_cancel))
 
-# Webhook-Route
-@app.route('/webhook', methods=['POST'])
-def webhook():
-    update_json = request.get_json(force=True)
-    logger.info(f"Webhook erhalten: {update_json}")
-    update = telegram.Update.de_json(update_json, bot)
-    asyncio.run_coroutine_threadsafe(application.process_update(update), global_loop)
-    return "OK", 200
+application.add_error_handler(error_handler)
 
-# Home-Route
-@app.route('/')
-def home():
-    return "Bot is running!", 200
+# Interne Statistiken unter /metrics exportieren
+register_stats("scheduler", lambda: {**scheduler.stats, "queued": scheduler.queued, "in_flight": scheduler.in_flight,
+                                     "queued_expensive": scheduler.queue_depth("expensive")})
+register_stats("conversations", conversations.stats)
+register_stats("response_cache", lambda: {**response_cache.stats, "hit_rate": response_cache.hit_rate})
+register_stats("state", state.stats)
+register_stats("outbound", outbound.stats)
+register_stats("jobs", background_jobs.stats)
+register_stats("summarizer", summarizer.stats)
+register_stats("albums", album_photos.stats)
+register_stats("models", models.stats)
 
-if __name__ == '__main__':
-    async def startup():
-        await bot.initialize()
-        await application.initialize()
-        await bot.delete_webhook()
-        success = await bot.set_webhook(WEBHOOK_URL)
-        if success:
-            logger.info(f"Webhook erfolgreich gesetzt: {WEBHOOK_URL}")
-        else:
-            logger.error("Webhook konnte nicht gesetzt werden!")
-        await application.start()
-    startup_future = asyncio.run_coroutine_threadsafe(startup(), global_loop)
-    startup_future.result()
-    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)), debug=True)
+# ASGI-App mit Webhook-, Home- und Metrik-Route für einen Prozess (z.B. "uvicorn bot:app");
+# mehrere Worker über "python runtime.py", das die Updates eines Chats immer demselben Worker zuteilt
+app = WebhookServer(
+    application,
+    scheduler,
+    webhook_url=WEBHOOK_URL,
+    on_warmup=[warm_up_client],
+    on_startup=[background_jobs.start, start_loop_monitor],
+    on_stop=[album_photos.close, background_jobs.stop, stop_loop_monitor],
+    on_shutdown=[background_jobs.close, state.close, close_client, shutdown_pool],
+)
 
+# Einzelprozess im Webhook- oder Polling-Betrieb (RUNTIME_MODE); mehrere Worker über runtime.py
+if __name__ == '__main__':
+    from runtime import RUNTIME_MODE, serve
+    serve(app, RUNTIME_MODE)
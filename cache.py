@@ -0,0 +1,182 @@
+import os
+import time
+import json
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache/responses")  # leer = keine Festplattenstufe
+CACHE_MEMORY_BYTES = int(os.getenv("CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+CACHE_DISK_BYTES = int(os.getenv("CACHE_DISK_BYTES", str(1024 * 1024 * 1024)))
+CACHE_TTL = float(os.getenv("CACHE_TTL", str(7 * 24 * 3600)))  # Sekunden
+
+# Schlüssel aus Modell, Parametern und Eingabe (Bytes werden direkt gehasht)
+def cache_key(*parts) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (bytes, bytearray, memoryview)):
+            digest.update(b"b:")
+            digest.update(part)
+        else:
+            digest.update(json.dumps(part, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+# Inhaltsadressierter Cache für idempotente API-Aufrufe: LRU im Arbeitsspeicher,
+# darunter eine Festplattenstufe; beide mit TTL und Größenbegrenzung
+class ResponseCache:
+    def __init__(self, directory: str = CACHE_DIR, memory_bytes: int = CACHE_MEMORY_BYTES,
+                 disk_bytes: int = CACHE_DISK_BYTES, ttl: float = CACHE_TTL):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.ttl = ttl
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._memory = OrderedDict()  # Schlüssel -> (Zeitstempel, Bytes)
+        self._memory_size = 0
+        self._disk = None  # Schlüssel -> (Zeitstempel, Größe), wird beim ersten Zugriff eingelesen
+        self._disk_size = 0
+        self._inflight = {}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _remember(self, key: str, value: bytes, stamp: float):
+        if len(value) > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= len(old[1])
+        self._memory[key] = (stamp, value)
+        self._memory_size += len(value)
+        while self._memory_size > self.memory_bytes:
+            _, (_, evicted) = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+            self.stats["evictions"] += 1
+
+    def _scan_disk(self):
+        entries = []
+        if os.path.isdir(self.directory):
+            for sub in os.scandir(self.directory):
+                if sub.is_dir():
+                    for entry in os.scandir(sub.path):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, entry.name, stat.st_size))
+        entries.sort()
+        return OrderedDict((name, (mtime, size)) for mtime, name, size in entries)
+
+    async def _disk_index(self):
+        if self._disk is None:
+            self._disk = await asyncio.to_thread(self._scan_disk)
+            self._disk_size = sum(size for _, size in self._disk.values())
+        return self._disk
+
+    def _remove_file(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _write_file(self, key: str, value: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(value)
+        os.replace(tmp, path)
+
+    def _read_file(self, key: str):
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    async def get(self, key: str):
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            if now - entry[0] < self.ttl:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return entry[1]
+            self._memory_size -= len(self._memory.pop(key)[1])
+        if self.directory:
+            disk = await self._disk_index()
+            entry = disk.get(key)
+            if entry is not None:
+                if now - entry[0] < self.ttl:
+                    value = await asyncio.to_thread(self._read_file, key)
+                    if value is not None:
+                        self.stats["disk_hits"] += 1
+                        self._remember(key, value, entry[0])
+                        return value
+                self._disk_size -= disk.pop(key)[1]
+                await asyncio.to_thread(self._remove_file, key)
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: bytes):
+        now = time.time()
+        self._remember(key, value, now)
+        if not self.directory or len(value) > self.disk_bytes:
+            return
+        disk = await self._disk_index()
+        try:
+            await asyncio.to_thread(self._write_file, key, value)
+        except OSError as e:
+            logger.warning(f"Cache-Eintrag konnte nicht geschrieben werden: {e}")
+            return
+        if key in disk:
+            self._disk_size -= disk.pop(key)[1]
+        disk[key] = (now, len(value))
+        self._disk_size += len(value)
+        evicted = []
+        while self._disk_size > self.disk_bytes and disk:
+            old_key, (_, size) = disk.popitem(last=False)
+            self._disk_size -= size
+            evicted.append(old_key)
+        if evicted:
+            self.stats["evictions"] += len(evicted)
+            await asyncio.to_thread(lambda: [self._remove_file(k) for k in evicted])
+
+    # Wert aus dem Cache oder per compute() erzeugen; gleichzeitige Anfragen
+    # mit demselben Schlüssel teilen sich einen Aufruf
+    async def get_or_compute(self, key: str, compute):
+        if key in self._inflight:
+            return await asyncio.shield(self._inflight[key])
+        value = await self.get(key)
+        if value is not None:
+            return value
+        if key in self._inflight:
+            return await asyncio.shield(self._inflight[key])
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+            await self.set(key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # als abgerufen markieren, falls niemand wartet
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def get_or_compute_text(self, key: str, compute) -> str:
+        async def compute_bytes():
+            return (await compute()).encode("utf-8")
+        return (await self.get_or_compute(key, compute_bytes)).decode("utf-8")
+
+    @property
+    def hit_rate(self) -> float:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
@@ -0,0 +1,249 @@
+import os
+import time
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Grenzen für den Gesprächsspeicher
+CHAT_TOKEN_BUDGET = int(os.getenv("CHAT_TOKEN_BUDGET", "6000"))  # max. Prompt-Tokens pro Anfrage
+CHAT_MAX_CHATS = int(os.getenv("CHAT_MAX_CHATS", "10000"))
+CHAT_MAX_TOTAL_TOKENS = int(os.getenv("CHAT_MAX_TOTAL_TOKENS", "20000000"))  # globale Obergrenze
+CHAT_IDLE_TTL = float(os.getenv("CHAT_IDLE_TTL", str(24 * 3600)))  # Sekunden
+CHAT_SUMMARY_MAX_CHARS = 2000
+
+_encoding = None
+
+# tiktoken (samt Kodierungstabelle) erst bei der ersten Zählung laden; False = nicht verfügbar.
+# get_encoding lädt die Tabelle beim ersten Mal herunter und scheitert offline bzw. hinter
+# einem Proxy mit Netzwerk- oder OS-Fehlern; dann bleibt es (ohne neuen Versuch) bei der Schätzung.
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except ImportError:
+            _encoding = False
+        except Exception as e:
+            logger.warning(f"tiktoken-Kodierung nicht verfügbar, Tokens werden geschätzt: {e}")
+            _encoding = False
+    return _encoding
+
+# Tokenzählung über tiktoken, sonst grobe Schätzung (ca. 4 Zeichen pro Token)
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+def message_tokens(message: dict) -> int:
+    content = message["content"]
+    if not isinstance(content, str):
+        content = str(content)
+    return count_tokens(content) + 4  # Overhead pro Nachricht
+
+class _Chat:
+    __slots__ = ("turns", "tokens", "summary", "last_used", "loaded_at")
+
+    def __init__(self):
+        self.turns = []  # Liste von (message, tokens)
+        self.tokens = 0
+        self.summary = ""
+        self.last_used = time.monotonic()
+        self.loaded_at = self.last_used
+
+# Gesprächsspeicher mit Token-Budget pro Chat und LRU-Verdrängung inaktiver Chats.
+# Mit einem persistenten State-Backend dient der Arbeitsspeicher nur als Cache.
+class ConversationStore:
+    def __init__(self, system_prompt: str, token_budget: int = CHAT_TOKEN_BUDGET,
+                 max_chats: int = CHAT_MAX_CHATS, max_total_tokens: int = CHAT_MAX_TOTAL_TOKENS,
+                 idle_ttl: float = CHAT_IDLE_TTL, summarizer=None, backend=None):
+        self.system_message = {"role": "system", "content": system_prompt}
+        self._system_tokens = None
+        self.token_budget = token_budget
+        self.max_chats = max_chats
+        self.max_total_tokens = max_total_tokens
+        self.idle_ttl = idle_ttl
+        self.summarizer = summarizer  # optional: async (alte Zusammenfassung, Nachrichten) -> str
+        self.backend = backend if backend is not None and backend.persistent else None
+        self.total_tokens = 0
+        self.stats = {"requests": 0, "tokens_sent": 0, "max_tokens_sent": 0,
+                      "turns_dropped": 0, "summaries": 0, "chats_evicted": 0}
+        self._chats = OrderedDict()
+
+    def __len__(self):
+        return len(self._chats)
+
+    # Erst bei der ersten Anfrage zählen: bot.py legt den Speicher beim Import an,
+    # und die Zählung lädt tiktoken samt Kodierungstabelle
+    @property
+    def system_tokens(self) -> int:
+        if self._system_tokens is None:
+            self._system_tokens = message_tokens(self.system_message)
+        return self._system_tokens
+
+    def __contains__(self, chat_id):
+        return chat_id in self._chats
+
+    async def _get(self, chat_id: str) -> _Chat:
+        chat = self._chats.get(chat_id)
+        now = time.monotonic()
+        if chat is not None and self.backend is not None and now - chat.loaded_at >= self.backend.cache_ttl:
+            self._drop(chat_id, evicted=False)
+            chat = None
+        if chat is None:
+            chat = self._chats[chat_id] = _Chat()
+            if self.backend is not None:
+                await self._load(chat_id, chat)
+        else:
+            self._chats.move_to_end(chat_id)
+        chat.last_used = now
+        return chat
+
+    async def _load(self, chat_id: str, chat: _Chat):
+        self._fill(chat, await self.backend.get("chat", chat_id))
+
+    def _fill(self, chat: _Chat, data: dict):
+        if not data:
+            return
+        chat.summary = data.get("summary", "")
+        for message in data.get("turns", []):
+            tokens = message_tokens(message)
+            chat.turns.append((message, tokens))
+            chat.tokens += tokens
+        self.total_tokens += chat.tokens
+
+    # Lokalen Stand durch den gerade atomar geschriebenen Stand des Backends ersetzen
+    def _replace(self, chat_id: str, data: dict) -> _Chat:
+        if chat_id in self._chats:
+            self._drop(chat_id, evicted=False)
+        chat = self._chats[chat_id] = _Chat()
+        self._fill(chat, data)
+        return chat
+
+    # Änderung am gespeicherten Verlauf; mehrere Worker teilen sich das Backend, daher als
+    # atomares Lesen-Ändern-Schreiben auf dem aktuellen Stand statt Überschreiben mit dem Cache
+    async def _update(self, chat_id: str, change) -> _Chat:
+        def apply(data):
+            data = data or {"summary": "", "turns": []}
+            change(data)
+            return data
+        return self._replace(chat_id, await self.backend.update("chat", chat_id, apply))
+
+    def _drop(self, chat_id: str, evicted: bool = True):
+        chat = self._chats.pop(chat_id)
+        self.total_tokens -= chat.tokens
+        if evicted:
+            self.stats["chats_evicted"] += 1
+
+    # Inaktive Chats und älteste Chats über den globalen Grenzen entfernen
+    def _evict(self, keep: str):
+        now = time.monotonic()
+        while self._chats:
+            oldest_id, oldest = next(iter(self._chats.items()))
+            if oldest_id == keep:
+                break
+            over_limit = len(self._chats) > self.max_chats or self.total_tokens > self.max_total_tokens
+            if not over_limit and now - oldest.last_used < self.idle_ttl:
+                break
+            self._drop(oldest_id)
+
+    async def append(self, chat_id: str, role: str, content: str):
+        await self.append_many(chat_id, [{"role": role, "content": content}])
+
+    # Mehrere Turns in einem Schritt (z.B. Auftrag und Ergebnis eines Hintergrundauftrags)
+    async def append_many(self, chat_id: str, messages: list):
+        if self.backend is not None:
+            await self._update(chat_id, lambda data: data["turns"].extend(messages))
+        else:
+            chat = await self._get(chat_id)
+            for message in messages:
+                tokens = message_tokens(message)
+                chat.turns.append((message, tokens))
+                chat.tokens += tokens
+                self.total_tokens += tokens
+        self._evict(keep=chat_id)
+
+    async def history(self, chat_id: str) -> list:
+        chat = await self._get(chat_id)
+        return [self.system_message] + [message for message, _ in chat.turns]
+
+    async def clear(self, chat_id: str):
+        if chat_id in self._chats:
+            self._drop(chat_id, evicted=False)
+        if self.backend is not None:
+            await self.backend.delete("chat", chat_id)
+
+    def _summary_messages(self, chat: _Chat) -> list:
+        if not chat.summary:
+            return []
+        return [{"role": "system", "content": f"Bisheriger Gesprächsverlauf (zusammengefasst): {chat.summary}"}]
+
+    # Nachrichtenliste wie prompt() plus eine neue Nutzernachricht, ohne den Verlauf zu ändern:
+    # ältere Turns fallen nur aus der Kopie heraus. Für Hintergrundaufträge, die außerhalb der
+    # Reihenfolge des Schedulers laufen und ihr Ergebnis erst bei der Auslieferung eintragen.
+    async def snapshot(self, chat_id: str, content: str) -> list:
+        chat = await self._get(chat_id)
+        message = {"role": "user", "content": content}
+        summary = self._summary_messages(chat)
+        budget = self.token_budget - self.system_tokens - self._summary_tokens(chat) - message_tokens(message)
+        turns, tokens = list(chat.turns), chat.tokens
+        while turns and tokens > budget:
+            tokens -= turns.pop(0)[1]
+        return [self.system_message] + summary + [m for m, _ in turns] + [message]
+
+    def _summary_tokens(self, chat: _Chat) -> int:
+        return sum(map(message_tokens, self._summary_messages(chat)))
+
+    # Älteste Turns verwerfen, bis Systemprompt, Zusammenfassung und Verlauf ins Budget passen
+    def _trim(self, chat: _Chat) -> list:
+        dropped = []
+        summary_tokens = self._summary_tokens(chat)
+        while len(chat.turns) > 1 and self.system_tokens + summary_tokens + chat.tokens > self.token_budget:
+            message, tokens = chat.turns.pop(0)
+            chat.tokens -= tokens
+            self.total_tokens -= tokens
+            dropped.append(message)
+        return dropped
+
+    # Nachrichtenliste für die API innerhalb des Token-Budgets; ältere Turns werden
+    # verworfen oder (mit Summarizer) in eine laufende Zusammenfassung überführt. Die neue
+    # Zusammenfassung kann länger sein als die alte, daher wird danach erneut gekürzt.
+    async def prompt(self, chat_id: str) -> list:
+        chat = await self._get(chat_id)
+        dropped = self._trim(chat)
+        batch = dropped
+        while batch and self.summarizer is not None:
+            try:
+                chat.summary = (await self.summarizer(chat.summary, batch))[:CHAT_SUMMARY_MAX_CHARS]
+                self.stats["summaries"] += 1
+            except Exception as e:
+                logger.warning(f"Zusammenfassung des Verlaufs fehlgeschlagen: {e}")
+                dropped.extend(self._trim(chat))
+                break
+            batch = self._trim(chat)
+            dropped.extend(batch)
+        if dropped:
+            self.stats["turns_dropped"] += len(dropped)
+            if self.backend is not None:
+                summary = chat.summary
+
+                # Nur kürzen, wenn der gespeicherte Verlauf noch mit den verworfenen Turns beginnt
+                # (ein anderer Worker kann inzwischen selbst gekürzt haben)
+                def trim(data):
+                    if data["turns"][:len(dropped)] == dropped:
+                        del data["turns"][:len(dropped)]
+                        data["summary"] = summary
+
+                chat = await self._update(chat_id, trim)
+
+        messages = [self.system_message] + self._summary_messages(chat)
+        messages.extend(message for message, _ in chat.turns)
+
+        sent = self.system_tokens + self._summary_tokens(chat) + chat.tokens
+        self.stats["requests"] += 1
+        self.stats["tokens_sent"] += sent
+        self.stats["max_tokens_sent"] = max(self.stats["max_tokens_sent"], sent)
+        logger.debug(f"Chat {chat_id}: {sent} Prompt-Tokens gesendet")
+        return messages
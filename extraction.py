@@ -0,0 +1,214 @@
+import os
+import io
+import signal
+import asyncio
+import tempfile
+import logging
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from metrics import TEMPFILE_BYTES, TEMPFILES
+
+logger = logging.getLogger(__name__)
+
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(os.cpu_count() or 2)))
+EXTRACT_TIMEOUT = float(os.getenv("EXTRACT_TIMEOUT", "60"))  # Sekunden pro Job
+EXTRACT_MAX_BYTES = int(os.getenv("EXTRACT_MAX_BYTES", str(50 * 1024 * 1024)))
+EXTRACT_MAX_PAGES = int(os.getenv("EXTRACT_MAX_PAGES", "2000"))
+EXTRACT_PAGE_BATCH = int(os.getenv("EXTRACT_PAGE_BATCH", "25"))  # Seiten pro Job (mindestens)
+# Jeder Seitenblock öffnet und parst die Datei neu; große Dateien daher in höchstens so viele Blöcke teilen
+EXTRACT_MAX_BATCHES = int(os.getenv("EXTRACT_MAX_BATCHES", "16"))
+# Größere Dateien werden den Workern als Temp-Datei statt als Bytes (Pickle-Kopie pro Job) übergeben
+EXTRACT_INLINE_BYTES = int(os.getenv("EXTRACT_INLINE_BYTES", str(4 * 1024 * 1024)))
+
+class ExtractionError(Exception):
+    pass
+
+# extract(source) -> str, bzw. bei seitenweisen Formaten extract(source, start, stop) -> list;
+# source sind die Dateibytes oder ein Pfad, siehe open_source
+Extractor = namedtuple("Extractor", ["extract", "count_pages"])
+
+_extractors = {}
+_pool = None
+_slots = None
+
+# Plugin-Registrierung pro Dateiendung; die Funktionen laufen im Prozesspool
+# und müssen daher auf Modulebene definiert (picklebar) sein
+def register_extractor(*extensions, count_pages=None):
+    def decorator(extract):
+        for ext in extensions:
+            _extractors[ext.lower()] = Extractor(extract, count_pages)
+        return extract
+    return decorator
+
+def supported_extensions() -> list:
+    return sorted(_extractors)
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS)
+    return _pool
+
+async def shutdown_pool():
+    global _pool, _slots
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+    _slots = None
+
+def open_source(source):
+    if isinstance(source, str):
+        return open(source, "rb")
+    return io.BytesIO(source)
+
+# BaseException, damit "except Exception" in den Extraktoren den Abbruch nicht abfängt
+class _Deadline(BaseException):
+    pass
+
+def _on_deadline(signum, frame):
+    raise _Deadline()
+
+# Läuft im Worker-Prozess: bricht reine Python-Parser nach Ablauf des Timeouts ab
+def _run_job(function, timeout, *args):
+    use_timer = hasattr(signal, "setitimer")
+    if use_timer:
+        signal.signal(signal.SIGALRM, _on_deadline)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return function(*args)
+    except _Deadline:
+        raise TimeoutError()
+    finally:
+        if use_timer:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+def _release(loop, slots):
+    try:
+        loop.call_soon_threadsafe(slots.release)
+    except RuntimeError:
+        pass  # Event Loop bereits geschlossen
+
+# Höchstens EXTRACT_WORKERS Jobs (über alle Uploads) liegen gleichzeitig im Pool, der Rest wartet
+# hier ohne Frist. So beginnt die Frist erst, wenn ein Worker frei ist, statt in der Warteschlange
+# des Pools abzulaufen. Der Platz wird erst freigegeben, wenn der Job im Worker wirklich endet.
+async def _submit(function, *args):
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(EXTRACT_WORKERS)
+    slots = _slots
+    loop = asyncio.get_running_loop()
+    await slots.acquire()
+    try:
+        job = _get_pool().submit(_run_job, function, EXTRACT_TIMEOUT, *args)
+    except BaseException:
+        slots.release()
+        raise
+    job.add_done_callback(lambda _: _release(loop, slots))
+    try:
+        # Zusätzliche Frist, falls der Worker den Alarm nicht rechtzeitig verarbeitet
+        return await asyncio.wait_for(asyncio.wrap_future(job), EXTRACT_TIMEOUT + 5)
+    except (TimeoutError, asyncio.TimeoutError):
+        raise ExtractionError("Zeitüberschreitung beim Lesen der Datei.")
+
+# Text eines Dokuments stückweise liefern (bei PDFs in Seitenblöcken, in Reihenfolge)
+async def iter_document_text(data: bytes, ext: str):
+    ext = ext.lower()
+    extractor = _extractors.get(ext)
+    if extractor is None:
+        raise ExtractionError("Dateiformat nicht unterstützt.")
+    if len(data) > EXTRACT_MAX_BYTES:
+        raise ExtractionError(f"Datei ist zu groß (max. {EXTRACT_MAX_BYTES // (1024 * 1024)} MB).")
+
+    if extractor.count_pages is None:
+        yield await _submit(extractor.extract, data)
+        return
+
+    spill = None
+    source = data
+    if len(data) > EXTRACT_INLINE_BYTES:
+        spill = tempfile.NamedTemporaryFile(dir=os.getenv("MEDIA_SPILL_DIR"), delete=False)
+        spill.write(data)
+        spill.close()
+        TEMPFILES.inc(source="extraction")
+        TEMPFILE_BYTES.inc(len(data), source="extraction")
+        source = spill.name
+    jobs = deque()
+    try:
+        pages = min(await _submit(extractor.count_pages, source), EXTRACT_MAX_PAGES)
+        batch = max(EXTRACT_PAGE_BATCH, -(-pages // EXTRACT_MAX_BATCHES))
+        # Nur etwa so viele Blöcke wie Worker vorausschicken, weitere erst nach Abholung
+        for start in range(0, pages, batch):
+            jobs.append(asyncio.ensure_future(_submit(extractor.extract, source, start, min(start + batch, pages))))
+            if len(jobs) >= EXTRACT_WORKERS:
+                yield "".join(text + "\n" for text in await jobs.popleft())
+        while jobs:
+            yield "".join(text + "\n" for text in await jobs.popleft())
+    finally:
+        for job in jobs:
+            job.cancel()
+        if spill is not None:
+            # Laufende Jobs haben die Datei bereits geöffnet (unter Windows ggf. erst später löschbar)
+            try:
+                os.remove(spill.name)
+            except OSError:
+                pass
+
+async def extract_text(data: bytes, ext: str) -> str:
+    parts = []
+    async for part in iter_document_text(data, ext):
+        parts.append(part)
+    return "".join(parts)
+
+# Eingebaute Formate
+
+def count_pdf_pages(source) -> int:
+    try:
+        import PyPDF2
+    except ImportError:
+        raise ExtractionError("PyPDF2 ist nicht installiert.")
+    try:
+        with open_source(source) as f:
+            return len(PyPDF2.PdfReader(f).pages)
+    except Exception as e:
+        raise ExtractionError(f"Fehler beim Lesen der PDF: {e}")
+
+@register_extractor("pdf", count_pages=count_pdf_pages)
+def extract_pdf(source, start: int, stop: int) -> list:
+    import PyPDF2
+    try:
+        with open_source(source) as f:
+            reader = PyPDF2.PdfReader(f)
+            return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+    except Exception as e:
+        raise ExtractionError(f"Fehler beim Lesen der PDF: {e}")
+
+@register_extractor("doc", "docx")
+def extract_docx(source) -> str:
+    try:
+        import docx
+    except ImportError:
+        raise ExtractionError("python-docx ist nicht installiert.")
+    try:
+        document = docx.Document(open_source(source))
+        return "".join(para.text + "\n" for para in document.paragraphs)
+    except Exception as e:
+        raise ExtractionError(f"Fehler beim Lesen des Dokuments: {e}")
+
+@register_extractor("xls", "xlsx")
+def extract_excel(source) -> str:
+    try:
+        import pandas as pd
+    except ImportError:
+        raise ExtractionError("pandas (und openpyxl) sind nicht installiert.")
+    try:
+        return pd.read_excel(open_source(source)).to_csv(index=False)
+    except Exception as e:
+        raise ExtractionError(f"Fehler beim Lesen der Excel-Datei: {e}")
+
+@register_extractor("txt")
+def extract_txt(source) -> str:
+    try:
+        with open_source(source) as f:
+            return f.read().decode("utf-8")
+    except Exception as e:
+        raise ExtractionError(f"Fehler beim Lesen der Textdatei: {e}")
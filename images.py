@@ -0,0 +1,127 @@
+import os
+import io
+import base64
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Vorverarbeitung für die Vision-API: "low" (feste 85 Tokens, max. 512 px), "high" oder "auto"
+VISION_DETAIL = os.getenv("VISION_DETAIL", "auto")
+VISION_JPEG_QUALITY = int(os.getenv("VISION_JPEG_QUALITY", "85"))
+VISION_ALBUM_WINDOW = float(os.getenv("VISION_ALBUM_WINDOW", "1.0"))  # Sekunden, um Fotos eines Albums zu sammeln
+VISION_ALBUM_MAX = int(os.getenv("VISION_ALBUM_MAX", "10"))  # Bilder pro Vision-Anfrage
+VISION_PREPARE_CONCURRENCY = int(os.getenv("VISION_PREPARE_CONCURRENCY", "2"))  # gleichzeitige Umrechnungen
+
+# Zielgröße, auf die die API ein Bild ohnehin skaliert (größere Uploads kosten nur Bytes und Zeit):
+# low -> längste Seite 512; high/auto -> in 2048x2048 einpassen, dann kürzeste Seite 768
+def target_size(width: int, height: int, detail: str = VISION_DETAIL) -> tuple:
+    if detail == "low":
+        scale = min(1.0, 512 / max(width, height))
+    else:
+        scale = min(1.0, 2048 / max(width, height))
+        scale *= min(1.0, 768 / (min(width, height) * scale))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+# Kleinste PhotoSize, die die Zielgröße noch erreicht (Telegram liefert aufsteigend sortiert)
+def choose_photo_size(photos, detail: str = VISION_DETAIL):
+    largest = photos[-1]
+    width, height = target_size(largest.width, largest.height, detail)
+    for photo in photos:
+        if photo.width >= width and photo.height >= height:
+            return photo
+    return largest
+
+# MIME-Typ anhand der Signatur (Telegram-Fotos sind JPEG, Dokumente können alles sein)
+def detect_mime(data: bytes) -> str:
+    if data[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    if data[:4] == b"GIF8":
+        return "image/gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+# Auf die Zielgröße verkleinern und als JPEG neu kodieren (Pillow optional, sonst unverändert);
+# liefert (Bytes, MIME-Typ)
+def prepare_image(data: bytes, detail: str = VISION_DETAIL, quality: int = VISION_JPEG_QUALITY) -> tuple:
+    mime = detect_mime(data)
+    try:
+        from PIL import Image
+    except ImportError:
+        return data, mime
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            size = target_size(image.width, image.height, detail)
+            if size == image.size and mime == "image/jpeg":
+                return data, mime
+            if size != image.size:
+                image.draft("RGB", size)  # JPEG direkt verkleinert dekodieren (DCT-Skalierung)
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            if size != image.size:
+                image = image.resize(size, Image.LANCZOS)
+            output = io.BytesIO()
+            image.save(output, format="JPEG", quality=quality)
+    except Exception as e:
+        logger.warning(f"Bild nicht verarbeitbar ({e}), sende Original")
+        return data, mime
+    if output.tell() >= len(data) and mime != "application/octet-stream":
+        return data, mime
+    return output.getvalue(), "image/jpeg"
+
+_prepare_slots = None
+
+# prepare_image in einem Thread; begrenzt parallel, damit Pillow den Event Loop nicht über den GIL ausbremst
+async def prepare_image_async(data: bytes, detail: str = VISION_DETAIL) -> tuple:
+    global _prepare_slots
+    if _prepare_slots is None:
+        _prepare_slots = asyncio.Semaphore(VISION_PREPARE_CONCURRENCY)
+    async with _prepare_slots:
+        return await asyncio.to_thread(prepare_image, data, detail)
+
+# Inhaltsteil einer Chat-Nachricht mit eingebettetem Bild
+def image_part(data: bytes, mime: str, detail: str = VISION_DETAIL) -> dict:
+    url = f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+    return {"type": "image_url", "image_url": {"url": url, "detail": detail}}
+
+# Sammelt die Fotos eines Albums (gleiche media_group_id) und verarbeitet sie nach kurzer Wartezeit
+# gemeinsam. Der Handler des ersten Fotos wartet nicht selbst, da der Scheduler die Updates eines
+# Chats nacheinander verarbeitet und die übrigen Fotos sonst erst nach Ablauf des Fensters kämen.
+class AlbumCollector:
+    def __init__(self, window: float = VISION_ALBUM_WINDOW, max_items: int = VISION_ALBUM_MAX):
+        self.window = window
+        self.max_items = max_items
+        self.stats = {"albums": 0, "photos": 0}
+        self._albums = {}
+        self._tasks = set()
+
+    # process: async (Liste der gesammelten Einträge) -> None
+    def add(self, key, item, process):
+        self.stats["photos"] += 1
+        items = self._albums.get(key)
+        if items is not None and len(items) < self.max_items:
+            items.append(item)
+            return
+        self._albums[key] = items = [item]
+        self.stats["albums"] += 1
+        task = asyncio.create_task(self._run(key, items, process))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key, items, process):
+        try:
+            await asyncio.sleep(self.window)
+        finally:
+            if self._albums.get(key) is items:
+                del self._albums[key]
+        try:
+            await process(items)
+        except Exception:
+            logger.exception(f"Album {key} konnte nicht verarbeitet werden")
+
+    # Beim Stoppen: noch offene Alben zu Ende verarbeiten
+    async def close(self):
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,262 @@
+import os
+import json
+import time
+import asyncio
+import secrets
+import sqlite3
+import threading
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from metrics import JOB_DURATION
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.db")
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "4"))  # gleichzeitig laufende Jobs
+JOBS_PROCESSES = int(os.getenv("JOBS_PROCESSES", "2"))  # Worker-Prozesse für CPU-lastige Schritte
+JOBS_TIMEOUT = float(os.getenv("JOBS_TIMEOUT", "300"))  # Sekunden pro Job
+JOBS_POLL_INTERVAL = float(os.getenv("JOBS_POLL_INTERVAL", "2"))  # Sekunden (Jobs anderer Prozesse)
+JOBS_KEEP = float(os.getenv("JOBS_KEEP", str(24 * 3600)))  # abgeschlossene Jobs so lange aufbewahren
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+class JobError(Exception):
+    pass
+
+# Dauerhafte Hintergrund-Warteschlange (SQLite) für langsame Aufträge wie Bildgenerierung
+# und Dateierstellung. Pro Art werden run (async (payload, jobs) -> Ergebnis) und
+# deliver (async (chat_id, payload, Ergebnis)) registriert. Gleiche Aufträge (dedup_key)
+# werden nur einmal ausgeführt und an alle wartenden Chats ausgeliefert.
+class BackgroundJobs:
+    def __init__(self, path: str = JOBS_DB_PATH, workers: int = JOBS_WORKERS, processes: int = JOBS_PROCESSES,
+                 timeout: float = JOBS_TIMEOUT, notify=None):
+        self.workers = workers
+        self.processes = processes
+        self.timeout = timeout
+        self.notify = notify  # async (chat_id, text), z.B. für Fehlermeldungen
+        self.stats = {"submitted": 0, "deduplicated": 0, "done": 0, "failed": 0, "cancelled": 0}
+        self._kinds = {}
+        self._running = {}  # Job-ID -> Task
+        self._cancelled = set()
+        self._tasks = []
+        self._pool = None
+        self._wakeup = asyncio.Event()
+        self._lock = threading.Lock()
+        self._path = path
+        self._conn = None
+
+    # Datenbank erst beim Start (bzw. ersten Zugriff) öffnen, damit der Import von bot.py keine
+    # Dateien anlegt; Aufruf nur unter self._lock
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self._path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, chats TEXT NOT NULL, "
+                "dedup_key TEXT, status TEXT NOT NULL, error TEXT, created REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, status)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def register(self, kind: str, run, deliver):
+        self._kinds[kind] = (run, deliver)
+
+    def _execute(self, sql: str, params=()):
+        with self._lock, self._db():
+            return self._conn.execute(sql, params).fetchall()
+
+    def _submit_sync(self, kind, chat_id, payload, dedup_key):
+        now = time.time()
+        with self._lock, self._db():
+            if dedup_key is not None:
+                row = self._conn.execute(
+                    "SELECT id, chats FROM jobs WHERE dedup_key = ? AND status IN (?, ?)",
+                    (dedup_key, QUEUED, RUNNING),
+                ).fetchone()
+                if row is not None:
+                    chats = json.loads(row[1])
+                    if chat_id not in chats:
+                        chats.append(chat_id)
+                        self._conn.execute("UPDATE jobs SET chats = ?, updated = ? WHERE id = ?",
+                                           (json.dumps(chats), now, row[0]))
+                    return row[0], False
+            job_id = secrets.token_hex(4)
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, payload, chats, dedup_key, status, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), json.dumps([chat_id]), dedup_key, QUEUED, now, now),
+            )
+            return job_id, True
+
+    # Auftrag einreihen; liefert (Job-ID, neu angelegt). Läuft bereits ein gleicher
+    # Auftrag, wird der Chat dort als Empfänger eingetragen.
+    async def submit(self, kind: str, chat_id: str, payload: dict, dedup_key: str = None):
+        if kind not in self._kinds:
+            raise JobError(f"Unbekannte Auftragsart: {kind}")
+        job_id, created = await asyncio.to_thread(self._submit_sync, kind, chat_id, payload, dedup_key)
+        self.stats["submitted" if created else "deduplicated"] += 1
+        self._wakeup.set()
+        return job_id, created
+
+    async def status(self, job_id: str):
+        rows = await asyncio.to_thread(
+            self._execute, "SELECT id, kind, status, error, created, updated FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        return dict(zip(("id", "kind", "status", "error", "created", "updated"), rows[0]))
+
+    # Offene Aufträge eines Chats (wartend oder laufend)
+    async def active(self, chat_id: str) -> list:
+        rows = await asyncio.to_thread(
+            self._execute,
+            "SELECT id, kind, status, chats, created FROM jobs WHERE status IN (?, ?) ORDER BY created",
+            (QUEUED, RUNNING),
+        )
+        return [{"id": row[0], "kind": row[1], "status": row[2], "created": row[4]}
+                for row in rows if chat_id in json.loads(row[3])]
+
+    def _cancel_sync(self, chat_id, job_id):
+        with self._lock, self._db():
+            row = self._conn.execute(
+                "SELECT chats FROM jobs WHERE id = ? AND status IN (?, ?)", (job_id, QUEUED, RUNNING)
+            ).fetchone()
+            if row is None:
+                return False, False
+            chats = json.loads(row[0])
+            if chat_id not in chats:
+                return False, False
+            chats.remove(chat_id)
+            if chats:
+                # Andere Chats warten noch auf dasselbe Ergebnis
+                self._conn.execute("UPDATE jobs SET chats = ?, updated = ? WHERE id = ?",
+                                   (json.dumps(chats), time.time(), job_id))
+                return True, False
+            self._conn.execute("UPDATE jobs SET chats = '[]', status = ?, updated = ? WHERE id = ?",
+                               (CANCELLED, time.time(), job_id))
+            return True, True
+
+    async def cancel(self, chat_id: str, job_id: str) -> bool:
+        removed, stopped = await asyncio.to_thread(self._cancel_sync, chat_id, job_id)
+        if stopped:
+            self.stats["cancelled"] += 1
+            task = self._running.get(job_id)
+            if task is not None:
+                self._cancelled.add(job_id)
+                task.cancel()
+        return removed
+
+    # CPU-lastige Schritte (z.B. Rendering) in einem Worker-Prozess ausführen;
+    # die Funktion muss auf Modulebene definiert (picklebar) sein
+    async def run_in_process(self, function, *args):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.processes)
+        return await asyncio.get_running_loop().run_in_executor(self._pool, function, *args)
+
+    def _claim_sync(self):
+        with self._lock, self._db():
+            row = self._conn.execute(
+                "UPDATE jobs SET status = ?, updated = ? WHERE id = ("
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created LIMIT 1) "
+                "RETURNING id, kind, payload",
+                (RUNNING, time.time(), QUEUED),
+            ).fetchone()
+        return row
+
+    def _finish_sync(self, job_id, status, error=None):
+        with self._lock, self._db():
+            row = self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated = ? WHERE id = ? AND status = ? RETURNING chats",
+                (status, error, time.time(), job_id, RUNNING),
+            ).fetchone()
+        return json.loads(row[0]) if row else []
+
+    async def _run(self, job_id, kind, payload):
+        run, deliver = self._kinds[kind]
+        task = asyncio.ensure_future(asyncio.wait_for(run(payload, self), self.timeout))
+        self._running[job_id] = task
+        try:
+            with JOB_DURATION.time(kind=kind):
+                result = await task
+        except asyncio.CancelledError:
+            if job_id not in self._cancelled:
+                raise  # der Worker selbst wird beendet
+            self._cancelled.discard(job_id)
+            return  # per cancel() abgebrochen, Status ist bereits gesetzt
+        except Exception as e:
+            logger.exception(f"Auftrag {job_id} ({kind}) fehlgeschlagen")
+            self.stats["failed"] += 1
+            message = "Zeitüberschreitung" if isinstance(e, asyncio.TimeoutError) else str(e)
+            chats = await asyncio.to_thread(self._finish_sync, job_id, FAILED, message)
+            for chat_id in chats:
+                await self._notify(chat_id, f"Auftrag {job_id} ist fehlgeschlagen: {message}")
+            return
+        finally:
+            self._running.pop(job_id, None)
+        self.stats["done"] += 1
+        for chat_id in await asyncio.to_thread(self._finish_sync, job_id, DONE):
+            try:
+                await deliver(chat_id, payload, result)
+            except Exception:
+                logger.exception(f"Ergebnis von Auftrag {job_id} konnte nicht an {chat_id} gesendet werden")
+
+    async def _notify(self, chat_id, text):
+        if self.notify is not None:
+            try:
+                await self.notify(chat_id, text)
+            except Exception:
+                logger.exception("Benachrichtigung fehlgeschlagen")
+
+    async def _worker(self):
+        while True:
+            job = await asyncio.to_thread(self._claim_sync)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), JOBS_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            job_id, kind, payload = job
+            if kind not in self._kinds:
+                await asyncio.to_thread(self._finish_sync, job_id, FAILED, "Unbekannte Auftragsart")
+                continue
+            try:
+                await self._run(job_id, kind, json.loads(payload))
+            except asyncio.CancelledError:
+                # Beim Herunterfahren unterbrochene Aufträge laufen beim nächsten Start erneut
+                await asyncio.to_thread(self._execute, "UPDATE jobs SET status = ? WHERE id = ? AND status = ?",
+                                        (QUEUED, job_id, RUNNING))
+                raise
+
+    # Unterbrochene Aufträge wieder einreihen, alte Einträge löschen und Worker starten
+    async def start(self):
+        if self._tasks:
+            return
+        await asyncio.to_thread(self._execute, "UPDATE jobs SET status = ? WHERE status = ?", (QUEUED, RUNNING))
+        await asyncio.to_thread(self._execute, "DELETE FROM jobs WHERE status IN (?, ?, ?) AND updated < ?",
+                                (DONE, FAILED, CANCELLED, time.time() - JOBS_KEEP))
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def close(self):
+        await self.stop()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,23 @@
+import os
+import io
+import tempfile
+from metrics import TEMPFILE_BYTES, TEMPFILES
+
+# Dateien oberhalb dieser Größe (Bytes) werden in ein temporäres Verzeichnis ausgelagert, 0 = nie
+MEDIA_SPILL_THRESHOLD = int(os.getenv("MEDIA_SPILL_THRESHOLD", str(20 * 1024 * 1024)))
+MEDIA_SPILL_DIR = os.getenv("MEDIA_SPILL_DIR")  # Standard: System-Tempdir
+
+# Telegram-Datei in einen Puffer laden: BytesIO, bei großen Dateien eine anonyme Temp-Datei
+async def download_media(bot, file_id: str, file_size: int = None):
+    file = await bot.get_file(file_id)
+    size = file_size or file.file_size or 0
+    if MEDIA_SPILL_THRESHOLD and size > MEDIA_SPILL_THRESHOLD:
+        buffer = tempfile.TemporaryFile(dir=MEDIA_SPILL_DIR)
+    else:
+        buffer = io.BytesIO()
+    await file.download_to_memory(buffer)
+    if not isinstance(buffer, io.BytesIO):
+        TEMPFILES.inc(source="media")
+        TEMPFILE_BYTES.inc(buffer.tell(), source="media")
+    buffer.seek(0)
+    return buffer
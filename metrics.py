@@ -0,0 +1,259 @@
+import os
+import time
+import asyncio
+import bisect
+import logging
+import functools
+import contextlib
+
+logger = logging.getLogger(__name__)
+
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "tele2")
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))  # Sekunden zwischen Messungen
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "0") == "1"  # Spans pro Update (opentelemetry-api nötig)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_metrics = []
+_collectors = []
+_snapshots = []
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+# Minimale Prometheus-Metriken (Textformat 0.0.4), ohne zusätzliche Abhängigkeit
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = f"{METRICS_PREFIX}_{name}"
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        _metrics.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _samples(self):
+        for key, value in self._values.items():
+            yield self.name, dict(zip(self.labels, key)), value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self._samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        for key, (counts, total, count) in self._values.items():
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+# Vorhandene stats-Dicts (Scheduler, Caches, Backends, ...) beim Abruf als Gauges exportieren;
+# source ist ein Dict oder eine Funktion, die eines liefert
+def register_stats(name: str, source, documentation: str = ""):
+    _collectors.append((f"{METRICS_PREFIX}_{name}", source, documentation or f"Statistik {name}"))
+
+# Metriken anderer Prozesse (z.B. der Worker hinter runtime.ShardRouter) beim Abruf einmischen;
+# source liefert eine Liste von (Labels, Prometheus-Text), die Labels kommen zu jedem Messwert hinzu
+def register_snapshots(source):
+    _snapshots.append(source)
+
+def render() -> bytes:
+    local = _render_local()
+    if not _snapshots:
+        return local
+    parts = [({}, local)]
+    for source in _snapshots:
+        try:
+            parts.extend(source())
+        except Exception:
+            logger.exception("Metriken anderer Prozesse nicht lesbar")
+    return merge(parts)
+
+def _with_labels(line: str, labels: str) -> str:
+    end = min((i for i in (line.find("{"), line.find(" ")) if i >= 0), default=len(line))
+    if line[end:end + 1] == "{":
+        return f"{line[:end + 1]}{labels},{line[end + 1:]}"
+    return f"{line[:end]}{{{labels}}}{line[end:]}"
+
+# Mehrere Texte im Prometheus-Format zusammenführen: HELP und TYPE je Familie nur einmal,
+# darunter die Messwerte aller Texte mit den jeweils zusätzlichen Labels
+def merge(parts: list) -> bytes:
+    families = {}  # Name -> [HELP, TYPE, Messwerte]
+    for labels, text in parts:
+        extra = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+        family = families.setdefault("", [None, None, []])
+        for line in text.decode("utf-8").splitlines():
+            if line.startswith(("# HELP ", "# TYPE ")):
+                family = families.setdefault(line.split(" ", 3)[2], [None, None, []])
+                slot = 0 if line.startswith("# HELP ") else 1
+                family[slot] = family[slot] or line
+            elif line and not line.startswith("#"):
+                family[2].append(_with_labels(line, extra) if extra else line)
+    lines = []
+    for help_line, type_line, samples in families.values():
+        lines.extend(line for line in (help_line, type_line) if line)
+        lines.extend(samples)
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+def _render_local() -> bytes:
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for name, source, documentation in _collectors:
+        try:
+            stats = source() if callable(source) else source
+        except Exception:
+            logger.exception(f"Statistik {name} nicht lesbar")
+            continue
+        for key, value in stats.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            lines.append(f"# HELP {name}_{key} {documentation}")
+            lines.append(f"# TYPE {name}_{key} gauge")
+            lines.append(f"{name}_{key} {_format_value(value)}")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+# Metriken der Hot Paths (von den jeweiligen Modulen befüllt)
+UPDATE_LATENCY = Histogram("update_latency_seconds", "Zeit vom Eingang eines Updates bis zum Ende der Verarbeitung",
+                           ("cls",))
+UPDATE_WAIT = Histogram("update_queue_wait_seconds", "Wartezeit eines Updates im Scheduler", ("cls",))
+HANDLER_LATENCY = Histogram("handler_seconds", "Laufzeit der Telegram-Handler", ("handler",))
+HANDLER_ERRORS = Counter("handler_errors_total", "Fehlgeschlagene Handler-Aufrufe", ("handler",))
+OPENAI_LATENCY = Histogram("openai_request_seconds", "Dauer der OpenAI-Aufrufe pro Endpunkt (inkl. Wartezeit)",
+                           ("endpoint",))
+OPENAI_ERRORS = Counter("openai_errors_total", "Fehlgeschlagene OpenAI-Aufrufe", ("endpoint",))
+OPENAI_TOKENS = Counter("openai_tokens_total", "Verbrauchte Tokens laut usage", ("endpoint", "kind"))
+MODEL_LATENCY = Histogram("model_request_seconds", "Dauer erfolgreicher Versuche pro Aufgabe und Modell "
+                          "(Streams: bis zum Beginn der Antwort)", ("task", "model"))
+MODEL_REQUESTS = Counter("model_requests_total", "Versuche pro Aufgabe und Modell nach Ergebnis",
+                         ("task", "model", "outcome"))
+MODEL_COST = Counter("model_cost_usd_total", "Geschätzte Kosten laut Preistabelle", ("task", "model"))
+JOB_DURATION = Histogram("job_seconds", "Laufzeit der Hintergrundaufträge", ("kind",))
+LOOP_LAG = Histogram("event_loop_lag_seconds", "Verzögerung des Event Loops",
+                     buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+TEMPFILE_BYTES = Counter("tempfile_bytes_total", "In temporäre Dateien ausgelagerte Bytes", ("source",))
+TEMPFILES = Counter("tempfiles_total", "Angelegte temporäre Dateien", ("source",))
+
+# Handler-Dekorator: Laufzeit, Fehler und (optional) ein OpenTelemetry-Span pro Aufruf
+def instrumented(handler):
+    name = handler.__name__
+
+    @functools.wraps(handler)
+    async def wrapper(update, context):
+        start = time.perf_counter()
+        with span(f"handler.{name}", chat_id=getattr(getattr(update, "effective_chat", None), "id", None)):
+            try:
+                return await handler(update, context)
+            except Exception:
+                HANDLER_ERRORS.inc(handler=name)
+                raise
+            finally:
+                HANDLER_LATENCY.observe(time.perf_counter() - start, handler=name)
+    return wrapper
+
+_tracer = None
+
+# OpenTelemetry-Span, falls aktiviert und installiert; sonst ohne Wirkung
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    global _tracer, OTEL_ENABLED
+    if not OTEL_ENABLED:
+        yield None
+        return
+    if _tracer is None:
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            logger.warning("OTEL_ENABLED=1, aber opentelemetry-api ist nicht installiert")
+            OTEL_ENABLED = False
+            yield None
+            return
+        _tracer = trace.get_tracer("tele2")
+    with _tracer.start_as_current_span(name) as current:
+        for key, value in attributes.items():
+            if value is not None:
+                current.set_attribute(key, value)
+        yield current
+
+_lag_task = None
+
+async def _monitor_loop_lag(interval: float):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(0.0, loop.time() - start - interval))
+
+async def start_loop_monitor(interval: float = LOOP_LAG_INTERVAL):
+    global _lag_task
+    if _lag_task is None:
+        _lag_task = asyncio.create_task(_monitor_loop_lag(interval))
+
+async def stop_loop_monitor():
+    global _lag_task
+    if _lag_task is not None:
+        _lag_task.cancel()
+        await asyncio.gather(_lag_task, return_exceptions=True)
+        _lag_task = None
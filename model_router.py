@@ -0,0 +1,276 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from metrics import MODEL_COST, MODEL_LATENCY, MODEL_REQUESTS
+from openai_client import get_client
+
+logger = logging.getLogger(__name__)
+
+# Modellrouten pro Aufgabe: erstes Modell bevorzugt, weitere als Fallback (kommagetrennt)
+MODEL_ROUTES = {
+    "chat": os.getenv("MODEL_ROUTE_CHAT", "gpt-4o,gpt-4o-mini"),
+    "summary": os.getenv("MODEL_ROUTE_SUMMARY", "gpt-4o-mini,gpt-4o"),
+    "summary_final": os.getenv("MODEL_ROUTE_SUMMARY_FINAL", "gpt-4o,gpt-4o-mini"),
+    "vision": os.getenv("MODEL_ROUTE_VISION", "gpt-4o-mini,gpt-4o"),
+    "images": os.getenv("MODEL_ROUTE_IMAGES", "dall-e-3,dall-e-2"),
+}
+
+# Latenzbudget (Sekunden) pro Aufgabe bis zum Beginn der Antwort: länger dauernde Versuche werden
+# abgebrochen und das nächste Modell übernimmt (beim letzten Modell gilt nur der Endpunkt-Timeout).
+# Streams sind nach dem Kopf der Antwort fertig; ohne Stream kommt die Generierung hinzu
+# (max_tokens x MODEL_SECONDS_PER_TOKEN), damit lange Antworten nicht abgeschnitten werden.
+MODEL_LATENCY_BUDGETS = {
+    "chat": float(os.getenv("MODEL_BUDGET_CHAT", "20")),
+    "summary": float(os.getenv("MODEL_BUDGET_SUMMARY", "30")),
+    "summary_final": float(os.getenv("MODEL_BUDGET_SUMMARY_FINAL", "45")),
+    "vision": float(os.getenv("MODEL_BUDGET_VISION", "30")),
+    "images": float(os.getenv("MODEL_BUDGET_IMAGES", "60")),
+}
+
+MODEL_SECONDS_PER_TOKEN = float(os.getenv("MODEL_SECONDS_PER_TOKEN", "0.03"))  # Zuschlag ohne Stream
+MODEL_HEDGE_TASKS = {t for t in os.getenv("MODEL_HEDGE_TASKS", "").split(",") if t}  # z.B. "chat,vision"
+MODEL_HEDGE_MIN_DELAY = float(os.getenv("MODEL_HEDGE_MIN_DELAY", "0.5"))  # Sekunden, frühestens nach p95
+MODEL_MIN_SAMPLES = int(os.getenv("MODEL_MIN_SAMPLES", "20"))  # Messwerte, bevor p95/Fehlerquote zählen
+MODEL_WINDOW = int(os.getenv("MODEL_WINDOW", "200"))  # letzte Aufrufe pro Modell für p95 und Fehlerquote
+MODEL_MAX_ERROR_RATE = float(os.getenv("MODEL_MAX_ERROR_RATE", "0.3"))  # darüber gilt ein Modell als gestört
+MODEL_PROBE_RATE = float(os.getenv("MODEL_PROBE_RATE", "0.05"))  # Anteil, der gestörte Modelle weiter prüft
+MODEL_LARGE_PROMPT_TOKENS = int(os.getenv("MODEL_LARGE_PROMPT_TOKENS", "0"))  # darüber günstigstes Modell zuerst
+
+# Kontextfenster (Tokens) und Preise in USD (pro 1M Prompt-/Completion-Tokens bzw. pro Bild)
+MODEL_CATALOG = {
+    "gpt-4o": {"context": 128000, "prompt": 2.50, "completion": 10.00},
+    "gpt-4o-mini": {"context": 128000, "prompt": 0.15, "completion": 0.60},
+    "gpt-4-turbo": {"context": 128000, "prompt": 10.00, "completion": 30.00},
+    "gpt-3.5-turbo": {"context": 16385, "prompt": 0.50, "completion": 1.50},
+    "dall-e-3": {"image": 0.04},
+    "dall-e-2": {"image": 0.02},
+}
+
+# Fehler, bei denen ein anderes Modell helfen kann: Timeout, Verbindungsabbruch, 5xx;
+# 4xx (ungültige Anfrage, Authentifizierung, Rate Limit des Kontos) gelten für alle Modelle
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    import openai
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+# Kosten einer Antwort laut usage (Chat) bzw. Anzahl erzeugter Bilder
+def estimate_cost(model: str, response) -> float:
+    prices = MODEL_CATALOG.get(model)
+    if prices is None:
+        return 0.0
+    if "image" in prices:
+        return prices["image"] * len(getattr(response, "data", None) or ())
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return 0.0
+    return ((getattr(usage, "prompt_tokens", 0) or 0) * prices["prompt"]
+            + (getattr(usage, "completion_tokens", 0) or 0) * prices["completion"]) / 1_000_000
+
+# Grobe Promptgröße für die Modellwahl (ca. 4 Zeichen pro Token), ohne Tokenizer im Hot Path
+def estimate_tokens(messages: list) -> int:
+    return sum(len(m["content"]) if isinstance(m["content"], str) else 0 for m in messages) // 4
+
+# Beobachtete Latenz und Fehler eines Modells für eine Aufgabe (gleitendes Fenster). Die Latenz
+# wird als Anteil am Budget des jeweiligen Aufrufs gespeichert, damit Streams (nur bis zum Beginn)
+# und vollständige Antworten mit unterschiedlichem max_tokens vergleichbar sind.
+class ModelStats:
+    def __init__(self, window: int = MODEL_WINDOW):
+        self.latencies = deque(maxlen=window)  # Latenz / Budget
+        self.outcomes = deque(maxlen=window)  # True = Fehler
+        self.requests = 0
+        self.errors = 0
+        self.cutoffs = 0
+        self.cost = 0.0
+
+    def record(self, share: float, failed: bool, cost: float = 0.0):
+        self.requests += 1
+        self.outcomes.append(failed)
+        if failed:
+            self.errors += 1
+        else:
+            self.latencies.append(share)
+        self.cost += cost
+
+    # Über dem Budget abgebrochen: kein Fehler des Modells (die Antwort kann einfach lang sein),
+    # zählt daher weder zur Fehlerquote noch zur Latenzverteilung
+    def cut_off(self):
+        self.requests += 1
+        self.cutoffs += 1
+
+    def quantile(self, q: float):
+        if len(self.latencies) < MODEL_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def error_rate(self) -> float:
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    # Gestört: zu viele Fehler oder p95 über dem Latenzbudget
+    def degraded(self) -> bool:
+        if len(self.outcomes) >= MODEL_MIN_SAMPLES and self.error_rate > MODEL_MAX_ERROR_RATE:
+            return True
+        p95 = self.quantile(0.95)
+        return p95 is not None and p95 > 1.0
+
+# Wählt pro Aufgabe das Modell nach Promptgröße und beobachteter Latenz, weicht bei Timeouts und
+# 5xx auf das nächste Modell der Route aus und startet optional nach dem p95 des Modells eine
+# zweite Anfrage (Hedging), deren Ergebnis genommen wird, falls sie zuerst fertig ist
+class ModelRouter:
+    def __init__(self, routes: dict = None, budgets: dict = None, hedge_tasks: set = None, client=get_client):
+        routes = MODEL_ROUTES if routes is None else routes
+        self.routes = {task: [m.strip() for m in spec.split(",") if m.strip()] if isinstance(spec, str) else list(spec)
+                       for task, spec in routes.items()}
+        self.budgets = MODEL_LATENCY_BUDGETS if budgets is None else budgets
+        self.hedge_tasks = MODEL_HEDGE_TASKS if hedge_tasks is None else hedge_tasks
+        self.client = client  # (max_retries=None) -> OpenAI-Client
+        self.stats = {"fallbacks": 0, "hedges": 0, "hedge_wins": 0, "demotions": 0}
+        self._models = {}
+
+    def primary(self, task: str) -> str:
+        return self.routes[task][0]
+
+    def budget(self, task: str, max_tokens: int = 0) -> float:
+        return self.budgets.get(task, float("inf")) + max_tokens * MODEL_SECONDS_PER_TOKEN
+
+    def _stats(self, task: str, model: str) -> ModelStats:
+        stats = self._models.get((task, model))
+        if stats is None:
+            stats = self._models[(task, model)] = ModelStats()
+        return stats
+
+    # Reihenfolge der Modelle für eine Anfrage: zu kleine Kontextfenster entfallen, große Prompts
+    # gehen zuerst an das günstigste Modell, gestörte Modelle rücken (bis auf Stichproben) nach hinten
+    def candidates(self, task: str, prompt_tokens: int = 0) -> list:
+        models = self.routes[task]
+        if prompt_tokens:
+            fitting = [m for m in models if prompt_tokens < MODEL_CATALOG.get(m, {}).get("context", float("inf"))]
+            models = fitting or models
+            if MODEL_LARGE_PROMPT_TOKENS and prompt_tokens > MODEL_LARGE_PROMPT_TOKENS:
+                models = sorted(models, key=lambda m: MODEL_CATALOG.get(m, {}).get("prompt", float("inf")))
+        healthy = [m for m in models if not self._stats(task, m).degraded()]
+        if healthy and healthy[0] != models[0] and random.random() >= MODEL_PROBE_RATE:
+            self.stats["demotions"] += 1
+            return healthy + [m for m in models if m not in healthy]
+        return list(models)
+
+    # request: async (Modell, Client) -> Antwort; bei Streams die Antwort von create(stream=True),
+    # die erst nach dem Kopf der Antwort zurückkehrt (dann max_tokens=0 übergeben). Solange ein
+    # Fallback-Modell bleibt, bekommt der Versuch einen Client ohne SDK-Wiederholungen, damit
+    # 5xx/Timeouts sofort zum nächsten Modell führen statt erst nach Backoff auf demselben Modell.
+    async def call(self, task: str, request, prompt_tokens: int = 0, max_tokens: int = 0):
+        models = self.candidates(task, prompt_tokens)
+        budget = self.budget(task, max_tokens)
+        index = 0
+        while True:
+            model = models[index]
+            fallback = models[index + 1] if index + 1 < len(models) else None
+            timeout = budget if fallback else None
+            hedged = (fallback is not None and task in self.hedge_tasks
+                      and self._stats(task, model).quantile(0.95) is not None)
+            try:
+                if hedged:
+                    hedge_timeout = budget if index + 2 < len(models) else None
+                    return await self._hedged(task, model, fallback, request, budget, timeout, hedge_timeout)
+                return await self._attempt(task, model, request, budget, timeout)
+            except Exception as e:
+                index += 2 if hedged else 1  # beim Hedging wurde das nächste Modell schon versucht
+                if index >= len(models) or not is_retryable(e):
+                    raise
+                self.stats["fallbacks"] += 1
+                logger.warning(f"{task}: {model} fehlgeschlagen ({type(e).__name__}), weiche auf {models[index]} aus")
+
+    # timeout None = letztes Modell der Route (nur Endpunkt-Timeout, SDK-Wiederholungen erlaubt)
+    async def _attempt(self, task: str, model: str, request, budget: float, timeout: float = None):
+        stats = self._stats(task, model)
+        client = self.client() if timeout is None else self.client(max_retries=0)
+        start = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(request(model, client), timeout)
+        except asyncio.CancelledError:
+            MODEL_REQUESTS.inc(task=task, model=model, outcome="cancelled")
+            raise
+        except asyncio.TimeoutError:
+            stats.cut_off()
+            MODEL_REQUESTS.inc(task=task, model=model, outcome="budget")
+            raise
+        except Exception:
+            stats.record(0.0, True)
+            MODEL_REQUESTS.inc(task=task, model=model, outcome="error")
+            raise
+        latency = time.perf_counter() - start
+        cost = estimate_cost(model, response)
+        stats.record(latency / budget, False, cost)
+        MODEL_LATENCY.observe(latency, task=task, model=model)
+        MODEL_REQUESTS.inc(task=task, model=model, outcome="ok")
+        if cost:
+            MODEL_COST.inc(cost, task=task, model=model)
+        return response
+
+    # Erst das bevorzugte Modell; braucht es länger als sein p95 (oder scheitert es vorher mit
+    # einem behebbaren Fehler), zusätzlich das nächste Modell. Die erste erfolgreiche Antwort
+    # gewinnt, die andere Anfrage wird abgebrochen; scheitern beide, gilt der letzte Fehler.
+    async def _hedged(self, task: str, model: str, fallback: str, request, budget: float, timeout: float,
+                      hedge_timeout: float):
+        p95 = self._stats(task, model).quantile(0.95) * budget
+        primary = asyncio.create_task(self._attempt(task, model, request, budget, timeout))
+        tasks = {primary}
+        try:
+            await asyncio.wait(tasks, timeout=max(p95, MODEL_HEDGE_MIN_DELAY))
+            if primary.done():
+                tasks.discard(primary)
+                if primary.exception() is None or not is_retryable(primary.exception()):
+                    return primary.result()
+            self.stats["hedges"] += 1
+            hedge = asyncio.create_task(self._attempt(task, fallback, request, budget, hedge_timeout))
+            tasks.add(hedge)
+            error = None
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for finished in done:
+                    tasks.discard(finished)
+                    error = finished.exception()
+                    if error is None:
+                        if finished is hedge:
+                            self.stats["hedge_wins"] += 1
+                        return finished.result()
+            raise error
+        finally:
+            for pending in tasks:
+                pending.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for pending in tasks:
+                if not pending.cancelled() and pending.exception() is None:
+                    await _discard(pending.result())
+
+    # Zusammenfassung pro Aufgabe und Modell für /metrics und Benchmarks
+    def summary(self) -> dict:
+        result = {}
+        for (task, model), stats in self._models.items():
+            result[f"{task}/{model}"] = {
+                "requests": stats.requests,
+                "errors": stats.errors,
+                "cutoffs": stats.cutoffs,
+                "error_rate": stats.error_rate,
+                "p50_budget_share": stats.quantile(0.5),
+                "p95_budget_share": stats.quantile(0.95),
+                "cost": stats.cost,
+                "degraded": stats.degraded(),
+            }
+        return result
+
+# Verworfene Antwort einer abgebrochenen Hedge-Anfrage schließen (offener Stream hält sonst die Verbindung)
+async def _discard(response):
+    close = getattr(getattr(response, "response", None), "aclose", None)
+    if close is not None:
+        try:
+            await close()
+        except Exception:
+            pass
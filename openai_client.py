@@ -0,0 +1,100 @@
+import os
+import asyncio
+import contextlib
+import time
+import httpx
+from metrics import OPENAI_ERRORS, OPENAI_LATENCY, OPENAI_TOKENS
+
+# Umgebungsvariablen
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # z.B. lokaler Stub-Server für Benchmarks
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "200"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+# Maximale Anzahl gleichzeitiger Anfragen pro Endpunkt
+ENDPOINT_LIMITS = {
+    "chat": int(os.getenv("OPENAI_CHAT_CONCURRENCY", "100")),
+    "vision": int(os.getenv("OPENAI_VISION_CONCURRENCY", "20")),
+    "tts": int(os.getenv("OPENAI_TTS_CONCURRENCY", "20")),
+    "transcription": int(os.getenv("OPENAI_TRANSCRIPTION_CONCURRENCY", "20")),
+    "images": int(os.getenv("OPENAI_IMAGES_CONCURRENCY", "10")),
+    "embeddings": int(os.getenv("OPENAI_EMBEDDINGS_CONCURRENCY", "20")),
+}
+
+# Timeouts (Sekunden) pro Endpunkt
+ENDPOINT_TIMEOUTS = {
+    "chat": float(os.getenv("OPENAI_CHAT_TIMEOUT", "60")),
+    "vision": float(os.getenv("OPENAI_VISION_TIMEOUT", "60")),
+    "tts": float(os.getenv("OPENAI_TTS_TIMEOUT", "60")),
+    "transcription": float(os.getenv("OPENAI_TRANSCRIPTION_TIMEOUT", "120")),
+    "images": float(os.getenv("OPENAI_IMAGES_TIMEOUT", "120")),
+    "embeddings": float(os.getenv("OPENAI_EMBEDDINGS_TIMEOUT", "60")),
+}
+
+_client = None
+_variants = {}  # max_retries -> Kopie des Clients (gleicher Connection-Pool)
+_semaphores = {}
+
+# Langlebiger, gemeinsam genutzter Async-Client mit Connection-Pool; das openai-Paket
+# (mehrere 100 ms Importzeit) wird erst hier geladen. Mit max_retries eine Variante mit
+# abweichender Wiederholungszahl (z.B. 0, wenn der Modell-Router selbst auf ein anderes Modell ausweicht).
+def get_client(max_retries: int = None):
+    global _client
+    if _client is None:
+        import openai
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+            ),
+            timeout=max(ENDPOINT_TIMEOUTS.values()),
+        )
+        _client = openai.AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            base_url=OPENAI_BASE_URL,
+            max_retries=OPENAI_MAX_RETRIES,
+            http_client=http_client,
+        )
+    if max_retries is None or max_retries == _client.max_retries:
+        return _client
+    variant = _variants.get(max_retries)
+    if variant is None:
+        variant = _variants[max_retries] = _client.with_options(max_retries=max_retries)
+    return variant
+
+# Begrenzt die gleichzeitigen Anfragen eines Endpunkts und liefert dessen Timeout;
+# Dauer (inkl. Wartezeit auf einen freien Platz) und Fehler landen in den Metriken
+@contextlib.asynccontextmanager
+async def limit(endpoint: str):
+    semaphore = _semaphores.get(endpoint)
+    if semaphore is None:
+        semaphore = _semaphores[endpoint] = asyncio.Semaphore(ENDPOINT_LIMITS[endpoint])
+    start = time.perf_counter()
+    try:
+        async with semaphore:
+            yield ENDPOINT_TIMEOUTS[endpoint]
+    except Exception:
+        OPENAI_ERRORS.inc(endpoint=endpoint)
+        raise
+    finally:
+        OPENAI_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+
+# Tokenverbrauch einer Antwort erfassen (Streams liefern in dieser API-Version kein usage)
+def record_usage(endpoint: str, response):
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    OPENAI_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, endpoint=endpoint, kind="prompt")
+    OPENAI_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, endpoint=endpoint, kind="completion")
+
+# Client beim Start im Hintergrund-Thread anlegen, damit der erste Aufruf nicht den Import bezahlt
+async def warm_up_client():
+    await asyncio.to_thread(get_client)
+
+# Client beim Herunterfahren schließen
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+        _variants.clear()
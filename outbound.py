@@ -0,0 +1,185 @@
+import os
+import time
+import asyncio
+import logging
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+from telegram.request import BaseRequest, HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+OUTBOUND_POOL_SIZE = int(os.getenv("OUTBOUND_POOL_SIZE", "128"))  # HTTP-Verbindungen zur Bot API
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))  # Nachrichten pro Sekunde insgesamt
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))  # pro Sekunde und Privatchat
+OUTBOUND_GROUP_RATE = float(os.getenv("OUTBOUND_GROUP_RATE", str(20 / 60)))  # pro Sekunde und Gruppe
+OUTBOUND_CHAT_BURST = float(os.getenv("OUTBOUND_CHAT_BURST", "3"))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))
+OUTBOUND_COALESCE_WINDOW = float(os.getenv("OUTBOUND_COALESCE_WINDOW", "0.2"))  # Sekunden
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+
+# Für send_message(..., rate_limit_args=COALESCE): aufeinanderfolgende reine Textnachrichten
+# an denselben Chat dürfen zu einer Nachricht zusammengefasst werden
+COALESCE = {"coalesce": True}
+
+# Nur Sendemethoden unterliegen Telegrams Flood-Limits
+_LIMITED_PREFIXES = ("send", "edit", "copy", "forward")
+
+class _Bucket:
+    __slots__ = ("rate", "burst", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    # Reserviert ein Token (ggf. im Voraus) und liefert die nötige Wartezeit
+    def reserve(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.blocked_until - now)
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    @property
+    def idle(self) -> bool:
+        return self.tokens + (time.monotonic() - self.updated) * self.rate >= self.burst
+
+class _Batch:
+    __slots__ = ("texts", "length", "future")
+
+    def __init__(self, text: str, future):
+        self.texts = [text]
+        self.length = len(text)
+        self.future = future
+
+# Ausgehende Bot-API-Aufrufe drosseln: Token-Buckets global und pro Chat,
+# automatische Wiederholung nach RetryAfter, optionales Zusammenfassen von Textnachrichten
+class OutboundLimiter(BaseRateLimiter):
+    def __init__(self, global_rate: float = OUTBOUND_GLOBAL_RATE, chat_rate: float = OUTBOUND_CHAT_RATE,
+                 group_rate: float = OUTBOUND_GROUP_RATE, chat_burst: float = OUTBOUND_CHAT_BURST,
+                 max_retries: int = OUTBOUND_MAX_RETRIES, coalesce_window: float = OUTBOUND_COALESCE_WINDOW):
+        self.global_bucket = _Bucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.coalesce_window = coalesce_window
+        self.stats = {"requests": 0, "throttled": 0, "wait_seconds_total": 0.0,
+                      "retry_after": 0, "coalesced": 0}
+        self._chats = {}
+        self._batches = {}
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _chat_bucket(self, chat_id) -> _Bucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10000:
+                self._chats = {cid: b for cid, b in self._chats.items() if not b.idle}
+            is_group = str(chat_id).startswith(("-", "@"))
+            rate = self.group_rate if is_group else self.chat_rate
+            bucket = self._chats[chat_id] = _Bucket(rate, self.chat_burst if not is_group else 1)
+        return bucket
+
+    async def _throttle(self, chat_id):
+        wait = self.global_bucket.reserve()
+        if chat_id is not None:
+            wait = max(wait, self._chat_bucket(chat_id).reserve())
+        if wait > 0:
+            self.stats["throttled"] += 1
+            self.stats["wait_seconds_total"] += wait
+            await asyncio.sleep(wait)
+
+    async def _send(self, callback, args, kwargs, chat_id, max_retries, throttled: bool = False):
+        for attempt in range(max_retries + 1):
+            if not throttled or attempt:
+                await self._throttle(chat_id)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                self.stats["retry_after"] += 1
+                if attempt >= max_retries:
+                    raise
+                logger.info(f"Flood-Limit (Chat {chat_id}), neuer Versuch in {e.retry_after}s")
+                (self._chat_bucket(chat_id) if chat_id is not None else self.global_bucket).block(e.retry_after)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        self.stats["requests"] += 1
+        rate_limit_args = rate_limit_args or {}
+        max_retries = rate_limit_args.get("max_retries", self.max_retries)
+        chat_id = data.get("chat_id") if endpoint.startswith(_LIMITED_PREFIXES) else None
+        if chat_id is not None and "text" in data:
+            if endpoint == "editMessageText":
+                # Ein noch wartender Edit derselben Nachricht ist durch den neueren überholt
+                return await self._coalesced(callback, args, kwargs, data, chat_id, max_retries, replace=True)
+            if endpoint == "sendMessage" and rate_limit_args.get("coalesce"):
+                return await self._coalesced(callback, args, kwargs, data, chat_id, max_retries)
+        return await self._send(callback, args, kwargs, chat_id, max_retries)
+
+    # Solange der erste Aufruf auf sein Token wartet, werden kompatible Folgeaufrufe
+    # angehängt (bzw. ersetzen den Text bei Edits) und erhalten dasselbe Ergebnis
+    async def _coalesced(self, callback, args, kwargs, data, chat_id, max_retries, replace: bool = False):
+        text = str(data["text"])
+        key = (chat_id, tuple(sorted((k, repr(v)) for k, v in data.items() if k != "text")))
+        batch = self._batches.get(key)
+        if batch is not None and (replace or batch.length + 2 + len(text) <= TELEGRAM_MAX_MESSAGE_LENGTH):
+            if replace:
+                batch.texts, batch.length = [text], len(text)
+            else:
+                batch.texts.append(text)
+                batch.length += 2 + len(text)
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(batch.future)
+
+        batch = _Batch(text, asyncio.get_running_loop().create_future())
+        self._batches[key] = batch
+        try:
+            try:
+                if not replace:
+                    await asyncio.sleep(self.coalesce_window)
+                await self._throttle(chat_id)
+            finally:
+                if self._batches.get(key) is batch:
+                    del self._batches[key]
+            data["text"] = "\n\n".join(batch.texts)
+            result = await self._send(callback, args, kwargs, chat_id, max_retries, throttled=True)
+        except asyncio.CancelledError:
+            batch.future.cancel()
+            raise
+        except BaseException as e:
+            batch.future.set_exception(e)
+            batch.future.exception()  # als abgerufen markieren, falls niemand wartet
+            raise
+        batch.future.set_result(result)
+        return result
+
+# HTTPXRequest, dessen httpx-Client (samt SSL-Kontext, ca. 45 ms) erst bei initialize()
+# in einem Thread entsteht statt schon beim Bauen der Application
+class LazyRequest(BaseRequest):
+    def __init__(self, **kwargs):
+        self._kwargs = kwargs
+        self._request = None
+
+    async def initialize(self):
+        if self._request is None:
+            self._request = await asyncio.to_thread(HTTPXRequest, **self._kwargs)
+        await self._request.initialize()
+
+    async def shutdown(self):
+        if self._request is not None:
+            await self._request.shutdown()
+
+    async def do_request(self, *args, **kwargs):
+        if self._request is None:
+            await self.initialize()
+        return await self._request.do_request(*args, **kwargs)
@@ -0,0 +1,170 @@
+import os
+import html
+from io import BytesIO
+
+RENDER_FORMATS = ("pdf", "docx", "xlsx", "html")
+RENDER_STREAMING = os.getenv("RENDER_STREAMING", "1") == "1"  # schon während der LLM-Antwort rendern
+PDF_FONT = os.getenv("PDF_FONT", "Helvetica")
+PDF_FONT_SIZE = float(os.getenv("PDF_FONT_SIZE", "11"))
+PDF_MARGIN = 56  # Punkte (ca. 2 cm)
+
+class RenderError(Exception):
+    pass
+
+# Basisklasse: nimmt Text stückweise entgegen (z.B. gestreamte LLM-Deltas) und
+# gibt vollständige Zeilen sofort an _write_line weiter; finish() liefert die Datei
+class Renderer:
+    def __init__(self):
+        self._partial = ""
+        self.lines = 0
+
+    def feed(self, text: str):
+        self._partial += text
+        if "\n" not in self._partial:
+            return
+        *lines, self._partial = self._partial.split("\n")
+        for line in lines:
+            self.lines += 1
+            self._write_line(line)
+
+    def finish(self) -> bytes:
+        if self._partial or not self.lines:
+            self.lines += 1
+            self._write_line(self._partial)
+            self._partial = ""
+        return self._finish()
+
+    def _write_line(self, line: str):
+        raise NotImplementedError
+
+    def _finish(self) -> bytes:
+        raise NotImplementedError
+
+# Mehrseitiges PDF mit Zeilenumbruch an der Seitenbreite
+class PdfRenderer(Renderer):
+    def __init__(self, font: str = PDF_FONT, font_size: float = PDF_FONT_SIZE, margin: float = PDF_MARGIN):
+        # Formatbibliotheken erst bei der ersten Datei laden (schnellerer Start)
+        try:
+            from reportlab.lib.pagesizes import A4
+            from reportlab.pdfbase.pdfmetrics import stringWidth
+            from reportlab.pdfgen import canvas
+        except ImportError:
+            raise RenderError("PDF-Erstellung nicht verfügbar (reportlab fehlt).")
+        super().__init__()
+        self.font = font
+        self.font_size = font_size
+        self.margin = margin
+        self.leading = font_size * 1.3
+        self.width, self.height = A4
+        self._max_width = self.width - 2 * margin
+        self._string_width = stringWidth
+        self._space = stringWidth(" ", font, font_size)
+        self._word_widths = {}
+        self._buffer = BytesIO()
+        self._canvas = canvas.Canvas(self._buffer, pagesize=A4, pageCompression=1)
+        self._text = None
+        self._y = 0
+
+    def _new_page(self):
+        if self._text is not None:
+            self._canvas.drawText(self._text)
+            self._canvas.showPage()
+        self._y = self.height - self.margin
+        self._text = self._canvas.beginText(self.margin, self._y)
+        self._text.setFont(self.font, self.font_size, self.leading)
+
+    # Greedy-Umbruch an Leerzeichen; Wortbreiten werden zwischengespeichert
+    def _wrap(self, line: str) -> list:
+        wrapped, current, width = [], [], 0.0
+        for word in line.split(" "):
+            word_width = self._word_widths.get(word)
+            if word_width is None:
+                word_width = self._word_widths[word] = self._string_width(word, self.font, self.font_size)
+            if current and width + self._space + word_width > self._max_width:
+                wrapped.append(" ".join(current))
+                current, width = [word], word_width
+            else:
+                width += (self._space if current else 0) + word_width
+                current.append(word)
+        wrapped.append(" ".join(current))
+        return wrapped
+
+    def _write_line(self, line: str):
+        for part in self._wrap(line):
+            if self._text is None or self._y - self.leading < self.margin:
+                self._new_page()
+            self._text.textLine(part)
+            self._y -= self.leading
+
+    def _finish(self) -> bytes:
+        self._canvas.drawText(self._text)
+        self._canvas.showPage()
+        self._canvas.save()
+        return self._buffer.getvalue()
+
+# Ein Absatz pro Zeile
+class DocxRenderer(Renderer):
+    def __init__(self):
+        try:
+            import docx
+        except ImportError:
+            raise RenderError("DOCX-Erstellung nicht verfügbar (python-docx fehlt).")
+        super().__init__()
+        self._document = docx.Document()
+
+    def _write_line(self, line: str):
+        self._document.add_paragraph(line)
+
+    def _finish(self) -> bytes:
+        buffer = BytesIO()
+        self._document.save(buffer)
+        return buffer.getvalue()
+
+# openpyxl im Write-only-Modus: Zeilen werden direkt serialisiert statt als Zellobjekte gehalten
+class XlsxRenderer(Renderer):
+    def __init__(self):
+        try:
+            import openpyxl
+        except ImportError:
+            raise RenderError("XLSX-Erstellung nicht verfügbar (openpyxl fehlt).")
+        super().__init__()
+        self._workbook = openpyxl.Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet("Sheet1")
+        self._sheet.append(["Text"])
+
+    def _write_line(self, line: str):
+        self._sheet.append([line])
+
+    def _finish(self) -> bytes:
+        buffer = BytesIO()
+        self._workbook.save(buffer)
+        return buffer.getvalue()
+
+class HtmlRenderer(Renderer):
+    def __init__(self, title: str = "Generated Document"):
+        super().__init__()
+        self._parts = [
+            "<!DOCTYPE html>\n<html>\n  <head>\n    <meta charset=\"UTF-8\">\n"
+            f"    <title>{html.escape(title)}</title>\n  </head>\n  <body>\n    <pre>"
+        ]
+
+    def _write_line(self, line: str):
+        self._parts.append(html.escape(line) + "\n")
+
+    def _finish(self) -> bytes:
+        self._parts.append("</pre>\n  </body>\n</html>\n")
+        return "".join(self._parts).encode("utf-8")
+
+_renderers = {"pdf": PdfRenderer, "docx": DocxRenderer, "xlsx": XlsxRenderer, "html": HtmlRenderer}
+
+def create_renderer(format_type: str) -> Renderer:
+    renderer = _renderers.get(format_type)
+    if renderer is None:
+        raise RenderError("Ungültiges Format. Nutze: pdf, docx, xlsx, html")
+    return renderer()
+
+# Kompletten Text rendern; läuft in einem Worker-Prozess (siehe jobs.BackgroundJobs.run_in_process)
+def render_document(format_type: str, text: str) -> bytes:
+    renderer = create_renderer(format_type)
+    renderer.feed(text)
+    return renderer.finish()
@@ -0,0 +1,163 @@
+import os
+import re
+import math
+import uuid
+import array
+import base64
+import asyncio
+from collections import Counter, OrderedDict
+
+RETRIEVAL_CHUNK_CHARS = int(os.getenv("RETRIEVAL_CHUNK_CHARS", "1500"))
+RETRIEVAL_CHUNK_OVERLAP = int(os.getenv("RETRIEVAL_CHUNK_OVERLAP", "200"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+RETRIEVAL_MAX_DOCS = int(os.getenv("RETRIEVAL_MAX_DOCS", "5"))  # Dokumente pro Chat
+RETRIEVAL_INDEX_CACHE = 1000  # Chats mit Index im Arbeitsspeicher
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text: str) -> list:
+    return [token for token in _TOKEN_RE.findall(text.lower()) if len(token) > 1]
+
+# Text in überlappende Abschnitte zerlegen, bevorzugt an Absatz- und Satzgrenzen
+def chunk_text(text: str, size: int = RETRIEVAL_CHUNK_CHARS, overlap: int = RETRIEVAL_CHUNK_OVERLAP) -> list:
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            for separator in ("\n\n", "\n", ". ", " "):
+                cut = text.rfind(separator, start + size // 2, end)
+                if cut != -1:
+                    end = cut + len(separator)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+# Invertierter Index mit BM25-Bewertung
+class BM25Index:
+    def __init__(self, chunks: list, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}  # Term -> Liste von (Abschnitt, Termhäufigkeit)
+        self.lengths = []
+        for i, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk))
+            self.lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append((i, tf))
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    def scores(self, query: str) -> dict:
+        n = len(self.lengths)
+        result = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for i, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / (self.avg_length or 1))
+                result[i] = result.get(i, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return result
+
+def _pack_vectors(vectors: list) -> str:
+    return base64.b64encode(array.array("f", [x for vector in vectors for x in vector]).tobytes()).decode("ascii")
+
+def _unpack_vectors(packed: str, count: int) -> list:
+    values = array.array("f")
+    values.frombytes(base64.b64decode(packed))
+    dim = len(values) // count if count else 0
+    return [values[i * dim:(i + 1) * dim] for i in range(count)]
+
+def _cosine(a, b) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+class _ChatIndex:
+    def __init__(self, revision: str, docs: list):
+        self.revision = revision
+        self.entries = []  # (Dokumentname, Abschnitt)
+        self.vectors = []
+        for doc in docs:
+            self.entries.extend((doc["name"], chunk) for chunk in doc["chunks"])
+            if doc.get("embeddings"):
+                self.vectors.extend(_unpack_vectors(doc["embeddings"], len(doc["chunks"])))
+        if len(self.vectors) != len(self.entries):
+            self.vectors = []
+        self.bm25 = BM25Index([chunk for _, chunk in self.entries])
+
+# Dokumente pro Chat: Abschnitte werden beim Upload erzeugt und im State-Backend abgelegt,
+# der Suchindex wird pro Prozess aus dem Backend aufgebaut und zwischengespeichert
+class DocumentStore:
+    def __init__(self, backend, embedder=None, max_docs: int = RETRIEVAL_MAX_DOCS):
+        self.backend = backend
+        self.embedder = embedder  # optional: async (Liste von Texten) -> Liste von Vektoren
+        self.max_docs = max_docs
+        self._indexes = OrderedDict()
+
+    async def add(self, chat_id: str, name: str, text: str):
+        chunks = chunk_text(text)
+        doc = {"name": name, "chunks": chunks}
+        if self.embedder is not None and chunks:
+            doc["embeddings"] = _pack_vectors(await self.embedder(chunks))
+        revision = uuid.uuid4().hex
+
+        # Atomar auf dem aktuellen Stand, damit parallele Uploads anderer Worker erhalten bleiben
+        def change(data):
+            docs = [d for d in (data or {"docs": []})["docs"] if d["name"] != name] + [doc]
+            return {"revision": revision, "docs": docs[-self.max_docs:]}
+        await self.backend.update("docs", chat_id, change)
+        # Revision zusätzlich unter eigenem Schlüssel: Suchen prüfen nur sie statt die Abschnitte zu laden
+        await self.backend.set("docs_revision", chat_id, revision)
+        await self.backend.set("doc", chat_id, text)
+
+    async def names(self, chat_id: str) -> list:
+        data = await self.backend.get("docs", chat_id)
+        return [doc["name"] for doc in data["docs"]] if data else []
+
+    # Vollständiger Text des zuletzt hochgeladenen Dokuments
+    async def latest_text(self, chat_id: str) -> str:
+        return await self.backend.get("doc", chat_id)
+
+    # Index nur neu aufbauen, wenn sich die Revision geändert hat; der Aufbau (Tokenisierung aller
+    # Abschnitte) läuft in einem Thread, damit große Dokumente den Event Loop nicht blockieren
+    async def _index(self, chat_id: str):
+        revision = await self.backend.get("docs_revision", chat_id)
+        index = self._indexes.get(chat_id)
+        if index is None or revision is None or index.revision != revision:
+            data = await self.backend.get("docs", chat_id)
+            if not data:
+                return None
+            if index is None or index.revision != data["revision"]:
+                index = await asyncio.to_thread(_ChatIndex, data["revision"], data["docs"])
+            self._indexes[chat_id] = index
+        self._indexes.move_to_end(chat_id)
+        while len(self._indexes) > RETRIEVAL_INDEX_CACHE:
+            self._indexes.popitem(last=False)
+        return index
+
+    # Die k relevantesten Abschnitte als (Dokumentname, Abschnitt), in Dokumentreihenfolge
+    async def search(self, chat_id: str, query: str, k: int = RETRIEVAL_TOP_K) -> list:
+        index = await self._index(chat_id)
+        if index is None or not index.entries:
+            return []
+        scores = index.bm25.scores(query)
+        if index.vectors and self.embedder is not None:
+            top = max(scores.values(), default=0.0) or 1.0
+            query_vector = (await self.embedder([query]))[0]
+            scores = {
+                i: 0.5 * scores.get(i, 0.0) / top + 0.5 * _cosine(query_vector, vector)
+                for i, vector in enumerate(index.vectors)
+            }
+        if not scores:
+            # Keine Treffer: Anfang der Dokumente als Kontext
+            best = list(range(min(k, len(index.entries))))
+        else:
+            best = sorted(sorted(scores, key=scores.get, reverse=True)[:k])
+        return [index.entries[i] for i in best]
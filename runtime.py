@@ -0,0 +1,343 @@
+import os
+import json
+import time
+import queue
+import bisect
+import signal
+import asyncio
+import hashlib
+import logging
+import argparse
+import multiprocessing
+
+from scheduler import ACCEPTED, FULL
+
+logger = logging.getLogger(__name__)
+
+# Betriebsart und Prozesse (siehe main): ein Prozess verarbeitet alles selbst; bei mehreren
+# nimmt ein Supervisor die Updates an und verteilt sie per Chat-Hash auf Worker-Prozesse
+RUNTIME_MODE = os.getenv("RUNTIME_MODE", "webhook")  # "webhook" oder "polling"
+WORKERS = int(os.getenv("WORKERS", "1"))
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "1000"))  # Updates pro Worker, darüber HTTP 429
+WORKER_STOP_TIMEOUT = float(os.getenv("WORKER_STOP_TIMEOUT", "60"))  # Sekunden zum Abarbeiten beim Stoppen
+SHARD_REPLICAS = int(os.getenv("SHARD_REPLICAS", "64"))  # virtuelle Knoten pro Worker im Hash-Ring
+POLLING_TIMEOUT = float(os.getenv("POLLING_TIMEOUT", "30"))  # Long Polling, Sekunden
+METRICS_PUSH_INTERVAL = float(os.getenv("METRICS_PUSH_INTERVAL", "5"))  # Sekunden, Worker -> Supervisor
+PORT = int(os.getenv("PORT", "5000"))
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+# Konsistentes Hashing: ändert sich die Zahl der Worker, wechseln nur ~1/N der Chats den Prozess
+class HashRing:
+    def __init__(self, nodes: int, replicas: int = SHARD_REPLICAS):
+        self.nodes = nodes
+        self._ring = sorted((_hash(f"{node}:{replica}"), node) for node in range(nodes) for replica in range(replicas))
+        self._keys = [point for point, _ in self._ring]
+
+    def node_for(self, key) -> int:
+        index = bisect.bisect(self._keys, _hash(str(key))) % len(self._keys)
+        return self._ring[index][1]
+
+# Schlüssel für Sharding und Reihenfolge: Chat, sonst Nutzer, sonst das Update selbst
+def shard_key(update):
+    for entity in (update.effective_chat, update.effective_user):
+        if entity is not None:
+            return entity.id
+    return update.update_id
+
+# Übergibt ein Update an einen Scheduler (UpdateScheduler oder ShardRouter) und wartet,
+# solange dessen Warteschlange voll ist
+async def submit_update(scheduler, update, retry_delay: float = 0.05):
+    status = await scheduler.submit(update)
+    while status == FULL:
+        await asyncio.sleep(retry_delay)
+        status = await scheduler.submit(update)
+    if status != ACCEPTED:
+        logger.info(f"Update {update.update_id} verworfen ({status})")
+    return status
+
+# Long Polling über getUpdates; die Updates laufen wie beim Webhook durch den Scheduler
+class PollingIngress:
+    def __init__(self, bot, scheduler, timeout: float = POLLING_TIMEOUT, allowed_updates: list = None):
+        self.bot = bot
+        self.scheduler = scheduler
+        self.timeout = timeout
+        self.allowed_updates = allowed_updates
+        self.stats = {"polls": 0, "updates": 0, "errors": 0}
+        self._offset = None
+        self._task = None
+
+    async def start(self):
+        await self.bot.delete_webhook()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        from telegram.error import NetworkError, RetryAfter
+        backoff = 1
+        while True:
+            try:
+                updates = await self.bot.get_updates(offset=self._offset, timeout=self.timeout,
+                                                     allowed_updates=self.allowed_updates,
+                                                     read_timeout=self.timeout + 10)
+            except RetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+                continue
+            except NetworkError as e:
+                self.stats["errors"] += 1
+                logger.warning(f"getUpdates fehlgeschlagen ({e}), neuer Versuch in {backoff}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            backoff = 1
+            self.stats["polls"] += 1
+            for update in updates:
+                await submit_update(self.scheduler, update)
+                self._offset = update.update_id + 1
+                self.stats["updates"] += 1
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        if self._offset is not None:
+            # Übergebene Updates bei Telegram bestätigen, sonst kommen sie beim nächsten Start erneut
+            try:
+                await self.bot.get_updates(offset=self._offset, limit=1, timeout=0)
+            except Exception as e:
+                logger.warning(f"Bestätigung der Updates fehlgeschlagen: {e}")
+
+# Verteilt Updates per konsistentem Hash auf Worker-Prozesse. Gleiche Schnittstelle wie der
+# UpdateScheduler (start, submit, stop), damit WebhookServer und PollingIngress ihn direkt nutzen.
+# Jeder Worker hat eine eigene Warteschlange, die der Supervisor besitzt: beim Neustart eines
+# Workers (Absturz oder SIGHUP) bleiben wartende Updates erhalten und die Reihenfolge pro Chat gewahrt.
+# Die Worker schicken regelmäßig ihre Metriken, /metrics des Supervisors zeigt sie mit Label worker.
+class ShardRouter:
+    def __init__(self, workers: int = WORKERS, queue_size: int = WORKER_QUEUE_SIZE,
+                 stop_timeout: float = WORKER_STOP_TIMEOUT):
+        self.ring = HashRing(workers)
+        self.stop_timeout = stop_timeout
+        self.stats = {"routed": 0, "rejected": 0, "restarts": 0, "crashes": 0}
+        self._context = multiprocessing.get_context("spawn")
+        self._queues = [self._context.Queue(queue_size) for _ in range(workers)]
+        self._processes = [None] * workers
+        self._ready = [None] * workers  # pro Worker ein Event, gesetzt nach dessen Start
+        self._replacing = set()
+        self._watch_task = None
+        self._snapshots = self._context.Queue(workers * 4)
+        self._metrics = {}  # Worker -> (Eingang, Prometheus-Text)
+        self._collect_task = None
+
+    @property
+    def queued(self) -> int:
+        try:
+            return sum(q.qsize() for q in self._queues)
+        except NotImplementedError:  # macOS
+            return 0
+
+    # Bereit, sobald jeder Worker gestartet ist (ein gerade neu startender Worker hält nur seine Warteschlange an)
+    @property
+    def ready(self) -> bool:
+        return all(event is not None and event.is_set()
+                   for index, event in enumerate(self._ready) if index not in self._replacing)
+
+    def _spawn(self, index: int):
+        self._ready[index] = self._context.Event()
+        process = self._context.Process(target=_worker_main,
+                                        args=(index, self._queues[index], self._ready[index], self._snapshots),
+                                        name=f"worker-{index}", daemon=True)
+        process.start()
+        self._processes[index] = process
+        logger.info(f"Worker {index} gestartet (PID {process.pid})")
+
+    def start(self):
+        for index in range(len(self._queues)):
+            self._spawn(index)
+        self._watch_task = asyncio.create_task(self._watch())
+        self._collect_task = asyncio.create_task(self._collect_metrics())
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(self.restart()))
+
+    async def submit(self, update) -> str:
+        index = self.ring.node_for(shard_key(update))
+        try:
+            self._queues[index].put_nowait(update.to_json())
+        except queue.Full:
+            self.stats["rejected"] += 1
+            return FULL
+        self.stats["routed"] += 1
+        return ACCEPTED
+
+    # Abgestürzte Worker neu starten; ihre Warteschlange übernimmt der Nachfolger
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(1)
+            for index, process in enumerate(self._processes):
+                if index not in self._replacing and not process.is_alive():
+                    self.stats["crashes"] += 1
+                    logger.error(f"Worker {index} beendet (Exit-Code {process.exitcode}), starte neu")
+                    self._spawn(index)
+
+    async def _collect_metrics(self):
+        while True:
+            await asyncio.sleep(1)
+            while True:
+                try:
+                    index, text = self._snapshots.get_nowait()
+                except queue.Empty:
+                    break
+                self._metrics[index] = (time.monotonic(), text)
+
+    # Letzter Stand jedes Workers für metrics.register_snapshots; Worker, die sich länger
+    # nicht gemeldet haben (beendet oder hängend), fallen heraus
+    def worker_metrics(self) -> list:
+        now = time.monotonic()
+        return [({"worker": index}, text) for index, (received, text) in sorted(self._metrics.items())
+                if now - received < 3 * METRICS_PUSH_INTERVAL + 1]
+
+    # Worker beenden: das Stoppsignal steht hinter allen bereits verteilten Updates
+    async def _stop_worker(self, index: int, drain: bool = True):
+        process = self._processes[index]
+        if drain:
+            await asyncio.to_thread(self._queues[index].put, None)
+            await asyncio.to_thread(process.join, self.stop_timeout)
+        if process.is_alive():
+            logger.warning(f"Worker {index} reagiert nicht, wird beendet")
+            process.terminate()
+            await asyncio.to_thread(process.join, 5)
+
+    # Rollierender Neustart (SIGHUP), z.B. nach einem Deployment: immer nur ein Worker gleichzeitig
+    async def restart(self):
+        for index in range(len(self._processes)):
+            if index in self._replacing:
+                continue
+            self._replacing.add(index)
+            try:
+                await self._stop_worker(index)
+                self._spawn(index)
+                self.stats["restarts"] += 1
+            finally:
+                self._replacing.discard(index)
+
+    async def stop(self, drain: bool = True):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            self._collect_task.cancel()
+            await asyncio.gather(self._watch_task, self._collect_task, return_exceptions=True)
+            self._watch_task = self._collect_task = None
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+        self._replacing.update(range(len(self._processes)))
+        await asyncio.gather(*(self._stop_worker(index, drain) for index in range(len(self._processes))))
+
+# Einstieg der Worker-Prozesse: kompletter Bot (bot.py) ohne eigene Annahme von Updates
+def _worker_main(index: int, updates, ready, snapshots):
+    # Beendet werden Worker nur vom Supervisor (Strg+C/SIGTERM treffen oft die ganze Prozessgruppe)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    # Eigene Auftrags-Datenbank pro Worker; Chats bleiben über den Hash-Ring demselben Worker zugeordnet
+    root, ext = os.path.splitext(os.getenv("JOBS_DB_PATH", "jobs.db"))
+    os.environ["JOBS_DB_PATH"] = f"{root}-{index}{ext}"
+    os.environ["WORKER_INDEX"] = str(index)
+    asyncio.run(_serve_worker(index, updates, ready, snapshots))
+
+def _next_update(updates):
+    parent = multiprocessing.parent_process()
+    while True:
+        try:
+            return updates.get(timeout=1)
+        except queue.Empty:
+            if parent is not None and not parent.is_alive():
+                return None
+
+# Metriken des Workers regelmäßig an den Supervisor schicken (ältere Stände verwirft dieser)
+async def _push_metrics(index: int, snapshots, interval: float = METRICS_PUSH_INTERVAL):
+    import metrics
+    while True:
+        try:
+            snapshots.put_nowait((index, metrics.render()))
+        except queue.Full:
+            pass
+        await asyncio.sleep(interval)
+
+async def _serve_worker(index: int, updates, ready, snapshots):
+    import bot
+    from telegram import Update
+    bot.app.webhook_url = None  # den Webhook setzt der Supervisor
+    await bot.app.startup()
+    ready.set()
+    push = asyncio.create_task(_push_metrics(index, snapshots))
+    try:
+        while True:
+            data = await asyncio.to_thread(_next_update, updates)
+            if data is None:
+                break
+            await submit_update(bot.scheduler, Update.de_json(json.loads(data), bot.application.bot))
+    finally:
+        push.cancel()
+        await bot.app.shutdown()
+
+# Supervisor: schlanke Application nur für set_webhook/getUpdates, Handler laufen in den Workern
+def create_supervisor(workers: int):
+    from telegram.ext import Application
+    from webhook_server import WebhookServer
+    from metrics import register_snapshots, register_stats
+    from outbound import LazyRequest
+
+    application = (
+        Application.builder()
+        .token(os.getenv("TELEGRAM_BOT_TOKEN"))
+        .base_url(os.getenv("TELEGRAM_BASE_URL", "https://api.telegram.org/bot"))
+        .request(LazyRequest())
+        .get_updates_request(LazyRequest())
+        .updater(None)
+        .build()
+    )
+    router = ShardRouter(workers)
+    register_stats("router", lambda: {**router.stats, "queued": router.queued})
+    register_snapshots(router.worker_metrics)
+    return WebhookServer(application, router, webhook_url=os.getenv("WEBHOOK_URL"))
+
+# Polling-Betrieb für einen WebhookServer (Bot oder Supervisor): gleicher Start/Stopp wie im Webhook-Betrieb
+async def run_polling(server):
+    server.webhook_url = None
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopped.set)
+    await server.startup()
+    ingress = PollingIngress(server.application.bot, server.scheduler)
+    await ingress.start()
+    logger.info("Polling gestartet")
+    try:
+        await stopped.wait()
+    finally:
+        await ingress.stop()
+        await server.shutdown()
+
+def serve(server, mode: str = RUNTIME_MODE, port: int = PORT):
+    if mode == "polling":
+        asyncio.run(run_polling(server))
+    else:
+        import uvicorn
+        uvicorn.run(server, host="0.0.0.0", port=port, log_level="warning", access_log=False)
+
+# z.B. "python runtime.py --mode polling --workers 4"
+def main(mode: str = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=("webhook", "polling"), default=mode or RUNTIME_MODE)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+        server = create_supervisor(args.workers)
+    else:
+        import bot
+        server = bot.app
+    serve(server, args.mode, args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from metrics import UPDATE_LATENCY, UPDATE_WAIT, span
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "64"))
+SCHEDULER_MAX_EXPENSIVE = int(os.getenv("SCHEDULER_MAX_EXPENSIVE", "16"))  # gleichzeitige teure Jobs
+SCHEDULER_MAX_QUEUED = int(os.getenv("SCHEDULER_MAX_QUEUED", "1000"))  # global, darüber HTTP 429
+SCHEDULER_MAX_CHAT_QUEUE = int(os.getenv("SCHEDULER_MAX_CHAT_QUEUE", "20"))
+SCHEDULER_USER_RATE = float(os.getenv("SCHEDULER_USER_RATE", "0"))  # Updates pro Sekunde und Nutzer, 0 = aus
+SCHEDULER_USER_BURST = float(os.getenv("SCHEDULER_USER_BURST", "10"))
+SCHEDULER_USER_MAX_DELAY = float(os.getenv("SCHEDULER_USER_MAX_DELAY", "30"))  # Sekunden Verzögerung, danach verworfen
+# Gewichte für Weighted Fair Queuing zwischen günstigen und teuren Jobs
+SCHEDULER_WEIGHTS = {
+    "cheap": float(os.getenv("SCHEDULER_WEIGHT_CHEAP", "4")),
+    "expensive": float(os.getenv("SCHEDULER_WEIGHT_EXPENSIVE", "1")),
+}
+
+ACCEPTED = "accepted"
+RATE_LIMITED = "rate_limited"
+CHAT_FULL = "chat_full"
+FULL = "full"
+
+# Text ist günstig; Bilder, Sprache und Dokumente sind teuer. Datei- und Bildgenerierung
+# laufen als Hintergrundauftrag (jobs.py), der Handler selbst bestätigt nur.
+def classify_update(update) -> str:
+    message = getattr(update, "message", None)
+    if message is None:
+        return "cheap"
+    if message.photo or message.voice or message.document or message.audio or message.video:
+        return "expensive"
+    return "cheap"
+
+class _TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, burst: float):
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    # Reserviert einen Token und liefert die Wartezeit, bis er verfügbar ist (0 = sofort);
+    # None, wenn die Wartezeit max_delay überschreiten würde
+    def reserve(self, rate: float, burst: float, max_delay: float):
+        now = time.monotonic()
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        delay = max(0.0, (1 - self.tokens) / rate)
+        if delay > max_delay:
+            return None
+        self.tokens -= 1
+        return delay
+
+# Verarbeitet Updates eines Chats strikt nacheinander (Reihenfolge des Verlaufs bleibt
+# erhalten), verschiedene Chats parallel. Bereite Chats warten pro Jobklasse in einer
+# Round-Robin-Schlange; die Klassen werden nach Gewicht fair bedient.
+class UpdateScheduler:
+    def __init__(self, process, workers: int = SCHEDULER_WORKERS, max_expensive: int = SCHEDULER_MAX_EXPENSIVE,
+                 max_queued: int = SCHEDULER_MAX_QUEUED, max_chat_queue: int = SCHEDULER_MAX_CHAT_QUEUE,
+                 user_rate: float = SCHEDULER_USER_RATE, user_burst: float = SCHEDULER_USER_BURST,
+                 user_max_delay: float = SCHEDULER_USER_MAX_DELAY, weights: dict = None, classify=classify_update,
+                 on_rate_limited=None):
+        self.process = process  # async (update) -> None, z.B. application.process_update
+        self.workers = workers
+        self.max_expensive = max_expensive
+        self.max_queued = max_queued
+        self.max_chat_queue = max_chat_queue
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.user_max_delay = user_max_delay
+        self.on_rate_limited = on_rate_limited  # async (Update) -> None, z.B. Hinweis an den Nutzer
+        self.weights = dict(weights or SCHEDULER_WEIGHTS)
+        self.classify = classify
+        self.stats = {"submitted": 0, "processed": 0, "failed": 0, "rate_limited": 0, "delayed": 0,
+                      "chat_full": 0, "rejected": 0, "wait_seconds_total": 0.0,
+                      "wait_seconds_max": 0.0, "run_seconds_total": 0.0}
+        self.queued = 0
+        self.in_flight = 0
+        self._chats = {}  # Chat -> deque von (Update, Klasse, Zeitpunkt)
+        self._active = set()
+        self._ready = {cls: deque() for cls in self.weights}
+        self._vtime = {cls: 0.0 for cls in self.weights}
+        self._running = {cls: 0 for cls in self.weights}
+        self._buckets = {}
+        self._warned = set()  # Nutzer, die seit dem letzten angenommenen Update schon einen Hinweis bekamen
+        self._timers = {}  # Chat -> Task, der den Chat bereit macht, sobald sein gedrosseltes Update fällig ist
+        self._notices = set()  # laufende Hinweise an gedrosselte Nutzer
+        self._cond = asyncio.Condition()
+        self._tasks = []
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def queue_depth(self, cls: str = None) -> int:
+        if cls is None:
+            return self.queued
+        return sum(1 for chat in self._chats.values() for _, c, _ in chat if c == cls)
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    # Wartet optional, bis alle angenommenen Updates verarbeitet sind, und beendet die Worker
+    async def stop(self, drain: bool = True):
+        if drain:
+            await self._idle.wait()
+        tasks = self._tasks + list(self._timers.values()) + list(self._notices)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._timers.clear()
+
+    async def drain(self):
+        await self._idle.wait()
+
+    # Drosselung pro Nutzer: Updates über dem Limit werden verzögert (Token-Bucket mit Reservierung),
+    # erst jenseits von user_max_delay verworfen. Alben (media_group_id) sind ausgenommen, damit
+    # AlbumCollector alle Fotos einer Gruppe erhält.
+    def _user_delay(self, update):
+        user = getattr(update, "effective_user", None)
+        message = getattr(update, "message", None)
+        if user is None or self.user_rate <= 0 or getattr(message, "media_group_id", None):
+            return 0.0
+        user_id = user.id
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) > 10000:
+                # Volle (inaktive) Buckets verwerfen
+                now = time.monotonic()
+                self._buckets = {
+                    uid: b for uid, b in self._buckets.items()
+                    if b.tokens + (now - b.updated) * self.user_rate < self.user_burst
+                }
+            bucket = self._buckets[user_id] = _TokenBucket(self.user_burst)
+        delay = bucket.reserve(self.user_rate, self.user_burst, self.user_max_delay)
+        if delay is not None:
+            self._warned.discard(user_id)
+        return delay
+
+    async def submit(self, update) -> str:
+        chat = getattr(update, "effective_chat", None)
+        chat_id = chat.id if chat is not None else ("update", getattr(update, "update_id", id(update)))
+        if self.queued >= self.max_queued:
+            self.stats["rejected"] += 1
+            return FULL
+        delay = self._user_delay(update)
+        if delay is None:
+            self.stats["rate_limited"] += 1
+            user_id = update.effective_user.id
+            if self.on_rate_limited is not None and user_id not in self._warned:
+                # Eigener Task: der Hinweis läuft durch die Sende-Drosselung und soll die
+                # Bestätigung des Webhooks nicht aufhalten
+                self._warned.add(user_id)
+                task = asyncio.create_task(self._notify_rate_limited(update))
+                self._notices.add(task)
+                task.add_done_callback(self._notices.discard)
+            return RATE_LIMITED
+        if delay:
+            self.stats["delayed"] += 1
+        cls = self.classify(update)
+        async with self._cond:
+            queue = self._chats.get(chat_id)
+            if queue is None:
+                queue = self._chats[chat_id] = deque()
+            if len(queue) >= self.max_chat_queue:
+                self.stats["chat_full"] += 1
+                return CHAT_FULL
+            queue.append((update, cls, time.monotonic() + delay))
+            self.queued += 1
+            self.stats["submitted"] += 1
+            self._idle.clear()
+            if chat_id not in self._active and len(queue) == 1:
+                self._schedule(chat_id)
+        return ACCEPTED
+
+    async def _notify_rate_limited(self, update):
+        try:
+            await self.on_rate_limited(update)
+        except Exception:
+            logger.exception("Hinweis zur Drosselung nicht zustellbar")
+
+    # Chat mit wartenden Updates einreihen (Aufruf unter self._cond). Ist das erste Update
+    # gedrosselt, wartet der Chat außerhalb von _ready, statt einen Worker (und ggf. einen
+    # der max_expensive-Plätze) bis zum Zeitpunkt zu belegen.
+    def _schedule(self, chat_id):
+        _, cls, due = self._chats[chat_id][0]
+        delay = due - time.monotonic()
+        if delay > 0:
+            self._timers[chat_id] = asyncio.create_task(self._ready_after(chat_id, delay))
+        else:
+            self._make_ready(chat_id, cls)
+            self._cond.notify()
+
+    async def _ready_after(self, chat_id, delay: float):
+        await asyncio.sleep(delay)
+        async with self._cond:
+            del self._timers[chat_id]
+            self._make_ready(chat_id, self._chats[chat_id][0][1])
+            self._cond.notify()
+
+    def _make_ready(self, chat_id, cls):
+        if not self._ready[cls]:
+            # Eine zuvor leere Klasse startet bei der kleinsten aktiven virtuellen Zeit
+            active = [self._vtime[c] for c, ready in self._ready.items() if ready]
+            if active:
+                self._vtime[cls] = max(self._vtime[cls], min(active))
+        self._ready[cls].append(chat_id)
+
+    def _pick(self):
+        candidates = [
+            cls for cls, ready in self._ready.items()
+            if ready and (cls != "expensive" or self._running[cls] < self.max_expensive)
+        ]
+        if not candidates:
+            return None
+        cls = min(candidates, key=lambda c: self._vtime[c])
+        self._vtime[cls] += 1.0 / self.weights[cls]
+        chat_id = self._ready[cls].popleft()
+        update, _, enqueued = self._chats[chat_id].popleft()
+        self._active.add(chat_id)
+        self._running[cls] += 1
+        self.queued -= 1
+        self.in_flight += 1
+        return chat_id, update, cls, enqueued
+
+    async def _worker(self):
+        while True:
+            async with self._cond:
+                job = self._pick()
+                while job is None:
+                    await self._cond.wait()
+                    job = self._pick()
+            chat_id, update, cls, enqueued = job
+            started = time.monotonic()
+            wait = started - enqueued
+            self.stats["wait_seconds_total"] += wait
+            self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], wait)
+            UPDATE_WAIT.observe(wait, cls=cls)
+            try:
+                with span("update", update_id=getattr(update, "update_id", None), update_class=cls):
+                    await self.process(update)
+                self.stats["processed"] += 1
+            except Exception:
+                self.stats["failed"] += 1
+                logger.exception("Fehler bei der Verarbeitung eines Updates")
+            finally:
+                finished = time.monotonic()
+                self.stats["run_seconds_total"] += finished - started
+                UPDATE_LATENCY.observe(finished - enqueued, cls=cls)
+                async with self._cond:
+                    self._active.discard(chat_id)
+                    self._running[cls] -= 1
+                    self.in_flight -= 1
+                    queue = self._chats[chat_id]
+                    if queue:
+                        self._schedule(chat_id)
+                    else:
+                        del self._chats[chat_id]
+                    if not self.queued and not self.in_flight:
+                        self._idle.set()
+                    self._cond.notify_all()
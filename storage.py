@@ -0,0 +1,287 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# z.B. "memory://", "sqlite:///data/state.db" oder "redis://localhost:6379/0"
+STATE_BACKEND_URL = os.getenv("STATE_BACKEND_URL", "memory://")
+STATE_CACHE_TTL = float(os.getenv("STATE_CACHE_TTL", "5"))  # Sekunden
+STATE_CACHE_SIZE = int(os.getenv("STATE_CACHE_SIZE", "10000"))
+STATE_BATCH_SIZE = int(os.getenv("STATE_BATCH_SIZE", "100"))
+STATE_BATCH_INTERVAL = float(os.getenv("STATE_BATCH_INTERVAL", "0.05"))  # Sekunden
+
+_DELETED = object()
+
+def _encode(value):
+    return None if value is None else json.dumps(value, ensure_ascii=False)
+
+# Basisklasse: Read-Through-Cache und gebündelte Schreibvorgänge.
+# Unterklassen implementieren _load, _store_many und _update.
+class StateBackend:
+    persistent = True
+
+    def __init__(self, cache_ttl: float = STATE_CACHE_TTL, cache_size: int = STATE_CACHE_SIZE,
+                 batch_size: int = STATE_BATCH_SIZE, batch_interval: float = STATE_BATCH_INTERVAL):
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.stats = {"cache_hits": 0, "cache_misses": 0, "writes": 0, "flushes": 0}
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._flush_handle = None
+        self._flush_lock = asyncio.Lock()
+
+    async def _load(self, namespace: str, key: str):
+        raise NotImplementedError
+
+    async def _store_many(self, items: list):
+        raise NotImplementedError
+
+    # change: (gespeicherter JSON-Text oder None) -> neuer JSON-Text oder None (= löschen);
+    # muss atomar gegenüber anderen Prozessen sein und den neuen Text liefern
+    async def _update(self, namespace: str, key: str, change):
+        raise NotImplementedError
+
+    def _remember(self, cache_key, value):
+        self._cache[cache_key] = (value, time.monotonic())
+        self._cache.move_to_end(cache_key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def get(self, namespace: str, key: str, default=None):
+        cache_key = (namespace, key)
+        if cache_key in self._pending:
+            value = self._pending[cache_key]
+            return default if value is _DELETED else json.loads(value)
+        cached = self._cache.get(cache_key)
+        if cached is not None and time.monotonic() - cached[1] < self.cache_ttl:
+            self.stats["cache_hits"] += 1
+            self._cache.move_to_end(cache_key)
+            return default if cached[0] is None else json.loads(cached[0])
+        self.stats["cache_misses"] += 1
+        value = await self._load(namespace, key)
+        self._remember(cache_key, value)
+        return default if value is None else json.loads(value)
+
+    async def set(self, namespace: str, key: str, value):
+        await self._write((namespace, key), json.dumps(value, ensure_ascii=False))
+
+    async def delete(self, namespace: str, key: str):
+        await self._write((namespace, key), _DELETED)
+
+    # Lesen-Ändern-Schreiben atomar über alle Worker hinweg, am Cache und Schreibpuffer vorbei
+    # (set() nach get() überschreibt sonst Änderungen anderer Prozesse). change: (Wert oder None)
+    # -> neuer Wert (None = löschen), wird ggf. mehrfach aufgerufen und muss daher frei von
+    # Seiteneffekten sein. Liefert den neuen Wert.
+    async def update(self, namespace: str, key: str, change):
+        cache_key = (namespace, key)
+        if cache_key in self._pending:
+            await self.flush()
+        value = await self._update(namespace, key, lambda raw: _encode(change(None if raw is None else json.loads(raw))))
+        self._remember(cache_key, value)
+        self.stats["writes"] += 1
+        return None if value is None else json.loads(value)
+
+    async def _write(self, cache_key, value):
+        self._pending[cache_key] = value
+        self._remember(cache_key, None if value is _DELETED else value)
+        self.stats["writes"] += 1
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+        elif self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(self.batch_interval, lambda: asyncio.ensure_future(self._scheduled_flush()))
+
+    async def _scheduled_flush(self):
+        self._flush_handle = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Schreiben in das State-Backend fehlgeschlagen: {e}")
+
+    async def flush(self):
+        async with self._flush_lock:
+            if self._flush_handle is not None:
+                self._flush_handle.cancel()
+                self._flush_handle = None
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            items = [(ns, key, None if value is _DELETED else value) for (ns, key), value in pending.items()]
+            try:
+                await self._store_many(items)
+                self.stats["flushes"] += 1
+            except Exception:
+                # Nicht geschriebene Einträge zurückstellen, neuere Werte haben Vorrang
+                for cache_key, value in pending.items():
+                    self._pending.setdefault(cache_key, value)
+                raise
+
+    async def close(self):
+        await self.flush()
+
+# Reiner Arbeitsspeicher (Standard, ein Prozess)
+class MemoryBackend(StateBackend):
+    persistent = False
+
+    def __init__(self):
+        super().__init__(cache_ttl=0)
+        self._data = {}
+
+    async def get(self, namespace: str, key: str, default=None):
+        value = self._data.get((namespace, key))
+        return default if value is None else json.loads(value)
+
+    async def _write(self, cache_key, value):
+        self.stats["writes"] += 1
+        if value is _DELETED:
+            self._data.pop(cache_key, None)
+        else:
+            self._data[cache_key] = value
+
+    async def update(self, namespace: str, key: str, change):
+        raw = self._data.get((namespace, key))
+        value = change(None if raw is None else json.loads(raw))
+        await self._write((namespace, key), _DELETED if value is None else _encode(value))
+        return value
+
+# SQLite im WAL-Modus, geeignet für mehrere Worker-Prozesse auf einem Host
+class SQLiteBackend(StateBackend):
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        self._conn.commit()
+
+    def _load_sync(self, namespace, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM state WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _store_many_sync(self, items):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO state (namespace, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT(namespace, key) DO UPDATE SET value = excluded.value",
+                [item for item in items if item[2] is not None],
+            )
+            self._conn.executemany(
+                "DELETE FROM state WHERE namespace = ? AND key = ?",
+                [item[:2] for item in items if item[2] is None],
+            )
+
+    # BEGIN IMMEDIATE sperrt die Datenbank für andere Schreiber (auch in anderen Prozessen),
+    # bis der neue Wert geschrieben ist
+    def _update_sync(self, namespace, key, change):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT value FROM state WHERE namespace = ? AND key = ?", (namespace, key)
+                ).fetchone()
+                value = change(row[0] if row else None)
+                if value is None:
+                    self._conn.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+                else:
+                    self._conn.execute(
+                        "INSERT INTO state (namespace, key, value) VALUES (?, ?, ?) "
+                        "ON CONFLICT(namespace, key) DO UPDATE SET value = excluded.value",
+                        (namespace, key, value),
+                    )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return value
+
+    async def _load(self, namespace, key):
+        return await asyncio.to_thread(self._load_sync, namespace, key)
+
+    async def _update(self, namespace, key, change):
+        return await asyncio.to_thread(self._update_sync, namespace, key, change)
+
+    async def _store_many(self, items):
+        await asyncio.to_thread(self._store_many_sync, items)
+
+    async def close(self):
+        await super().close()
+        self._conn.close()
+
+# Redis-Protokoll (redis.asyncio oder ein kompatibler Fake, z.B. fakeredis.aioredis)
+class RedisBackend(StateBackend):
+    def __init__(self, client=None, url: str = None, prefix: str = "tele2:", **kwargs):
+        super().__init__(**kwargs)
+        if client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError:
+                raise RuntimeError("Das Paket 'redis' ist nicht installiert.")
+            client = redis.from_url(url)
+        self._client = client
+        self._prefix = prefix
+
+    def _key(self, namespace, key):
+        return f"{self._prefix}{namespace}:{key}"
+
+    async def _load(self, namespace, key):
+        value = await self._client.get(self._key(namespace, key))
+        return value.decode("utf-8") if isinstance(value, bytes) else value
+
+    # Optimistisch über WATCH/MULTI: ändert ein anderer Prozess den Schlüssel zwischendurch,
+    # scheitert EXEC und der Versuch wird mit dem neuen Wert wiederholt
+    async def _update(self, namespace, key, change):
+        from redis.exceptions import WatchError
+        name = self._key(namespace, key)
+        async with self._client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(name)
+                    raw = await pipe.get(name)
+                    value = change(raw.decode("utf-8") if isinstance(raw, bytes) else raw)
+                    pipe.multi()
+                    if value is None:
+                        pipe.delete(name)
+                    else:
+                        pipe.set(name, value)
+                    await pipe.execute()
+                    return value
+                except WatchError:
+                    continue
+
+    async def _store_many(self, items):
+        pipe = self._client.pipeline(transaction=False)
+        for namespace, key, value in items:
+            if value is None:
+                pipe.delete(self._key(namespace, key))
+            else:
+                pipe.set(self._key(namespace, key), value)
+        await pipe.execute()
+
+    async def close(self):
+        await super().close()
+        await self._client.close()
+
+def create_backend(url: str = STATE_BACKEND_URL) -> StateBackend:
+    if url.startswith("memory://"):
+        return MemoryBackend()
+    if url.startswith("sqlite://"):
+        return SQLiteBackend(url[len("sqlite:///"):] or "state.db")
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url=url)
+    raise ValueError(f"Unbekanntes State-Backend: {url}")
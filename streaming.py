@@ -0,0 +1,130 @@
+import os
+import time
+import asyncio
+import logging
+from telegram.error import BadRequest, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "1") == "1"
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))  # Sekunden zwischen Edits pro Nachricht
+
+# Text in Telegram-taugliche Teile zerlegen (bevorzugt an Zeilenumbrüchen, sonst an Leerzeichen)
+def split_message(text: str, limit: int = TELEGRAM_MAX_MESSAGE_LENGTH) -> list:
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut < limit // 2:
+            cut = text.rfind(" ", 0, limit)
+        if cut < limit // 2:
+            cut = limit
+        parts.append(text[:cut])
+        text = text[cut:].lstrip("\n ")
+    parts.append(text)
+    return parts
+
+# Gestreamte Antwort: erste Nachricht sofort senden, danach gebündelt und
+# ratenbegrenzt editieren; bei mehr als 4096 Zeichen wird eine neue Nachricht begonnen
+class StreamingReply:
+    def __init__(self, bot, chat_id, edit_interval: float = STREAM_EDIT_INTERVAL):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.edit_interval = edit_interval
+        self.text = ""
+        self._offset = 0  # Beginn des Textes der aktuellen Nachricht
+        self._message = None
+        self._shown = ""
+        self._last_edit = 0.0
+
+    async def feed(self, delta: str):
+        self.text += delta
+        if self._message is None:
+            if self.text.strip():
+                await self._flush()
+        elif time.monotonic() - self._last_edit >= self.edit_interval:
+            await self._flush()
+
+    async def finish(self) -> str:
+        await self._flush(final=True)
+        return self.text
+
+    async def _flush(self, final: bool = False):
+        segment = self.text[self._offset:]
+        while len(segment) > TELEGRAM_MAX_MESSAGE_LENGTH:
+            head = split_message(segment)[0]
+            await self._show(head, final=True)
+            self._offset = len(self.text) - len(segment[len(head):].lstrip("\n "))
+            self._message, self._shown = None, ""
+            segment = self.text[self._offset:]
+        await self._show(segment, final=final)
+
+    async def _show(self, text: str, final: bool = False):
+        if not text.strip() or text == self._shown:
+            return
+        while True:
+            try:
+                if self._message is None:
+                    self._message = await self.bot.send_message(chat_id=self.chat_id, text=text)
+                else:
+                    await self._message.edit_text(text)
+                self._shown = text
+            except RetryAfter as e:
+                # Zwischenstände überspringen, der nächste Flush holt den Stand nach
+                if self._message is not None and not final:
+                    logger.debug(f"Edit-Limit erreicht, überspringe Edit ({e.retry_after}s)")
+                else:
+                    await asyncio.sleep(e.retry_after)
+                    continue
+            except BadRequest as e:
+                if "not modified" not in str(e).lower():
+                    raise
+            break
+        self._last_edit = time.monotonic()
+
+async def stream_reply(bot, chat_id, chunks) -> str:
+    reply = StreamingReply(bot, chat_id)
+    async for delta in chunks:
+        await reply.feed(delta)
+    return await reply.finish()
+
+# Statusnachricht, die mit ratenbegrenzten Edits aktualisiert wird (z.B. Fortschrittsanzeigen)
+class ProgressMessage:
+    def __init__(self, bot, chat_id, edit_interval: float = 2.0):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.edit_interval = edit_interval
+        self.message = None
+        self._shown = ""
+        self._last_edit = 0.0
+
+    async def update(self, text: str, force: bool = False):
+        if text == self._shown:
+            return
+        if self.message is None:
+            self.message = await self.bot.send_message(chat_id=self.chat_id, text=text)
+        elif force or time.monotonic() - self._last_edit >= self.edit_interval:
+            try:
+                await self.message.edit_text(text)
+            except (RetryAfter, BadRequest) as e:
+                logger.debug(f"Fortschritt nicht aktualisiert: {e}")
+                return
+        else:
+            return
+        self._shown = text
+        self._last_edit = time.monotonic()
+
+    # Endergebnis anzeigen; zu lange Texte werden auf weitere Nachrichten verteilt
+    async def finish(self, text: str):
+        parts = split_message(text)
+        edited = False
+        if self.message is not None:
+            try:
+                await self.message.edit_text(parts[0])
+                edited = True
+            except (RetryAfter, BadRequest) as e:
+                logger.debug(f"Statusnachricht nicht editierbar: {e}")
+        if not edited:
+            await self.bot.send_message(chat_id=self.chat_id, text=parts[0])
+        for part in parts[1:]:
+            await self.bot.send_message(chat_id=self.chat_id, text=part)
@@ -0,0 +1,77 @@
+import os
+import asyncio
+from conversation import count_tokens
+from cache import cache_key
+
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "3000"))
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "8"))
+SUMMARY_MAX_CHUNKS = int(os.getenv("SUMMARY_MAX_CHUNKS", "400"))
+
+# Text in Abschnitte mit höchstens max_tokens Tokens zerlegen (an Absatzgrenzen)
+def split_tokens(text: str, max_tokens: int = SUMMARY_CHUNK_TOKENS) -> list:
+    chunks, current, current_tokens = [], [], 0
+    for paragraph in text.split("\n"):
+        tokens = count_tokens(paragraph) + 1
+        if tokens > max_tokens:
+            # Überlange Absätze grob nach Zeichen teilen (ca. 4 Zeichen pro Token)
+            step = max_tokens * 4
+            pieces = [paragraph[i:i + step] for i in range(0, len(paragraph), step)]
+        else:
+            pieces = [paragraph]
+        for piece in pieces:
+            tokens = count_tokens(piece) + 1
+            if current and current_tokens + tokens > max_tokens:
+                chunks.append("\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += tokens
+    if current and "".join(current).strip():
+        chunks.append("\n".join(current))
+    return chunks
+
+# Hierarchische Zusammenfassung (Map-Reduce): Abschnitte parallel zusammenfassen,
+# dann die Teilzusammenfassungen schrittweise verdichten. Ergebnisse werden
+# über einen Hash des Inhalts im ResponseCache zwischengespeichert.
+class Summarizer:
+    def __init__(self, complete, cache, chunk_tokens: int = SUMMARY_CHUNK_TOKENS,
+                 concurrency: int = SUMMARY_CONCURRENCY, cache_namespace: str = "summary-v1"):
+        self.complete = complete  # async (Text, final: bool) -> Zusammenfassung
+        self.cache = cache
+        self.chunk_tokens = chunk_tokens
+        self.concurrency = concurrency
+        self.cache_namespace = cache_namespace  # bei geänderten Prompts/Modellen erhöhen
+        self.stats = {"calls": 0}
+
+    async def _summarize_one(self, text: str, final: bool, semaphore) -> str:
+        async def compute():
+            async with semaphore:
+                self.stats["calls"] += 1
+                return await self.complete(text, final)
+        return await self.cache.get_or_compute_text(cache_key(self.cache_namespace, final, text), compute)
+
+    async def summarize(self, text: str, on_progress=None) -> str:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        chunks = split_tokens(text, self.chunk_tokens)[:SUMMARY_MAX_CHUNKS]
+        if not chunks:
+            return ""
+        done = 0
+        total = len(chunks)
+
+        async def step(chunk, final):
+            nonlocal done
+            summary = await self._summarize_one(chunk, final, semaphore)
+            done += 1
+            if on_progress is not None:
+                await on_progress(done, total)
+            return summary
+
+        # Map: bei nur einem Abschnitt direkt die Endfassung erzeugen
+        summaries = await asyncio.gather(*(step(chunk, len(chunks) == 1) for chunk in chunks))
+        # Reduce: solange mehrere Teilzusammenfassungen existieren, gruppenweise verdichten
+        while len(summaries) > 1:
+            groups = split_tokens("\n\n".join(summaries), self.chunk_tokens)
+            if len(groups) >= len(summaries):
+                groups = ["\n\n".join(summaries)]
+            total += len(groups)
+            summaries = await asyncio.gather(*(step(group, len(groups) == 1) for group in groups))
+        return summaries[0]
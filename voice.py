@@ -0,0 +1,166 @@
+import os
+import re
+import struct
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Sprachausgabe: Opus im Ogg-Container (von Telegram nativ als Sprachnachricht abgespielt)
+VOICE_TTS_MODEL = os.getenv("VOICE_TTS_MODEL", "tts-1")
+VOICE_TTS_VOICE = os.getenv("VOICE_TTS_VOICE", "sage")
+VOICE_TTS_FORMAT = "opus"
+VOICE_FIRST_SEGMENT_CHARS = int(os.getenv("VOICE_FIRST_SEGMENT_CHARS", "60"))  # kurz, damit TTS früh startet
+VOICE_SEGMENT_CHARS = int(os.getenv("VOICE_SEGMENT_CHARS", "160"))  # Mindestlänge der weiteren Abschnitte
+VOICE_TTS_PARALLEL = int(os.getenv("VOICE_TTS_PARALLEL", "4"))  # gleichzeitige TTS-Aufrufe pro Antwort
+VOICE_TEXT_FIRST = os.getenv("VOICE_TEXT_FIRST", "0") == "1"  # Textantwort vorab streamen
+TTS_MAX_INPUT = 4096  # Zeichenlimit der Speech-API
+
+# Satzende: Satzzeichen (ggf. mit schließenden Anführungszeichen/Klammern) vor Leerraum, oder Zeilenumbruch
+_SENTENCE_END = re.compile(r"[.!?…]+[\"'»«“”)\]]*(?=\s)|\n")
+
+# Zerlegt gestreamten Text an Satzgrenzen in Abschnitte für die Sprachsynthese;
+# der erste Abschnitt ist kurz, die weiteren länger (weniger Aufrufe, natürlichere Betonung)
+class SentenceSplitter:
+    def __init__(self, first_chars: int = VOICE_FIRST_SEGMENT_CHARS, segment_chars: int = VOICE_SEGMENT_CHARS,
+                 max_chars: int = TTS_MAX_INPUT):
+        self.first_chars = first_chars
+        self.segment_chars = segment_chars
+        self.max_chars = max_chars
+        self.segments = 0
+        self._buffer = ""
+
+    def _emit(self, end: int, segments: list):
+        segment, self._buffer = self._buffer[:end].strip(), self._buffer[end:]
+        if segment:
+            segments.append(segment)
+            self.segments += 1
+
+    def feed(self, text: str) -> list:
+        self._buffer += text
+        segments = []
+        while True:
+            target = self.segment_chars if self.segments else self.first_chars
+            end = next((m.end() for m in _SENTENCE_END.finditer(self._buffer) if m.end() >= target), None)
+            if end is None:
+                break
+            self._emit(end, segments)
+        # Sehr lange Passagen ohne Satzende am letzten Leerzeichen vor dem Limit trennen
+        while len(self._buffer) > self.max_chars:
+            cut = self._buffer.rfind(" ", 0, self.max_chars)
+            self._emit(cut if cut > 0 else self.max_chars, segments)
+        return segments
+
+    def finish(self) -> list:
+        segments = []
+        self._emit(len(self._buffer), segments)
+        return segments
+
+# Ogg-Seiten (RFC 3533) lesen und schreiben, um Opus-Abschnitte ohne Neukodierung zu verbinden
+
+def _crc_table() -> list:
+    table = []
+    for byte in range(256):
+        crc = byte << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else crc << 1
+        table.append(crc & 0xFFFFFFFF)
+    return table
+
+_CRC_TABLE = _crc_table()
+_PAGE_HEADER = struct.Struct("<4sBBqIIIB")  # Kennung, Version, Flags, Granule, Serial, Seitennummer, CRC, Segmente
+_FLAG_BOS, _FLAG_EOS = 0x02, 0x04
+
+def _ogg_crc(data: bytes) -> int:
+    crc = 0
+    table = _CRC_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ table[(crc >> 24) ^ byte]
+    return crc
+
+def ogg_page(flags: int, granule: int, serial: int, sequence: int, lacing: bytes, body: bytes) -> bytes:
+    header = _PAGE_HEADER.pack(b"OggS", 0, flags, granule, serial, sequence, 0, len(lacing)) + lacing
+    crc = _ogg_crc(header + body)
+    return header[:22] + struct.pack("<I", crc) + header[26:] + body
+
+def _ogg_pages(data: bytes):
+    position = 0
+    while position < len(data):
+        if len(data) - position < _PAGE_HEADER.size:
+            raise ValueError("Abgeschnittene Ogg-Seite")
+        capture, version, flags, granule, serial, _, _, count = _PAGE_HEADER.unpack_from(data, position)
+        if capture != b"OggS" or version != 0:
+            raise ValueError("Keine Ogg-Daten")
+        start = position + _PAGE_HEADER.size
+        lacing = data[start:start + count]
+        end = start + count + sum(lacing)
+        if len(lacing) < count or end > len(data):
+            raise ValueError("Abgeschnittene Ogg-Seite")
+        yield flags, granule, serial, lacing, data[start + count:end]
+        position = end
+
+# Verbindet mehrere Ogg-Opus-Dateien zu einem logischen Strom: Kopfseiten (Granule 0) der
+# weiteren Abschnitte entfallen, Granule-Positionen werden fortgezählt, Seriennummer und
+# Seitennummern vereinheitlicht. Das Pre-Skip der Folgeabschnitte (ca. 6 ms) bleibt hörbar.
+def concat_ogg_opus(streams: list) -> bytes:
+    if len(streams) == 1:
+        return streams[0]
+    pages = []
+    serial, offset = None, 0
+    for index, data in enumerate(streams):
+        last_granule = 0
+        for flags, granule, page_serial, lacing, body in _ogg_pages(data):
+            if serial is None:
+                serial = page_serial
+            if index > 0 and granule == 0:
+                continue
+            if granule != -1:
+                last_granule = granule
+                granule += offset
+            pages.append([flags & ~(_FLAG_BOS | _FLAG_EOS), granule, lacing, body])
+        offset += last_granule
+    if not pages:
+        raise ValueError("Keine Ogg-Seiten")
+    pages[0][0] |= _FLAG_BOS
+    pages[-1][0] |= _FLAG_EOS
+    return b"".join(ogg_page(flags, granule, serial, sequence, lacing, body)
+                    for sequence, (flags, granule, lacing, body) in enumerate(pages))
+
+# Sprachantwort aus gestreamtem Text: jeder fertige Abschnitt wird sofort (begrenzt parallel)
+# synthetisiert, während das Modell weiterschreibt; finish() liefert die zu sendenden Dateien
+class VoiceReply:
+    def __init__(self, synthesize, parallel: int = VOICE_TTS_PARALLEL, splitter: SentenceSplitter = None):
+        self.synthesize = synthesize  # async (Text) -> Ogg-Opus-Bytes
+        self.splitter = splitter or SentenceSplitter()
+        self._semaphore = asyncio.Semaphore(parallel)
+        self._tasks = []
+
+    async def _synthesize(self, segment: str) -> bytes:
+        async with self._semaphore:
+            return await self.synthesize(segment)
+
+    def _start(self, segments: list):
+        for segment in segments:
+            self._tasks.append(asyncio.create_task(self._synthesize(segment)))
+
+    def feed(self, delta: str):
+        self._start(self.splitter.feed(delta))
+
+    async def finish(self) -> list:
+        self._start(self.splitter.finish())
+        try:
+            parts = await asyncio.gather(*self._tasks)
+        except BaseException:
+            self.cancel()
+            raise
+        if not parts:
+            return []
+        try:
+            return [await asyncio.to_thread(concat_ogg_opus, parts)]
+        except ValueError as e:
+            logger.warning(f"Sprachabschnitte nicht verbindbar ({e}), sende sie einzeln")
+            return parts
+
+    def cancel(self):
+        for task in self._tasks:
+            task.cancel()
@@ -0,0 +1,161 @@
+import os
+import hmac
+import json
+import asyncio
+import logging
+import telegram
+from telegram.ext import Application
+from scheduler import UpdateScheduler, ACCEPTED, FULL
+import metrics
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN")
+WEBHOOK_MAX_BODY = 1024 * 1024
+# Eingehende Updates als JSON Lines mitschreiben (Aufzeichnung für benchmarks/loadtest.py --replay)
+UPDATE_RECORD_PATH = os.getenv("UPDATE_RECORD_PATH")
+
+# Natives ASGI-Webhook (z.B. uvicorn bot:app), läuft auf demselben Event Loop wie die Application.
+# Updates werden an den UpdateScheduler übergeben; ist dessen Warteschlange voll, antwortet es mit 429.
+class WebhookServer:
+    def __init__(self, application: Application, scheduler: UpdateScheduler, secret_token: str = WEBHOOK_SECRET_TOKEN,
+                 webhook_url: str = None, path: str = WEBHOOK_PATH, on_warmup=(), on_startup=(), on_stop=(),
+                 on_shutdown=()):
+        self.application = application
+        self.scheduler = scheduler
+        self.secret_token = secret_token
+        self.webhook_url = webhook_url
+        self.path = path
+        self.on_warmup = list(on_warmup)  # parallel zu application.initialize(), z.B. Clients anlegen
+        self.on_startup = list(on_startup)
+        self.on_stop = list(on_stop)  # vor dem Stoppen der Application, solange der Bot noch senden kann
+        self.on_shutdown = list(on_shutdown)
+        self._record = open(UPDATE_RECORD_PATH, "a", encoding="utf-8") if UPDATE_RECORD_PATH else None
+        self.ready = False  # erst nach vollständigem Start (Readiness-Probe unter /ready)
+        self.routes = {("GET", "/"): self.home, ("HEAD", "/"): self.home, ("GET", "/ready"): self.readiness,
+                       ("GET", "/metrics"): self.metrics}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        method, path = scope["method"], scope["path"]
+        if method == "POST" and path == self.path:
+            response = await self.webhook(scope, receive)
+        elif (method, path) in self.routes:
+            response = await self.routes[(method, path)](scope)
+        else:
+            response = 404, b"Not Found"
+        await _respond(send, *response)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as e:
+                    logger.exception("Start fehlgeschlagen")
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def startup(self):
+        await asyncio.gather(self.application.initialize(), *(callback() for callback in self.on_warmup))
+        if self.webhook_url:
+            success = await self.application.bot.set_webhook(self.webhook_url, secret_token=self.secret_token)
+            if success:
+                logger.info(f"Webhook erfolgreich gesetzt: {self.webhook_url}")
+            else:
+                logger.error("Webhook konnte nicht gesetzt werden!")
+        await self.application.start()
+        self.scheduler.start()
+        for callback in self.on_startup:
+            await callback()
+        self.ready = True
+
+    async def shutdown(self):
+        self.ready = False
+        await self.scheduler.stop(drain=True)
+        for callback in self.on_stop:
+            await callback()
+        await self.application.stop()
+        await self.application.shutdown()
+        for callback in self.on_shutdown:
+            await callback()
+        if self._record is not None:
+            self._record.close()
+
+    async def home(self, scope):
+        return 200, b"Bot is running!"
+
+    # 503 bis zum Ende des Starts (und wieder beim Herunterfahren), damit der Load Balancer erst dann zustellt
+    async def readiness(self, scope):
+        if self.ready and getattr(self.scheduler, "ready", True):
+            return 200, b"Ready"
+        return 503, b"Not Ready"
+
+    async def metrics(self, scope):
+        return 200, metrics.render(), b"text/plain; version=0.0.4; charset=utf-8"
+
+    async def webhook(self, scope, receive):
+        if self.secret_token:
+            received = _header(scope, b"x-telegram-bot-api-secret-token")
+            if not hmac.compare_digest(received.encode(), self.secret_token.encode()):
+                return 403, b"Forbidden"
+
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > WEBHOOK_MAX_BODY:
+                return 413, b"Payload Too Large"
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                break
+        try:
+            update_json = json.loads(b"".join(chunks))
+        except ValueError:
+            return 400, b"Bad Request"
+        # Nur JSON-Objekte mit update_id, aus denen ein Update entsteht (de_json liefert für {}
+        # None und scheitert an Strings/Listen), sonst erst beim Verarbeiten ein Fehler
+        if not isinstance(update_json, dict) or not isinstance(update_json.get("update_id"), int):
+            return 400, b"Bad Request"
+        try:
+            update = telegram.Update.de_json(update_json, self.application.bot)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            update = None
+        if not isinstance(update, telegram.Update):
+            return 400, b"Bad Request"
+
+        logger.debug(f"Webhook erhalten: {update_json}")
+        if self._record is not None:
+            self._record.write(json.dumps(update_json, ensure_ascii=False) + "\n")
+        status = await self.scheduler.submit(update)
+        if status == FULL:
+            return 429, b"Too Many Requests"
+        if status != ACCEPTED:
+            # Drosselung pro Nutzer/Chat: bestätigen und verwerfen, damit Telegram andere Updates weiter zustellt
+            logger.info(f"Update {update.update_id} verworfen ({status})")
+        return 200, b"OK"
+
+def _header(scope, name: bytes) -> str:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return ""
+
+async def _respond(send, status: int, body: bytes, content_type: bytes = b"text/plain; charset=utf-8"):
+    headers = [(b"content-type", content_type), (b"content-length", str(len(body)).encode())]
+    if status == 429:
+        headers.append((b"retry-after", b"1"))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})